@@ -1,122 +1,583 @@
 """Module containing the main function of the program."""
 
+import imaplib
 import os
+from functools import partial
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from pyvirtualdisplay.display import Display
 from requests.exceptions import RequestException
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.wait import POLL_FREQUENCY
 
 from amz_tango_card_scraper.amazon_redeemer.amazon_redeemer import (
-    redeem_amazon_gift_cards,
+    redeem_amazon_gift_cards_by_marketplace,
+    redeem_amazon_gift_cards_from_stream,
+)
+from amz_tango_card_scraper.browser.blocking import (
+    DEFAULT_BLOCKED_RESOURCE_TYPES,
+    build_blocked_url_patterns,
+)
+from amz_tango_card_scraper.browser.chrome import (
+    get_chrome_browser,
+    get_profile_dir,
+    quit_chrome_browser,
+)
+from amz_tango_card_scraper.browser.driver_cache import DEFAULT_DRIVER_CACHE_DIR
+from amz_tango_card_scraper.browser.extra_actions import configure_waits
+from amz_tango_card_scraper.browser.launcher import BrowserLauncher
+from amz_tango_card_scraper.browser.proxies import (
+    PROXY_CACHE_TTL,
+    PROXY_PROBE_DEADLINE,
+    PROXY_PROBE_URL,
+    configure_proxy_probing,
+    get_best_working_proxy,
+)
+from amz_tango_card_scraper.browser.proxy_manager import (
+    PROXY_ERROR_THRESHOLD,
+    ProxyManager,
 )
-from amz_tango_card_scraper.browser.chrome import get_chrome_browser
 from amz_tango_card_scraper.config_parser.config_parser import parse_config
-from amz_tango_card_scraper.gmail_scraper.gmail_scraper import scrape_tango_cards
+from amz_tango_card_scraper.gmail_scraper.async_gmail_scraper import (
+    iter_tango_cards_from_accounts,
+    scrape_tango_cards_from_accounts,
+)
+from amz_tango_card_scraper.gmail_scraper.checkpoint import (
+    cap_checkpoint,
+    save_checkpoint,
+)
+from amz_tango_card_scraper.gmail_scraper.constants import (
+    ACCOUNT_SCRAPE_TIMEOUT,
+    DEFAULT_PARSE_WORKERS,
+    MAX_IMAP_CONNECTIONS,
+)
+from amz_tango_card_scraper.gmail_scraper.gmail_scraper import (
+    apply_mailbox_actions,
+    iter_tango_cards,
+    scrape_tango_cards,
+    watch_tango_cards,
+)
+from amz_tango_card_scraper.gmail_scraper.mailbox_sources import (
+    iter_tango_cards_from_mailbox,
+    scrape_tango_cards_from_mailbox,
+)
+from amz_tango_card_scraper.ledger.card_ledger import CardLedger
+from amz_tango_card_scraper.ledger.constants import AMAZON_REDEEMED, TANGO_REDEEMED
 from amz_tango_card_scraper.message.message_builder import (
     build_amazon_cards_message,
     build_tango_cards_message,
 )
 from amz_tango_card_scraper.message.message_sender import send_message_to_telegram
 from amz_tango_card_scraper.message.message_storage import store_message
-from amz_tango_card_scraper.tango_scraper.tango_scraper import scrap_amazon_gift_cards
+from amz_tango_card_scraper.tango_scraper.constants import (
+    DEFAULT_TANGO_WORKERS,
+    TANGO_DEADLINE,
+    TANGO_MAX_ATTEMPTS,
+)
+from amz_tango_card_scraper.tango_scraper.http_redeemer import (
+    create_tango_session,
+    scrap_amazon_gift_cards_http,
+)
+from amz_tango_card_scraper.tango_scraper.tango_scraper import (
+    iter_amazon_gift_cards,
+    scrap_amazon_gift_cards,
+    scrap_amazon_gift_cards_in_parallel,
+)
+from amz_tango_card_scraper.utils.concurrency import StreamStopped, prefetch, stream
 from amz_tango_card_scraper.utils.logger import reset_log_file, setup_logger
+from amz_tango_card_scraper.utils.schemas import (
+    AmazonCard,
+    ConfigFile,
+    MailboxCheckpoint,
+    TangoCard,
+)
 
 logger = setup_logger(logger_name=__name__)
 
 
-def main() -> None:
-    # Reset log file
-    reset_log_file()
+def get_blocked_urls(config: ConfigFile) -> List[str]:
+    """
+    Get the URL patterns of the requests that the browser will not load.
 
-    # **************************************************************
-    # Show welcome message
-    # **************************************************************
-    logger.info("***********************************************")
-    logger.info("*                                             *")
-    logger.info("*          Amazon Tango Card Scraper          *")
-    logger.info("*                                             *")
-    logger.info("***********************************************")
+    Args:
+        config: the configuration of the program
+
+    Raises:
+        ValueError: If a resource type does not exist
+
+    Returns:
+        The URL patterns to block, empty if blocking is disabled
+    """
+    resource_types = config.script.get("block_resources") or []
+    # Block the default resource types if blocking is just enabled
+    if resource_types is True:
+        resource_types = DEFAULT_BLOCKED_RESOURCE_TYPES
+    return build_blocked_url_patterns(
+        resource_types=resource_types,  # type: ignore
+        url_patterns=config.script.get("block_urls") or [],  # type: ignore
+    )
+
+
+def get_browser_factory(config: ConfigFile) -> Callable[..., WebDriver]:
+    """
+    Get a function that returns a new browser configured as specified in the configuration.
+
+    Args:
+        config: the configuration of the program
+
+    Returns:
+        The function, which accepts the keyword arguments of get_chrome_browser to override the configuration
+    """
+    return partial(
+        get_chrome_browser,
+        headless=config.script.get("headless", True),
+        no_images=config.script.get("no_images", True),
+        proxies=config.proxies.get("list", []) if config.proxies.get("enable", False) else [],  # type: ignore
+        # Requests that the browser will not load
+        blocked_urls=get_blocked_urls(config),
+        driver_cache_dir=DEFAULT_DRIVER_CACHE_DIR if config.script.get("driver_cache", True) else "",
+    )
+
+
+def get_browser_launcher(config: ConfigFile) -> BrowserLauncher:
+    """
+    Get the launcher of the main browser, the one that redeems the Amazon gift cards.
+
+    Args:
+        config: the configuration of the program
+
+    Returns:
+        The launcher of the browser, not started yet
+    """
+    # Keep the Amazon session across runs in a profile of the account, only used by this browser as a profile
+    # cannot be shared by the browsers of the Tango workers
+    user_data_dir = ""
+    if config.script.get("redeem_amz", False) and config.script.get("persistent_profile", False):
+        profiles_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "chrome_profiles"))
+        user_data_dir = get_profile_dir(profiles_dir, config.amazon.get("email", ""))
+        logger.debug(f"Chrome profile: {user_data_dir}")
+    return BrowserLauncher(
+        browser_factory=partial(get_browser_factory(config), user_data_dir=user_data_dir),
+        virtual_display=config.script.get("virtual_display", False) and not config.script.get("headless", True),
+    )
+
+
+def get_marketplace_browser_factory(config: ConfigFile) -> Callable[[str], WebDriver]:
+    """
+    Get a function that returns a new browser for redeeming the Amazon gift cards of a marketplace.
+
+    Args:
+        config: the configuration of the program
+
+    Returns:
+        The function, which accepts the marketplace (e.g. "amazon.es")
+    """
+    browser_factory = get_browser_factory(config)
+
+    def get_marketplace_browser(marketplace: str) -> WebDriver:
+        # Every marketplace gets its own profile as the browsers of the marketplaces run at the same time
+        user_data_dir = ""
+        if config.script.get("persistent_profile", False):
+            profiles_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "chrome_profiles"))
+            user_data_dir = get_profile_dir(profiles_dir, f"{config.amazon.get('email', '')}-{marketplace}")
+        return browser_factory(user_data_dir=user_data_dir)
+
+    return get_marketplace_browser
+
+
+def process_tango_cards(
+    config: ConfigFile,
+    tango_cards: List[TangoCard],
+    ledger: Optional[CardLedger] = None,
+    launcher: Optional[BrowserLauncher] = None,
+) -> List[TangoCard]:
+    """
+    Get the Amazon gift cards of the given Tango Cards, redeem them if enabled and report the results.
+
+    Args:
+        config: the configuration of the program
+        tango_cards: the Tango Cards that will be processed
+        ledger: the ledger where the state of every card is recorded, None to not record it
+        launcher: the launcher of the browser, which may have been started already, None to create a new one
+
+    Returns:
+        The Tango Cards that could not be processed, whose emails are left to be scraped again
+    """
+    proxies = config.proxies.get("list", []) if config.proxies.get("enable", False) else []
+    redeem_amz = config.script.get("redeem_amz", False)
 
     # **************************************************************
-    # Get program configuration
+    # Skip the work already recorded in the ledger if enabled
     # **************************************************************
-    logger.info("Reading configuration file...")
-    # Get path of config file in the parent directory
-    config_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config.yaml"))
-    try:
-        # Read config file
-        config = parse_config(config_file_path)
-    except ValueError as e:
-        logger.error(str(e))
-        exit(1)
-    except FileNotFoundError:
-        logger.error('Configuration file "config.yml" not found')
-        exit(1)
-    logger.info("Configuration file read successfully")
-    logger.debug(f"Configuration: {config}")
+    amazon_cards: List[AmazonCard] = []
+    pending_tango_cards = tango_cards
+    # Tango Cards whose work is already done, their emails are cleaned up in case the previous run did not
+    finished_tango_cards: List[TangoCard] = []
+    if ledger:
+        ledger.record_scraped(tango_cards)
+        pending_tango_cards = []
+        for tc in tango_cards:
+            finished, resumed_amazon_card = resume_from_ledger(ledger, tc, redeem_amz)
+            if finished:
+                finished_tango_cards.append(tc)
+            elif resumed_amazon_card:
+                amazon_cards.append(resumed_amazon_card)
+            else:
+                pending_tango_cards.append(tc)
+        if finished_tango_cards:
+            logger.info(f"Skipping {len(finished_tango_cards)} Tango Card(s) already processed in a previous run")
+        tango_cards = [tc for tc in tango_cards if tc not in finished_tango_cards]
 
     # **************************************************************
-    # Scrape Tango Cards from Gmail
+    # Scrape Amazon gift card codes from Tango Cards over HTTP if enabled
     # **************************************************************
-    logger.info("Scraping Tango Cards from Gmail...")
-    tango_cards = scrape_tango_cards(
-        email=config.gmail.get("email", ""),
-        app_password=config.gmail.get("app_password", ""),
-        from_list=config.from_list,
-        trash=config.script.get("trash", False),
-    )
-    logger.debug(f"Tango Cards: {tango_cards}")
-    if not tango_cards:
-        logger.info("No Tango Cards found, exiting...")
-        exit(0)
-    logger.info("Tango Cards scraped successfully")
+    on_amazon_card = ledger.record_tango_redeemed if ledger else None
+    browser_tango_cards = pending_tango_cards
+    if pending_tango_cards and config.script.get("tango_http", False):
+        logger.info("Scraping Amazon gift card codes from Tango Cards over HTTP...")
+        session = create_tango_session(proxy=get_best_working_proxy(proxies) if proxies else "")  # type: ignore
+        http_amazon_cards, browser_tango_cards = scrap_amazon_gift_cards_http(
+            tango_cards=pending_tango_cards, session=session, on_amazon_card=on_amazon_card
+        )
+        amazon_cards += http_amazon_cards
+        session.close()
+        logger.info("Finished scraping Amazon gift card codes from Tango Cards over HTTP")
 
     # **************************************************************
     # Get Selenium browser
     # **************************************************************
-    # Start virtual display if enabled
-    if config.script.get("virtual_display", False) and not config.script.get("headless", True):
-        logger.info("Starting virtual display...")
-        Display(visible=False, size=(1920, 1080)).start()
-        logger.info("Virtual display started successfully")
-
-    logger.info("Loading Selenium browser...")
-    browser = get_chrome_browser(
-        headless=config.script.get("headless", True),
-        no_images=config.script.get("no_images", True),
-        proxies=config.proxies.get("list", []) if config.proxies.get("enable", False) else [],  # type: ignore
-    )
-    logger.info("Selenium browser loaded successfully")
+    # The browser is only needed for the Tango Cards that could not be scraped over HTTP and for Amazon
+    launcher = launcher or get_browser_launcher(config)
+    display = None
+    browser = None
+    if browser_tango_cards or (redeem_amz and amazon_cards):
+        # Wait for the browser if it was started in advance, or start it now
+        display, browser = launcher.get()
+    else:
+        launcher.cancel()
 
     # **************************************************************
     # Scrape Amazon gift card codes from Tango Cards
     # **************************************************************
-    logger.info("Scraping Amazon gift card codes from Tango Cards...")
-    amazon_cards = scrap_amazon_gift_cards(browser=browser, tango_cards=tango_cards)
-    logger.info("Finished scraping Amazon gift card codes from Tango Cards")
+    def replace_browser(new_browser: Optional[WebDriver]) -> None:
+        # Keep the browser that replaced the loaded one if it crashed or its proxy was retired, to use it for Amazon
+        nonlocal browser
+        browser = new_browser
+
+    if browser and browser_tango_cards:
+        logger.info("Scraping Amazon gift card codes from Tango Cards...")
+        tango_workers = config.script.get("tango_workers", DEFAULT_TANGO_WORKERS)
+        tango_max_attempts = config.script.get("tango_max_attempts", TANGO_MAX_ATTEMPTS)
+        tango_deadline = config.script.get("tango_deadline", TANGO_DEADLINE)
+        # Give every browser its own proxy and move it to another one if its proxy starts failing
+        proxy_manager = None
+        if proxies:
+            error_threshold = config.proxies.get("error_threshold", PROXY_ERROR_THRESHOLD)
+            proxy_manager = ProxyManager(proxies, error_threshold=error_threshold)  # type: ignore
+        if proxy_manager or (tango_workers > 1 and len(browser_tango_cards) > 1):
+            # Scrape the Tango Cards with a pool of browsers, the one that has already been loaded included. A single
+            # browser is also run as a pool when proxies are enabled, so it can be moved off a failing proxy.
+            amazon_cards += scrap_amazon_gift_cards_in_parallel(
+                browser_factory=get_browser_factory(config),
+                tango_cards=browser_tango_cards,
+                workers=tango_workers,  # type: ignore
+                browser=browser,
+                on_amazon_card=on_amazon_card,
+                max_attempts=tango_max_attempts,  # type: ignore
+                deadline=tango_deadline,  # type: ignore
+                proxy_manager=proxy_manager,
+                on_browser_replaced=replace_browser,
+            )
+        else:
+            amazon_cards += scrap_amazon_gift_cards(
+                browser=browser,
+                tango_cards=browser_tango_cards,
+                on_amazon_card=on_amazon_card,
+                max_attempts=tango_max_attempts,  # type: ignore
+                deadline=tango_deadline,  # type: ignore
+                browser_factory=get_browser_factory(config),
+                on_browser_replaced=replace_browser,
+            )
+        logger.info("Finished scraping Amazon gift card codes from Tango Cards")
+
+    # Keep the order of the Tango Cards when some of them were scraped over HTTP and the rest with the browser
+    positions = {tc: i for i, tc in enumerate(tango_cards)}
+    amazon_cards.sort(key=lambda ac: positions.get(ac.tango_card, 0))  # type: ignore
     logger.debug(f"Amazon gift card codes: {[str(ac) for ac in amazon_cards]}")
 
     # **************************************************************
     # Attempt to redeem Amazon gift card codes if enabled
     # **************************************************************
-    balance_results = ("", "")
-    if config.script.get("redeem_amz", False):
+    balance_results: Dict[str, Tuple[str, str]] = {}
+    if redeem_amz and amazon_cards:
         logger.info("Attempting to redeem Amazon gift card codes...")
+        # Every marketplace is redeemed in its own browser at the same time, the one that has already been loaded
+        # included if it is still running
+        balance_results = redeem_amazon_gift_cards_by_marketplace(
+            browser_factory=get_marketplace_browser_factory(config),
+            amazon_cards=amazon_cards,
+            email=config.amazon.get("email", ""),
+            password=config.amazon.get("password", ""),
+            otp=config.amazon.get("otp", ""),
+            on_redeemed=ledger.record_amazon_redeemed if ledger else None,
+            reuse_session=config.script.get("persistent_profile", False),
+            browser=browser,
+        )
+        logger.info("Finished redeeming Amazon gift card codes")
+        logger.debug(f"Amazon gift card codes: {[str(ac) for ac in amazon_cards]}")
+        logger.debug(f"Balance results: {balance_results}")
+
+    # Close Selenium browser
+    if browser:
+        quit_chrome_browser(browser)
+    if display:
+        display.stop()
+
+    return report_tango_cards(config, tango_cards, amazon_cards, finished_tango_cards, balance_results)
+
+
+def stream_tango_cards(
+    config: ConfigFile,
+    tango_cards: Iterable[TangoCard],
+    ledger: Optional[CardLedger] = None,
+    launcher: Optional[BrowserLauncher] = None,
+) -> Tuple[List[TangoCard], List[TangoCard]]:
+    """
+    Process the Tango Cards while they are still being scraped, redeeming every Amazon gift card as soon as it is
+    obtained, and report the results once all of them are done.
+
+    The stages run at the same time, connected by bounded queues: the Tango Cards are scraped (e.g. from Gmail) in
+    the background, a second thread gets their Amazon gift cards over HTTP or with its own browser, and this thread
+    redeems them with the browser of the launcher. An error while scraping the Tango Cards ends the stream instead of
+    the run, and the cards done so far are reported even if the Amazon stage fails.
+
+    Args:
+        config: the configuration of the program
+        tango_cards: the Tango Cards that will be processed, usually a generator that is still scraping them
+        ledger: the ledger where the state of every card is recorded, None to not record it
+        launcher: the launcher of the browser, which may have been started already, None to create a new one
+
+    Returns:
+        A tuple containing the Tango Cards that were scraped and the ones that could not be processed, whose emails
+        are left to be scraped again
+    """
+    proxies = config.proxies.get("list", []) if config.proxies.get("enable", False) else []
+    redeem_amz = config.script.get("redeem_amz", False)
+    launcher = launcher or get_browser_launcher(config)
+    on_amazon_card = ledger.record_tango_redeemed if ledger else None
+
+    scraped_tango_cards: List[TangoCard] = []
+    finished_tango_cards: List[TangoCard] = []
+
+    # **************************************************************
+    # Scrape Amazon gift card codes from Tango Cards as they arrive
+    # **************************************************************
+    def scrape_amazon_cards(emit: Callable[[AmazonCard], None]) -> None:
+        session = None
+        if config.script.get("tango_http", False):
+            session = create_tango_session(proxy=get_best_working_proxy(proxies) if proxies else "")  # type: ignore
+
+        def get_browser_tango_cards() -> Iterator[TangoCard]:
+            # The cards already done and the ones redeemed over HTTP are passed on without waiting for the browser
+            for tc in tango_cards:
+                scraped_tango_cards.append(tc)
+                # Start the browser that redeems the Amazon gift cards while the first one is being obtained, only
+                # once as the launcher can be started again after handing it over
+                if redeem_amz and config.script.get("prelaunch_browser", True) and len(scraped_tango_cards) == 1:
+                    launcher.start()  # type: ignore
+                if ledger:
+                    ledger.record_scraped([tc])
+                    finished, resumed_amazon_card = resume_from_ledger(ledger, tc, redeem_amz)
+                    if finished:
+                        logger.info("Skipping a Tango Card already processed in a previous run")
+                        finished_tango_cards.append(tc)
+                        continue
+                    if resumed_amazon_card:
+                        emit(resumed_amazon_card)
+                        continue
+                if session:
+                    http_amazon_cards, _ = scrap_amazon_gift_cards_http(
+                        tango_cards=[tc], session=session, on_amazon_card=on_amazon_card
+                    )
+                    if http_amazon_cards:
+                        emit(http_amazon_cards[0])
+                        continue
+                yield tc
+
         try:
-            balance_results = redeem_amazon_gift_cards(
-                browser=browser,
-                amazon_cards=amazon_cards,
+            for amazon_card in iter_amazon_gift_cards(
+                browser_factory=get_browser_factory(config),
+                tango_cards=get_browser_tango_cards(),
+                on_amazon_card=on_amazon_card,
+                max_attempts=config.script.get("tango_max_attempts", TANGO_MAX_ATTEMPTS),  # type: ignore
+                deadline=config.script.get("tango_deadline", TANGO_DEADLINE),  # type: ignore
+            ):
+                emit(amazon_card)
+        except WebDriverException as e:
+            # Keep the Amazon gift cards obtained so far, their Tango Cards are scraped again in the next run
+            logger.error(f"Could not scrape Amazon gift card codes from Tango Cards: {e}")
+        except StreamStopped:
+            raise
+        except Exception as e:
+            # Any other error of the stages upstream (e.g. the Gmail connection dropping) only ends the stream, so
+            # the Amazon gift cards obtained so far are still redeemed and reported
+            logger.error(f"Could not keep scraping the Tango Cards: {e!r}")
+        finally:
+            if session:
+                session.close()
+
+    amazon_cards: List[AmazonCard] = []
+
+    def collect(stream_amazon_cards: Iterator[AmazonCard]) -> Iterator[AmazonCard]:
+        try:
+            for ac in stream_amazon_cards:
+                amazon_cards.append(ac)
+                yield ac
+        finally:
+            # Stop the stages upstream if the Amazon stage stops early
+            stream_amazon_cards.close()  # type: ignore
+
+    logger.info("Scraping and redeeming the Tango Cards as they arrive...")
+    amazon_card_stream = collect(stream(scrape_amazon_cards))
+
+    # **************************************************************
+    # Attempt to redeem Amazon gift card codes as they arrive if enabled
+    # **************************************************************
+    display = None
+    browser = None
+    balance_results: Dict[str, Tuple[str, str]] = {}
+    unprocessed_tango_cards: List[TangoCard] = []
+    try:
+        first_amazon_card = next(amazon_card_stream, None) if redeem_amz else None
+        if first_amazon_card:
+            # Wait for the browser if it was started in advance, or start it now
+            display, browser = launcher.get()
+            balance_results = redeem_amazon_gift_cards_from_stream(
+                browser_factory=get_marketplace_browser_factory(config),
+                amazon_cards=chain([first_amazon_card], amazon_card_stream),
                 email=config.amazon.get("email", ""),
                 password=config.amazon.get("password", ""),
                 otp=config.amazon.get("otp", ""),
+                on_redeemed=ledger.record_amazon_redeemed if ledger else None,
+                reuse_session=config.script.get("persistent_profile", False),
+                browser=browser,
             )
-            logger.info("Finished redeeming Amazon gift card codes")
-            logger.debug(f"Amazon gift card codes: {[str(ac) for ac in amazon_cards]}")
             logger.debug(f"Balance results: {balance_results}")
-        except ValueError as e:
+        else:
+            # Nothing to redeem, just wait for the rest of the stages
+            for _ in amazon_card_stream:
+                pass
+        logger.info("Finished scraping and redeeming the Tango Cards")
+    finally:
+        # Close Selenium browser, or discard it if it was never handed over, even if the Amazon stage failed
+        amazon_card_stream.close()
+        if browser:
+            quit_chrome_browser(browser)
+        else:
+            launcher.cancel()
+        if display:
+            display.stop()
+
+        # Report the cards that are done even if the Amazon stage failed, so their emails are cleaned up
+        scraped_so_far = list(scraped_tango_cards)
+        if scraped_so_far:
+            reported_tango_cards = [tc for tc in scraped_so_far if tc not in finished_tango_cards]
+            # Report the Amazon gift cards in the order of their Tango Cards, not in the order they were obtained
+            positions = {tc: i for i, tc in enumerate(reported_tango_cards)}
+            amazon_cards.sort(key=lambda ac: positions.get(ac.tango_card, 0))  # type: ignore
+            logger.debug(f"Amazon gift card codes: {[str(ac) for ac in amazon_cards]}")
+            unprocessed_tango_cards = report_tango_cards(
+                config, reported_tango_cards, amazon_cards, finished_tango_cards, balance_results
+            )
+    return (scraped_so_far, unprocessed_tango_cards)
+
+
+def resume_from_ledger(
+    ledger: CardLedger, tango_card: TangoCard, redeem_amz: bool
+) -> Tuple[bool, Optional[AmazonCard]]:
+    """
+    Check how far a Tango Card got in the previous runs recorded in the ledger.
+
+    Args:
+        ledger: the ledger where the state of every card is recorded
+        tango_card: the Tango Card to check
+        redeem_amz: whether the Amazon gift cards are redeemed
+
+    Returns:
+        A tuple containing whether the work of the Tango Card is already done, and the Amazon gift card obtained from
+        it in a previous run if it still has to be redeemed (None otherwise)
+    """
+    entry = ledger.get_entry(tango_card)
+    if entry and (entry.status == AMAZON_REDEEMED or (entry.status == TANGO_REDEEMED and not redeem_amz)):
+        return (True, None)
+    if entry and entry.status == TANGO_REDEEMED:
+        # Resume from the Amazon gift card code obtained in a previous run
+        return (
+            False,
+            AmazonCard(
+                redeem_code=entry.redeem_code,
+                redeem_status=False,
+                amazon_link=tango_card.amazon_link,
+                tango_card=tango_card,
+            ),
+        )
+    return (False, None)
+
+
+def report_tango_cards(
+    config: ConfigFile,
+    tango_cards: List[TangoCard],
+    amazon_cards: List[AmazonCard],
+    finished_tango_cards: List[TangoCard],
+    balance_results: Dict[str, Tuple[str, str]],
+) -> List[TangoCard]:
+    """
+    Clean up the emails of the processed Tango Cards and report the results.
+
+    Args:
+        config: the configuration of the program
+        tango_cards: the Tango Cards that were processed in this run
+        amazon_cards: the Amazon gift cards obtained from them
+        finished_tango_cards: the Tango Cards skipped because they were already processed in a previous run
+        balance_results: the balances before and after redeeming, by marketplace
+
+    Returns:
+        The Tango Cards that could not be processed, whose emails are left to be scraped again
+    """
+    # **************************************************************
+    # Clean up the emails of the Tango Cards that have been processed
+    # **************************************************************
+    # Emails whose Tango Card could not be redeemed are left untouched so they are scraped again in the next run
+    app_passwords = {
+        account.get("email", ""): account.get("app_password", "")
+        for account in [config.gmail] + (config.gmail_accounts or [])
+    }
+    processed_tango_cards = [ac.tango_card for ac in amazon_cards if ac.tango_card] + finished_tango_cards
+    unprocessed_tango_cards = [tc for tc in tango_cards if tc not in processed_tango_cards]
+    processed_uids: Dict[str, List[str]] = {}
+    for tc in processed_tango_cards:
+        if tc.email_uid:
+            email = tc.email_address or config.gmail.get("email", "")
+            processed_uids.setdefault(email, []).append(tc.email_uid)
+    for email, uids in processed_uids.items():
+        logger.info(f"Cleaning up processed Tango Card emails of {email}...")
+        try:
+            apply_mailbox_actions(
+                email=email,
+                app_password=app_passwords.get(email, ""),
+                uids=uids,
+                trash=config.script.get("trash", False),
+                mark_seen=config.script.get("mark_seen", True),
+                label=config.script.get("processed_label", None),  # type: ignore
+            )
+            logger.info("Processed Tango Card emails cleaned up successfully")
+        except (imaplib.IMAP4.error, OSError) as e:
             logger.error(str(e))
 
-    # Close Selenium browser
-    browser.quit()
+    if not tango_cards:
+        logger.info("All the Tango Cards were already processed, nothing to report")
+        return unprocessed_tango_cards
 
     # **************************************************************
     # Build message that is going to be stored and/or sent
@@ -147,6 +608,234 @@ def main() -> None:
         except RequestException as e:
             logger.error(str(e))
 
+    return unprocessed_tango_cards
+
+
+def save_scraped_checkpoints(
+    checkpoint_file: str,
+    checkpoints: Dict[str, MailboxCheckpoint],
+    unprocessed_tango_cards: List[TangoCard],
+    default_email: str,
+) -> None:
+    """
+    Save the checkpoint reached by the scrape of every inbox, below the emails whose Tango Cards were not processed.
+
+    Args:
+        checkpoint_file: the path of the file where the checkpoint of every account is stored
+        checkpoints: the checkpoint reached by the scrape of every inbox, by email address
+        unprocessed_tango_cards: the Tango Cards that could not be processed
+        default_email: the email address of the Tango Cards that do not have one
+    """
+    for email, checkpoint in checkpoints.items():
+        unprocessed_uids = [
+            tc.email_uid for tc in unprocessed_tango_cards if (tc.email_address or default_email) == email
+        ]
+        try:
+            save_checkpoint(checkpoint_file, email, cap_checkpoint(checkpoint, unprocessed_uids))
+        except IOError as e:
+            logger.error(str(e))
+
+
+def scrape_and_process_tango_cards(config: ConfigFile, ledger: Optional[CardLedger] = None) -> None:
+    """
+    Scrape the Tango Cards from Gmail (or the mailbox source), process them and keep watching Gmail if enabled.
+
+    Args:
+        config: the configuration of the program
+        ledger: the ledger where the state of every card is recorded, None to not record it
+    """
+    # **************************************************************
+    # Scrape Tango Cards from Gmail
+    # **************************************************************
+    logger.info("Scraping Tango Cards from Gmail...")
+    # Get path of the file that stores the point up to which the inbox has been scraped
+    checkpoint_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "gmail_checkpoints.json"))
+    mailbox_source = config.script.get("mailbox_source", None)
+    # Start the browser in the background as soon as the first Tango Card is found, so it is launched while the
+    # rest of the emails are scraped
+    launcher = get_browser_launcher(config)
+    on_tango_card = (lambda tc: launcher.start()) if config.script.get("prelaunch_browser", True) else None
+    # The point every inbox has been scraped up to, so the watch starts from there even without incremental mode
+    scraped_checkpoints: Dict[str, MailboxCheckpoint] = {}
+    unprocessed_tango_cards: List[TangoCard] = []
+    streaming = config.script.get("streaming", False)
+    if streaming:
+        # Process every Tango Card as soon as it is scraped instead of waiting for the whole inbox
+        if mailbox_source:
+            tango_card_source: Iterable[TangoCard] = iter_tango_cards_from_mailbox(
+                path=os.path.expanduser(mailbox_source),  # type: ignore
+                from_list=config.from_list,
+                extractor=config.script.get("extractor", "regex"),  # type: ignore
+                parse_workers=config.script.get("parse_workers") or DEFAULT_PARSE_WORKERS,  # type: ignore
+            )
+        elif config.gmail_accounts:
+            # The accounts are scraped concurrently and the Tango Cards of every one are streamed as soon as it is done
+            tango_card_source = iter_tango_cards_from_accounts(
+                accounts=[config.gmail] + (config.gmail_accounts or []),
+                from_list=config.from_list,
+                max_connections=config.script.get("max_imap_connections", MAX_IMAP_CONNECTIONS),  # type: ignore
+                timeout=config.script.get("account_timeout", ACCOUNT_SCRAPE_TIMEOUT),  # type: ignore
+                checkpoint_file=checkpoint_file_path if config.script.get("incremental", False) else None,
+                server_filter=config.script.get("server_filter", False),
+                extractor=config.script.get("extractor", "regex"),  # type: ignore
+                on_checkpoint=scraped_checkpoints.__setitem__,
+            )
+        else:
+            tango_card_source = iter_tango_cards(
+                email=config.gmail.get("email", ""),
+                app_password=config.gmail.get("app_password", ""),
+                from_list=config.from_list,
+                checkpoint_file=checkpoint_file_path if config.script.get("incremental", False) else None,
+                server_filter=config.script.get("server_filter", False),
+                extractor=config.script.get("extractor", "regex"),  # type: ignore
+                parse_workers=config.script.get("parse_workers") or DEFAULT_PARSE_WORKERS,  # type: ignore
+                on_checkpoint=scraped_checkpoints.__setitem__,
+            )
+        try:
+            # Keep scraping the emails in the background while the first Tango Cards are processed
+            # The checkpoints reached by the scrape are only saved below, once the stream has been processed
+            tango_cards, unprocessed_tango_cards = stream_tango_cards(
+                config, prefetch(tango_card_source), ledger, launcher
+            )
+        except FileNotFoundError as e:
+            logger.error(str(e))
+            exit(1)
+    elif mailbox_source:
+        # Scrape an exported mailbox instead of Gmail
+        try:
+            tango_cards = scrape_tango_cards_from_mailbox(
+                path=os.path.expanduser(mailbox_source),  # type: ignore
+                from_list=config.from_list,
+                extractor=config.script.get("extractor", "regex"),  # type: ignore
+                parse_workers=config.script.get("parse_workers") or DEFAULT_PARSE_WORKERS,  # type: ignore
+                on_tango_card=on_tango_card,
+            )
+        except FileNotFoundError as e:
+            logger.error(str(e))
+            exit(1)
+    elif config.gmail_accounts:
+        # Scrape all the accounts concurrently
+        tango_cards_by_account = scrape_tango_cards_from_accounts(
+            accounts=[config.gmail] + (config.gmail_accounts or []),
+            from_list=config.from_list,
+            max_connections=config.script.get("max_imap_connections", MAX_IMAP_CONNECTIONS),  # type: ignore
+            timeout=config.script.get("account_timeout", ACCOUNT_SCRAPE_TIMEOUT),  # type: ignore
+            checkpoint_file=checkpoint_file_path if config.script.get("incremental", False) else None,
+            server_filter=config.script.get("server_filter", False),
+            extractor=config.script.get("extractor", "regex"),  # type: ignore
+            on_tango_card=on_tango_card,
+            on_checkpoint=scraped_checkpoints.__setitem__,
+        )
+        tango_cards = [tc for account_tango_cards in tango_cards_by_account.values() for tc in account_tango_cards]
+    else:
+        tango_cards = scrape_tango_cards(
+            email=config.gmail.get("email", ""),
+            app_password=config.gmail.get("app_password", ""),
+            from_list=config.from_list,
+            checkpoint_file=checkpoint_file_path if config.script.get("incremental", False) else None,
+            server_filter=config.script.get("server_filter", False),
+            extractor=config.script.get("extractor", "regex"),  # type: ignore
+            parse_workers=config.script.get("parse_workers") or DEFAULT_PARSE_WORKERS,  # type: ignore
+            on_tango_card=on_tango_card,
+            on_checkpoint=scraped_checkpoints.__setitem__,
+        )
+    logger.debug(f"Tango Cards: {tango_cards}")
+    if tango_cards:
+        # The Tango Cards streamed have already been processed
+        if not streaming:
+            logger.info("Tango Cards scraped successfully")
+            unprocessed_tango_cards = process_tango_cards(config, tango_cards, ledger, launcher)
+    else:
+        launcher.cancel()
+
+    # Only store the point up to which the inboxes have been scraped now that their Tango Cards have been processed,
+    # so the emails of the ones that could not be processed are scraped again in the next run
+    if config.script.get("incremental", False):
+        save_scraped_checkpoints(
+            checkpoint_file_path, scraped_checkpoints, unprocessed_tango_cards, config.gmail.get("email", "")
+        )
+
+    if not tango_cards and (not config.script.get("watch", False) or mailbox_source):
+        logger.info("No Tango Cards found, exiting...")
+        exit(0)
+
+    # **************************************************************
+    # Keep watching Gmail for new Tango Cards if enabled
+    # **************************************************************
+    if config.script.get("watch", False) and not mailbox_source:
+        watch_tango_cards(
+            email=config.gmail.get("email", ""),
+            app_password=config.gmail.get("app_password", ""),
+            from_list=config.from_list,
+            on_tango_cards=lambda new_tango_cards: process_tango_cards(config, new_tango_cards, ledger),
+            checkpoint_file=checkpoint_file_path if config.script.get("incremental", False) else None,
+            server_filter=config.script.get("server_filter", False),
+            extractor=config.script.get("extractor", "regex"),  # type: ignore
+            parse_workers=config.script.get("parse_workers") or DEFAULT_PARSE_WORKERS,  # type: ignore
+            checkpoint=scraped_checkpoints.get(config.gmail.get("email", "")),
+        )
+
+
+def main() -> None:
+    # Reset log file
+    reset_log_file()
+
+    # **************************************************************
+    # Show welcome message
+    # **************************************************************
+    logger.info("***********************************************")
+    logger.info("*                                             *")
+    logger.info("*          Amazon Tango Card Scraper          *")
+    logger.info("*                                             *")
+    logger.info("***********************************************")
+
+    # **************************************************************
+    # Get program configuration
+    # **************************************************************
+    logger.info("Reading configuration file...")
+    # Get path of config file in the parent directory
+    config_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config.yaml"))
+    try:
+        # Read config file
+        config = parse_config(config_file_path)
+    except ValueError as e:
+        logger.error(str(e))
+        exit(1)
+    except FileNotFoundError:
+        logger.error('Configuration file "config.yml" not found')
+        exit(1)
+    logger.info("Configuration file read successfully")
+    logger.debug(f"Configuration: {config}")
+
+    # Set how the proxies are probed, caching the results so the next runs do not probe them again
+    configure_proxy_probing(
+        probe_url=config.proxies.get("probe_url", PROXY_PROBE_URL),  # type: ignore
+        deadline=config.proxies.get("probe_deadline", PROXY_PROBE_DEADLINE),  # type: ignore
+        cache_file=os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "proxy_cache.json")),
+        cache_ttl=config.proxies.get("cache_ttl", PROXY_CACHE_TTL),  # type: ignore
+    )
+
+    # Set how the browser waits for elements and check the requests it will block
+    try:
+        configure_waits(
+            strategy=config.script.get("wait_strategy", "poll"),  # type: ignore
+            poll_frequency=config.script.get("wait_poll_frequency", POLL_FREQUENCY),  # type: ignore
+        )
+        get_blocked_urls(config)
+    except ValueError as e:
+        logger.error(str(e))
+        exit(1)
+
+    # Open the ledger that records the state of every card if enabled, closing it on every way out (exit included)
+    ledger = None
+    if config.script.get("ledger", False):
+        ledger_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "cards.sqlite3"))
+        ledger = CardLedger(ledger_file_path)
+    try:
+        scrape_and_process_tango_cards(config, ledger)
+    finally:
+        if ledger:
+            ledger.close()
     logger.info("All done! Exiting...")
 
 
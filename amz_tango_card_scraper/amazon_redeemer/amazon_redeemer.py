@@ -2,28 +2,56 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from amz_tango_card_scraper.browser.blocking import drain_performance_log
+from amz_tango_card_scraper.browser.chrome import quit_chrome_browser
+from amz_tango_card_scraper.utils.logger import setup_logger
 from amz_tango_card_scraper.utils.schemas import AmazonCard
 
-from .helpers import get_amazon_balance, redeem_amazon_gift_card, sign_in_to_amazon
+from .helpers import (
+    get_marketplace,
+    go_to_redeem_page,
+    is_signed_in_to_amazon,
+    read_amazon_balance,
+    redeem_amazon_gift_card,
+    redeem_amazon_gift_card_in_page,
+    sign_in_to_amazon,
+)
 
 if TYPE_CHECKING:
     from selenium.webdriver.chrome.webdriver import WebDriver
 
+logger = setup_logger(logger_name=__name__)
+
 
 def redeem_amazon_gift_cards(
-    browser: WebDriver, amazon_cards: List[AmazonCard], email: str, password: str, otp: str
+    browser: WebDriver,
+    amazon_cards: List[AmazonCard],
+    email: str,
+    password: str,
+    otp: str,
+    on_redeemed: Optional[Callable[[AmazonCard], None]] = None,
+    reuse_session: bool = False,
 ) -> Tuple[str, str]:
     """
     Redeems the amazon gift cards.
 
+    Every code is applied on the same redeem page, which also shows the balance before and after, so the page is
+    loaded at most once per call.
+
     Args:
         browser: the browser that will be used to redeem the amazon gift cards
         amazon_cards: the amazon gift cards that will be redeemed
         email: the email that will be used to sign in to Amazon
         password: the password that will be used to sign in to Amazon
         otp: the otp key that will be used to sign in to Amazon
+        on_redeemed: function called with every amazon gift card as soon as it is redeemed
+        reuse_session: whether to skip the sign in if the browser is still signed in (e.g. with a persistent
+                       profile) and keep the new session for the next runs otherwise
 
     Raises:
         ValueError: If the amazon gift cards are from different geographical regions or if the sign in process failed
@@ -32,20 +60,229 @@ def redeem_amazon_gift_cards(
         A tuple containing the previous balance and the current balance
     """
     # Check that every amazon link comes from the same geographical region
-    if len(set([ac.amazon_link for ac in amazon_cards])) > 1:
+    if len(set([get_marketplace(ac.amazon_link) for ac in amazon_cards])) > 1:
         raise ValueError("All Amazon links must come from the same geographical region")
 
-    # Sign in to Amazon
-    sign_in_to_amazon(browser, email, password, otp, amazon_cards[0].amazon_link)
-
-    # Get balance prior to redeeming
-    prev_balance = get_amazon_balance(browser, amazon_cards[0].amazon_link)
+    # Sign in and get balance prior to redeeming
+    prev_balance = _start_session(browser, amazon_cards[0].amazon_link, email, password, otp, reuse_session)
 
     # Redeem Amazon gift cards
     for ac in amazon_cards:
-        redeem_amazon_gift_card(browser, ac)
+        _redeem_in_session(browser, ac, on_redeemed)
 
     # Get balance after redeeming
-    balance = get_amazon_balance(browser, amazon_cards[0].amazon_link)
+    balance = read_amazon_balance(browser)
 
     return (prev_balance, balance)
+
+
+def _start_session(
+    browser: WebDriver, amazon_link: str, email: str, password: str, otp: str, reuse_session: bool
+) -> str:
+    """
+    Signs in to the marketplace of an amazon link and leaves the browser on its redeem page.
+
+    Args:
+        browser: the browser that will be used to redeem the amazon gift cards
+        amazon_link: the amazon link of the marketplace
+        email: the email that will be used to sign in to Amazon
+        password: the password that will be used to sign in to Amazon
+        otp: the otp key that will be used to sign in to Amazon
+        reuse_session: whether to skip the sign in if the browser is still signed in
+
+    Raises:
+        ValueError: If the sign in process failed
+
+    Returns:
+        The balance prior to redeeming
+    """
+    # Sign in to Amazon, unless the session of a previous run is still valid
+    if reuse_session and is_signed_in_to_amazon(browser, amazon_link):
+        logger.info("Already signed in to Amazon, skipping sign in")
+    else:
+        sign_in_to_amazon(browser, email, password, otp, amazon_link, remember_me=reuse_session)
+
+    # Stay on the redeem page for every code, it is only loaded if the browser is not on it already
+    go_to_redeem_page(browser, amazon_link)
+
+    return read_amazon_balance(browser)
+
+
+def _redeem_in_session(
+    browser: WebDriver, amazon_card: AmazonCard, on_redeemed: Optional[Callable[[AmazonCard], None]] = None
+) -> None:
+    """
+    Redeems an amazon gift card on the redeem page of a session started with _start_session.
+
+    Args:
+        browser: the browser of the session
+        amazon_card: the amazon gift card that will be redeemed
+        on_redeemed: function called with the amazon gift card if it is redeemed
+    """
+    try:
+        redeem_amazon_gift_card_in_page(browser, amazon_card)
+    except TimeoutException:
+        # The page is not in the expected state (e.g. Amazon navigated away), reload it and try once more
+        logger.warning("Redeem page is not responding, reloading it...")
+        redeem_amazon_gift_card(browser, amazon_card)
+    finally:
+        # Keep the performance log of long sessions from growing with every card
+        drain_performance_log(browser)
+    if amazon_card.redeem_status and on_redeemed:
+        on_redeemed(amazon_card)
+
+
+def group_amazon_cards_by_marketplace(amazon_cards: List[AmazonCard]) -> Dict[str, List[AmazonCard]]:
+    """
+    Groups the amazon gift cards by the marketplace they have to be redeemed in.
+
+    Args:
+        amazon_cards: the amazon gift cards that will be grouped
+
+    Returns:
+        The marketplaces (e.g. "amazon.es") mapped to their amazon gift cards, in order of first appearance
+    """
+    groups: Dict[str, List[AmazonCard]] = {}
+    for ac in amazon_cards:
+        groups.setdefault(get_marketplace(ac.amazon_link), []).append(ac)
+    return groups
+
+
+def redeem_amazon_gift_cards_by_marketplace(
+    browser_factory: Callable[[str], WebDriver],
+    amazon_cards: List[AmazonCard],
+    email: str,
+    password: str,
+    otp: str,
+    on_redeemed: Optional[Callable[[AmazonCard], None]] = None,
+    reuse_session: bool = False,
+    browser: Optional[WebDriver] = None,
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Redeems the amazon gift cards of every marketplace at the same time, each one in its own browser session.
+
+    Amazon sessions are not shared between marketplaces, so the amazon gift cards are grouped by marketplace and
+    every group is signed in to and redeemed by its own browser (see redeem_amazon_gift_cards). A marketplace that
+    fails does not stop the rest.
+
+    Args:
+        browser_factory: function that returns a new browser for a marketplace (e.g. "amazon.es")
+        amazon_cards: the amazon gift cards that will be redeemed
+        email: the email that will be used to sign in to Amazon
+        password: the password that will be used to sign in to Amazon
+        otp: the otp key that will be used to sign in to Amazon
+        on_redeemed: function called with every amazon gift card as soon as it is redeemed, from the thread of the
+                     marketplace it belongs to
+        reuse_session: whether to skip the sign in if the browser is still signed in (e.g. with a persistent
+                       profile) and keep the new session for the next runs otherwise
+        browser: an already started browser that will be used by the first marketplace instead of starting a new
+                 one. It is not quit when the amazon gift cards are redeemed.
+
+    Returns:
+        The marketplaces mapped to a tuple containing their previous balance and current balance, both empty if
+        the marketplace failed
+    """
+    groups = group_amazon_cards_by_marketplace(amazon_cards)
+
+    def redeem_group(marketplace: str, group: List[AmazonCard], group_browser: Optional[WebDriver]) -> Tuple[str, str]:
+        owned = group_browser is None
+        try:
+            if group_browser is None:
+                logger.info(f"Loading Selenium browser for {marketplace}...")
+                group_browser = browser_factory(marketplace)
+            logger.info(f"Redeeming {len(group)} Amazon gift card(s) in {marketplace}...")
+            return redeem_amazon_gift_cards(
+                group_browser, group, email, password, otp, on_redeemed=on_redeemed, reuse_session=reuse_session
+            )
+        except (ValueError, WebDriverException) as e:
+            logger.error(f"Failed to redeem the Amazon gift cards of {marketplace}: {e}")
+            return ("", "")
+        finally:
+            if group_browser is not None and owned:
+                try:
+                    quit_chrome_browser(group_browser)
+                except WebDriverException:
+                    pass
+
+    with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+        futures = {
+            marketplace: executor.submit(redeem_group, marketplace, group, browser if i == 0 else None)
+            for i, (marketplace, group) in enumerate(groups.items())
+        }
+    return {marketplace: future.result() for marketplace, future in futures.items()}
+
+
+def redeem_amazon_gift_cards_from_stream(
+    browser_factory: Callable[[str], WebDriver],
+    amazon_cards: Iterable[AmazonCard],
+    email: str,
+    password: str,
+    otp: str,
+    on_redeemed: Optional[Callable[[AmazonCard], None]] = None,
+    reuse_session: bool = False,
+    browser: Optional[WebDriver] = None,
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Redeems the amazon gift cards as they arrive, while the rest are still being scraped.
+
+    This is the streaming variant of redeem_amazon_gift_cards_by_marketplace: the session of a marketplace is
+    signed in to when its first amazon gift card arrives and stays on the redeem page, so every amazon gift card is
+    redeemed as soon as it arrives without reloading the page. A marketplace whose session fails is skipped from
+    then on, without stopping the rest.
+
+    Args:
+        browser_factory: function that returns a new browser for a marketplace (e.g. "amazon.es")
+        amazon_cards: the amazon gift cards that will be redeemed (e.g. an iterator that is still scraping them)
+        email: the email that will be used to sign in to Amazon
+        password: the password that will be used to sign in to Amazon
+        otp: the otp key that will be used to sign in to Amazon
+        on_redeemed: function called with every amazon gift card as soon as it is redeemed
+        reuse_session: whether to skip the sign in if the browser is still signed in (e.g. with a persistent
+                       profile) and keep the new session for the next runs otherwise
+        browser: an already started browser that will be used by the first marketplace instead of starting a new
+                 one. It is not quit when the amazon gift cards are redeemed.
+
+    Returns:
+        The marketplaces mapped to a tuple containing their previous balance and current balance, both empty if
+        the marketplace failed
+    """
+    sessions: Dict[str, WebDriver] = {}
+    balance_results: Dict[str, Tuple[str, str]] = {}
+    failed: Set[str] = set()
+    spare_browser = browser
+    try:
+        for ac in amazon_cards:
+            marketplace = get_marketplace(ac.amazon_link)
+            if marketplace in failed:
+                continue
+            try:
+                if marketplace not in sessions:
+                    balance_results[marketplace] = ("", "")
+                    if spare_browser is not None:
+                        sessions[marketplace], spare_browser = spare_browser, None
+                    else:
+                        logger.info(f"Loading Selenium browser for {marketplace}...")
+                        sessions[marketplace] = browser_factory(marketplace)
+                    logger.info(f"Starting Amazon session in {marketplace}...")
+                    prev_balance = _start_session(
+                        sessions[marketplace], ac.amazon_link, email, password, otp, reuse_session
+                    )
+                    balance_results[marketplace] = (prev_balance, "")
+                _redeem_in_session(sessions[marketplace], ac, on_redeemed)
+            except (ValueError, WebDriverException) as e:
+                logger.error(f"Failed to redeem the Amazon gift cards of {marketplace}: {e}")
+                failed.add(marketplace)
+                balance_results[marketplace] = ("", "")
+
+        # Get balance after redeeming
+        for marketplace, session_browser in sessions.items():
+            if marketplace not in failed:
+                balance_results[marketplace] = (balance_results[marketplace][0], read_amazon_balance(session_browser))
+        return balance_results
+    finally:
+        for session_browser in sessions.values():
+            if session_browser is not browser:
+                try:
+                    quit_chrome_browser(session_browser)
+                except WebDriverException:
+                    pass
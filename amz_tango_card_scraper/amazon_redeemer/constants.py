@@ -6,6 +6,7 @@ EMAIL_FIELD_ID = "ap_email"
 CONTINUE_BUTTON_ID = "continue"
 PASSWORD_FIELD_ID = "ap_password"
 SIGN_IN_BTN_1_ID = "signInSubmit"
+REMEMBER_ME_CHECKBOX_NAME = "rememberMe"
 OTP_FIELD_ID = "auth-mfa-otpcode"
 SIGN_IN_BTN_2_ID = "auth-signin-button"
 NAV_LOGO_ID = "nav-logo"
@@ -15,3 +16,16 @@ BALANCE_ELEMENT_ID = "gc-current-balance"
 GIFT_CARD_CODE_FIELD_ID = "gc-redemption-input"
 REDEEM_BUTTON_ID = "gc-redemption-apply-button"
 SUCCESSFUL_REDEEM_BOX_ID = "alertRedemptionSuccess"
+FAILED_REDEEM_BOX_ID = "alertRedemptionError"
+# Path of the page where the gift cards are redeemed and the balance is shown
+REDEEM_PATH = "/gc/redeem"
+# Class that hides elements on Amazon pages, added to the alerts of the previous code before applying the next one
+HIDDEN_CLASS = "a-hidden"
+# Max amount of seconds to wait for the result of a code and for the balance to be updated after it
+REDEEM_RESULT_TIMEOUT = 10
+BALANCE_UPDATE_TIMEOUT = 5
+
+# Part of the URL Amazon redirects to when the session is not valid
+SIGN_IN_PATH = "/ap/signin"
+# Max amount of seconds to wait for the redeem page when checking whether the session is still valid
+SIGNED_IN_PROBE_TIMEOUT = 5
@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 from typing import TYPE_CHECKING
+from urllib.parse import urlparse
 
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
 
 from amz_tango_card_scraper.browser.extra_actions import (
     wait_for_element_until_clickable,
@@ -43,7 +46,56 @@ def get_amazon_sign_in_link(amazon_link: str) -> str:
     return sign_in_link
 
 
-def sign_in_to_amazon(browser: WebDriver, email: str, password: str, otp: str, amazon_link: str) -> None:
+def get_marketplace(amazon_link: str) -> str:
+    """
+    Get the marketplace of the given amazon link, which is the same for every link of a geographical region
+
+    Args:
+        amazon_link: The amazon link to get the marketplace for (e.g. "https://www.amazon.es/")
+
+    Returns:
+        The domain of the marketplace (e.g. "amazon.es")
+    """
+
+    netloc = urlparse(amazon_link if "//" in amazon_link else "https://" + amazon_link).netloc.lower()
+    return netloc.removeprefix("www.")
+
+
+def is_signed_in_to_amazon(browser: WebDriver, amazon_link: str) -> bool:
+    """
+    Check whether the browser is still signed in to Amazon, with a single page load
+
+    The gift card redeem page is only shown to signed in users, the rest are redirected to the sign in page. The
+    browser is left on the redeem page.
+
+    Args:
+        browser: The browser to use
+        amazon_link: The amazon link to check
+
+    Returns:
+        True if the browser is signed in, False otherwise
+    """
+
+    from .constants import (
+        GIFT_CARD_CODE_FIELD_ID,
+        REDEEM_PATH,
+        SIGN_IN_PATH,
+        SIGNED_IN_PROBE_TIMEOUT,
+    )
+
+    browser.get(amazon_link + REDEEM_PATH)
+    if SIGN_IN_PATH in browser.current_url:
+        return False
+    try:
+        wait_for_element_until_visible(browser, (By.ID, GIFT_CARD_CODE_FIELD_ID), timeout=SIGNED_IN_PROBE_TIMEOUT)
+    except TimeoutException:
+        return False
+    return True
+
+
+def sign_in_to_amazon(
+    browser: WebDriver, email: str, password: str, otp: str, amazon_link: str, remember_me: bool = False
+) -> None:
     """
     Sign in to Amazon with the given credentials and OTP code
 
@@ -53,6 +105,7 @@ def sign_in_to_amazon(browser: WebDriver, email: str, password: str, otp: str, a
         password: The password to sign in with
         otp: The OTP code to sign in with
         amazon_link: The amazon link to sign in to
+        remember_me: Whether to ask Amazon to keep the session, so it can be reused by the next runs
 
     Raises:
         ValueError: If the sign in process failed
@@ -64,6 +117,7 @@ def sign_in_to_amazon(browser: WebDriver, email: str, password: str, otp: str, a
         NAV_LOGO_ID,
         OTP_FIELD_ID,
         PASSWORD_FIELD_ID,
+        REMEMBER_ME_CHECKBOX_NAME,
         SIGN_IN_BTN_1_ID,
         SIGN_IN_BTN_2_ID,
     )
@@ -95,6 +149,13 @@ def sign_in_to_amazon(browser: WebDriver, email: str, password: str, otp: str, a
     logger.info("Writing password...")
     password_field.send_keys(password)  # type: ignore
 
+    # Keep me signed in
+    if remember_me:
+        remember_me_checkboxes = browser.find_elements(By.NAME, REMEMBER_ME_CHECKBOX_NAME)
+        if remember_me_checkboxes and not remember_me_checkboxes[0].is_selected():
+            logger.info("Checking keep me signed in...")
+            remember_me_checkboxes[0].click()
+
     # Click sign in (before OTP)
     sign_in_btn_1 = browser.find_element(By.ID, SIGN_IN_BTN_1_ID)
     sign_in_btn_1.click()
@@ -123,24 +184,33 @@ def sign_in_to_amazon(browser: WebDriver, email: str, password: str, otp: str, a
         raise ValueError("Malformed OTP code or CAPTCHA required")
 
 
-def get_amazon_balance(browser: WebDriver, amazon_link: str) -> str:
+def go_to_redeem_page(browser: WebDriver, amazon_link: str) -> None:
     """
-    Get the current amazon balance
+    Go to the gift card redeem page, unless the browser is already on the one of the same marketplace
+
+    Args:
+        browser: The browser to use
+        amazon_link: The amazon link of the redeem page
+    """
+    from .constants import REDEEM_PATH
+
+    current_url = browser.current_url
+    if REDEEM_PATH not in current_url or get_marketplace(current_url) != get_marketplace(amazon_link):
+        browser.get(amazon_link + REDEEM_PATH)
+
+
+def read_amazon_balance(browser: WebDriver) -> str:
+    """
+    Read the current amazon balance from the redeem page the browser is on, without reloading it
 
     Args:
         browser: The browser to use
-        amazon_link: The amazon link that will be used to get the balance
 
     Returns:
         The current amazon balance as a string or an empty string if the balance could not be retrieved
     """
     from .constants import BALANCE_ELEMENT_ID
 
-    # Get to balance page
-    logger.info("Getting current Amazon balance...")
-    browser.get(amazon_link + "/gc/redeem")
-
-    # Get balance
     try:
         balance_element = wait_for_element_until_visible(browser, (By.ID, BALANCE_ELEMENT_ID))
         balance = balance_element.text
@@ -152,27 +222,64 @@ def get_amazon_balance(browser: WebDriver, amazon_link: str) -> str:
     return balance
 
 
-def redeem_amazon_gift_card(browser: WebDriver, amazon_card: AmazonCard) -> None:
+def get_amazon_balance(browser: WebDriver, amazon_link: str) -> str:
     """
-    Redeem the given amazon gift card
+    Get the current amazon balance
 
     Args:
         browser: The browser to use
+        amazon_link: The amazon link that will be used to get the balance
+
+    Returns:
+        The current amazon balance as a string or an empty string if the balance could not be retrieved
+    """
+    from .constants import REDEEM_PATH
+
+    # Get to balance page
+    logger.info("Getting current Amazon balance...")
+    browser.get(amazon_link + REDEEM_PATH)
+
+    return read_amazon_balance(browser)
+
+
+def redeem_amazon_gift_card_in_page(browser: WebDriver, amazon_card: AmazonCard) -> None:
+    """
+    Redeem the given amazon gift card on the redeem page the browser is on, without reloading it
+
+    The alerts left by the previous code are hidden first, so the result of this code is not mistaken for them. The
+    code counts as redeemed if the error alert stays hidden and the success alert is shown or the balance changes,
+    as the page updates both. The balance is only used if it had been rendered before applying the code.
+
+    Args:
+        browser: The browser to use, on the redeem page (see go_to_redeem_page)
         amazon_card: The amazon card to redeem
     """
     from .constants import (
+        BALANCE_ELEMENT_ID,
+        BALANCE_UPDATE_TIMEOUT,
+        FAILED_REDEEM_BOX_ID,
         GIFT_CARD_CODE_FIELD_ID,
+        HIDDEN_CLASS,
         REDEEM_BUTTON_ID,
+        REDEEM_RESULT_TIMEOUT,
         SUCCESSFUL_REDEEM_BOX_ID,
     )
 
-    # Get to gift card redeem page
-    browser.get(amazon_card.amazon_link + "/gc/redeem")
+    def get_balance_text(browser: WebDriver) -> str:
+        balance_elements = browser.find_elements(By.ID, BALANCE_ELEMENT_ID)
+        return balance_elements[0].text if balance_elements else ""
+
+    # Hide the alerts of the previous code
+    for alert_id in (SUCCESSFUL_REDEEM_BOX_ID, FAILED_REDEEM_BOX_ID):
+        for alert in browser.find_elements(By.ID, alert_id):
+            browser.execute_script("arguments[0].classList.add(arguments[1]);", alert, HIDDEN_CLASS)
+    balance_before = get_balance_text(browser)
 
-    # Write gift card code
+    # Write gift card code, replacing the previous one
     logger.debug(f"Gift card code: {amazon_card.redeem_code}")
     gift_card_code_field = wait_for_element_until_clickable(browser, (By.ID, GIFT_CARD_CODE_FIELD_ID))
     logger.info("Writing gift card code...")
+    gift_card_code_field.clear()
     gift_card_code_field.send_keys(amazon_card.redeem_code)  # type: ignore
 
     # Click redeem button
@@ -180,12 +287,47 @@ def redeem_amazon_gift_card(browser: WebDriver, amazon_card: AmazonCard) -> None
     logger.info("Clicking redeem button...")
     redeem_btn.click()
 
-    # Check if code has been correctly redeemed
+    def balance_changed(browser: WebDriver) -> bool:
+        # A balance that had not been rendered yet (or is rendered late) tells nothing about the code
+        return bool(balance_before) and get_balance_text(browser) not in ("", balance_before)
+
+    # Wait for the result of the code, which only counts as redeemed while the error alert stays hidden
+    failed = EC.visibility_of_element_located((By.ID, FAILED_REDEEM_BOX_ID))
+    succeeded = EC.all_of(
+        EC.none_of(failed),
+        EC.any_of(EC.visibility_of_element_located((By.ID, SUCCESSFUL_REDEEM_BOX_ID)), balance_changed),
+    )
     try:
-        wait_for_element_until_visible(browser, (By.ID, SUCCESSFUL_REDEEM_BOX_ID), timeout=5)
+        WebDriverWait(browser, REDEEM_RESULT_TIMEOUT).until(EC.any_of(succeeded, failed))
     except TimeoutException:
+        pass
+    if not succeeded(browser):
         logger.info("Code couldn't be redeemed!")
         return
 
     logger.info("Code has been successfully redeemed!")
     amazon_card.redeem_status = True
+
+    # Wait for the balance to be updated, so the next code and the final balance start from the right one
+    try:
+        WebDriverWait(browser, BALANCE_UPDATE_TIMEOUT).until(
+            lambda browser: get_balance_text(browser) != balance_before
+        )
+    except TimeoutException:
+        logger.warning("Amazon balance was not updated after redeeming the code")
+
+
+def redeem_amazon_gift_card(browser: WebDriver, amazon_card: AmazonCard) -> None:
+    """
+    Redeem the given amazon gift card
+
+    Args:
+        browser: The browser to use
+        amazon_card: The amazon card to redeem
+    """
+    from .constants import REDEEM_PATH
+
+    # Get to gift card redeem page
+    browser.get(amazon_card.amazon_link + REDEEM_PATH)
+
+    redeem_amazon_gift_card_in_page(browser, amazon_card)
@@ -0,0 +1,186 @@
+"""Module for blocking requests of the browser through the Chrome DevTools protocol."""
+
+from __future__ import annotations
+
+import json
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+from weakref import WeakKeyDictionary
+
+from selenium.common.exceptions import WebDriverException
+from urllib3.exceptions import HTTPError
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import BlockingReport
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = setup_logger(__name__)
+
+# Network.setBlockedURLs only accepts URL patterns, so every resource type is mapped to the patterns of its URLs
+RESOURCE_TYPE_URL_PATTERNS: Dict[str, List[str]] = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.m3u8*"],
+    "analytics": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*connect.facebook.net*",
+        "*hotjar.com*",
+        "*segment.io*",
+        "*newrelic.com*",
+        "*nr-data.net*",
+        "*amazon-adsystem.com*",
+        "*fls-na.amazon.*",
+        "*unagi.amazon.*",
+    ],
+}
+
+# Resource types blocked when blocking is enabled without specifying them. Stylesheets and scripts are never
+# blocked by default as the Tango and Amazon pages do not work without them.
+DEFAULT_BLOCKED_RESOURCE_TYPES = ["font", "media", "analytics"]
+
+# Reason given by Chrome for the requests blocked through Network.setBlockedURLs
+BLOCKED_BY_DEVTOOLS_REASON = "inspector"
+
+# Blocking reports of the performance log entries already drained from every browser with request blocking enabled
+_drained_reports: WeakKeyDictionary = WeakKeyDictionary()
+_drained_reports_lock = threading.Lock()
+
+
+def build_blocked_url_patterns(resource_types: List[str], url_patterns: Optional[List[str]] = None) -> List[str]:
+    """
+    Builds the URL patterns of a blocking profile.
+
+    Args:
+        resource_types: the resource types to block (see RESOURCE_TYPE_URL_PATTERNS)
+        url_patterns: extra URL patterns to block, where "*" matches any text (e.g. "*tracking.example.com*")
+
+    Raises:
+        ValueError: If a resource type does not exist
+
+    Returns:
+        The URL patterns to block, without duplicates
+    """
+    patterns: List[str] = []
+    for resource_type in resource_types:
+        if resource_type not in RESOURCE_TYPE_URL_PATTERNS:
+            raise ValueError(f"Unknown resource type to block: {resource_type}")
+        patterns += RESOURCE_TYPE_URL_PATTERNS[resource_type]
+    patterns += url_patterns or []
+    return list(dict.fromkeys(patterns))
+
+
+def enable_request_blocking(browser: WebDriver, url_patterns: List[str]) -> None:
+    """
+    Blocks the requests of the browser whose URL matches any of the patterns, before they are sent.
+
+    Args:
+        browser: a Chrome browser
+        url_patterns: the URL patterns to block
+    """
+    browser.execute_cdp_cmd("Network.enable", {})  # type: ignore
+    browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": url_patterns})  # type: ignore
+    with _drained_reports_lock:
+        _drained_reports[browser] = BlockingReport(0, 0, 0, 0)
+
+
+def parse_performance_log(entries: List[Dict[str, str]]) -> BlockingReport:
+    """
+    Builds the blocking report of the network events in the performance log of a browser.
+
+    The size of blocked requests is unknown as they are never sent, so it is estimated with the average size of the
+    loaded requests of the same type (e.g. fonts), or of all the loaded requests if none of that type was loaded.
+
+    Args:
+        entries: the entries of the performance log
+
+    Returns:
+        The blocking report
+    """
+    request_types: Dict[str, str] = {}
+    loaded_bytes_by_type: Dict[str, List[int]] = {}
+    blocked_types: List[str] = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method = message.get("method", "")
+        params = message.get("params", {})
+        if method in ("Network.requestWillBeSent", "Network.responseReceived") and "type" in params:
+            request_types[params["requestId"]] = params["type"]
+        elif method == "Network.loadingFinished":
+            request_type = request_types.get(params.get("requestId", ""), "Other")
+            loaded_bytes_by_type.setdefault(request_type, []).append(int(params.get("encodedDataLength", 0)))
+        elif method == "Network.loadingFailed" and params.get("blockedReason") == BLOCKED_BY_DEVTOOLS_REASON:
+            blocked_types.append(params.get("type") or request_types.get(params.get("requestId", ""), "Other"))
+
+    all_loaded_bytes = [size for sizes in loaded_bytes_by_type.values() for size in sizes]
+    average_size = sum(all_loaded_bytes) / len(all_loaded_bytes) if all_loaded_bytes else 0
+    blocked_bytes = 0.0
+    for request_type in blocked_types:
+        sizes = loaded_bytes_by_type.get(request_type)
+        blocked_bytes += sum(sizes) / len(sizes) if sizes else average_size
+
+    return BlockingReport(
+        blocked_requests=len(blocked_types),
+        blocked_bytes=int(blocked_bytes),
+        loaded_requests=len(all_loaded_bytes),
+        loaded_bytes=sum(all_loaded_bytes),
+    )
+
+
+def drain_performance_log(browser: WebDriver) -> None:
+    """
+    Moves the entries buffered in the performance log of a browser into its blocking report.
+
+    Chrome keeps every network event in the performance log until it is read, so the log of a long session (e.g.
+    watch mode) grows for as long as the browser runs unless it is drained regularly (e.g. after every card). Does
+    nothing if request blocking is not enabled in the browser.
+
+    Args:
+        browser: a Chrome browser
+    """
+    with _drained_reports_lock:
+        if browser not in _drained_reports:
+            return
+    try:
+        entries = browser.get_log("performance")  # type: ignore
+    except (WebDriverException, HTTPError, OSError):
+        return
+    report = parse_performance_log(entries)
+    with _drained_reports_lock:
+        drained = _drained_reports.get(browser, BlockingReport(0, 0, 0, 0))
+        _drained_reports[browser] = BlockingReport(*(a + b for a, b in zip(drained, report)))
+
+
+def get_blocking_report(browser: WebDriver) -> Optional[BlockingReport]:
+    """
+    Returns the blocking report of the requests sent by a browser since the last report.
+
+    The sizes of the blocked requests are estimated separately for every drained chunk of the performance log (see
+    drain_performance_log).
+
+    Args:
+        browser: a Chrome browser created with request blocking enabled
+
+    Returns:
+        The blocking report or None if the performance log of the browser is not available
+    """
+    with _drained_reports_lock:
+        drained = browser in _drained_reports
+    if not drained:
+        try:
+            entries = browser.get_log("performance")  # type: ignore
+        except (WebDriverException, HTTPError, OSError):
+            return None
+        return parse_performance_log(entries)
+
+    drain_performance_log(browser)
+    with _drained_reports_lock:
+        report = _drained_reports[browser]
+        _drained_reports[browser] = BlockingReport(0, 0, 0, 0)
+    return report
@@ -2,20 +2,39 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List
+import hashlib
+import os
+import re
+import subprocess
+import time
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from undetected_chromedriver import Chrome  # type: ignore
 
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import StartupTiming
+
+from .blocking import enable_request_blocking, get_blocking_report
+from .driver_cache import DEFAULT_DRIVER_CACHE_DIR, get_cached_driver
 from .options import get_chrome_browser_options
 
 if TYPE_CHECKING:
     from selenium.webdriver.chrome.webdriver import WebDriver
 
+logger = setup_logger(__name__)
+
+# Startup timings of the browsers started by this process, in launch order
+startup_timings: List[StartupTiming] = []
+
 
 def get_chrome_browser(
     headless: bool = False,
     no_images: bool = False,
     proxies: List[str] = [],
+    blocked_urls: List[str] = [],
+    user_data_dir: str = "",
+    driver_cache_dir: str = DEFAULT_DRIVER_CACHE_DIR,
+    proxy: str = "",
 ) -> WebDriver:
     """
     Returns a configured Chrome browser instance.
@@ -23,9 +42,86 @@ def get_chrome_browser(
     Args:
         headless: whether to run the browser in headless mode
         no_images: whether to disable images
+        blocked_urls: URL patterns of the requests that will be blocked (see blocking.build_blocked_url_patterns)
+        user_data_dir: the directory of the Chrome profile to keep across runs (see get_profile_dir), empty to use
+                       a temporary one
+        driver_cache_dir: the directory where the patched chromedriver is cached (see driver_cache), empty to let
+                          undetected_chromedriver download and patch it on every launch
+        proxy: the proxy to use as is instead of picking the best working one of proxies, without probing it
 
     Returns:
         A Chrome browser instance
     """
-    options = get_chrome_browser_options(headless, no_images, proxies)
-    return Chrome(options=options)
+    options = get_chrome_browser_options(
+        headless,
+        no_images,
+        proxies,
+        performance_log=bool(blocked_urls),
+        user_data_dir=user_data_dir,
+        proxy=proxy,
+    )
+
+    # Resolve the patched driver from the cache, falling back to undetected_chromedriver if the cache fails
+    start = time.perf_counter()
+    driver_kwargs: Dict[str, Any] = {}
+    driver_cache = "off"
+    if driver_cache_dir:
+        try:
+            driver = get_cached_driver(driver_cache_dir)
+            driver_kwargs = {
+                "driver_executable_path": driver.driver_path,
+                "browser_executable_path": driver.chrome_path,
+                "version_main": driver.version_main,
+            }
+            driver_cache = "warm" if driver.cache_hit else "cold"
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.warning(f"Could not use the chromedriver cache ({e}), resolving the driver on launch...")
+    driver_resolved = time.perf_counter()
+
+    browser = Chrome(options=options, **driver_kwargs)
+
+    timing = StartupTiming(
+        driver_seconds=driver_resolved - start,
+        launch_seconds=time.perf_counter() - driver_resolved,
+        driver_cache=driver_cache,
+    )
+    startup_timings.append(timing)
+    logger.info(str(timing))
+    if blocked_urls:
+        enable_request_blocking(browser, blocked_urls)
+    return browser
+
+
+def get_profile_dir(profiles_dir: str, account: str) -> str:
+    """
+    Returns the directory of the Chrome profile of an account, creating it if it does not exist.
+
+    Every account gets its own profile so their sessions do not overwrite each other. A profile can only be used
+    by one browser at a time.
+
+    Args:
+        profiles_dir: the directory where the profiles are stored
+        account: the account the profile belongs to (e.g. an email address)
+
+    Returns:
+        The absolute path of the profile directory
+    """
+    # Keep the name readable and add a hash so different accounts never map to the same directory
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", account.lower())
+    digest = hashlib.sha256(account.lower().encode()).hexdigest()[:8]
+    profile_dir = os.path.abspath(os.path.join(profiles_dir, f"{name}-{digest}"))
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def quit_chrome_browser(browser: WebDriver) -> None:
+    """
+    Logs the report of the requests blocked by a browser, if request blocking is enabled, and quits it.
+
+    Args:
+        browser: the browser that will be quit
+    """
+    report = get_blocking_report(browser)
+    if report:
+        logger.info(str(report))
+    browser.quit()
@@ -0,0 +1,202 @@
+"""Module for caching the patched chromedriver binary across runs and processes."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from undetected_chromedriver import find_chrome_executable  # type: ignore
+from undetected_chromedriver.patcher import IS_POSIX, Patcher  # type: ignore
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import CachedDriver
+
+logger = setup_logger(__name__)
+
+# Directory where the patched drivers are cached by default, shared by every process of the user
+DEFAULT_DRIVER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "amz_tango_card_scraper", "chromedriver")
+# File that maps every Chrome binary to its version, so the version does not have to be probed when it is unchanged
+MANIFEST_FILE_NAME = "manifest.json"
+LOCK_FILE_NAME = ".lock"
+DRIVER_FILE_NAME = "chromedriver" if IS_POSIX else "chromedriver.exe"
+# Max amount of seconds to wait for the lock, and age after which a lock is assumed to be left by a dead process
+LOCK_TIMEOUT = 300
+LOCK_STALE_AFTER = 600
+
+CHROME_VERSION_PATTERN = re.compile(r"(\d+)\.\d+\.\d+")
+
+
+@contextmanager
+def driver_cache_lock(cache_dir: str) -> Iterator[None]:
+    """
+    Holds the lockfile of the cache, so only one process downloads and patches a driver at a time.
+
+    Args:
+        cache_dir: the directory of the cache
+
+    Raises:
+        TimeoutError: If the lock could not be acquired in LOCK_TIMEOUT seconds
+    """
+    lock_path = os.path.join(cache_dir, LOCK_FILE_NAME)
+    start = time.monotonic()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_AFTER:
+                    logger.warning("Removing stale chromedriver cache lock...")
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() - start > LOCK_TIMEOUT:
+                raise TimeoutError(f"Could not lock the chromedriver cache {cache_dir}")
+            time.sleep(0.1)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def probe_chrome_version(chrome_path: str) -> int:
+    """
+    Returns the major version of a Chrome binary by running it.
+
+    Args:
+        chrome_path: the path of the Chrome binary
+
+    Raises:
+        ValueError: If the version could not be read
+
+    Returns:
+        The major version (e.g. 114)
+    """
+    output = subprocess.run([chrome_path, "--version"], capture_output=True, text=True, timeout=30).stdout
+    match = CHROME_VERSION_PATTERN.search(output)
+    if not match:
+        raise ValueError(f"Could not read the version of Chrome from {output!r}")
+    return int(match.group(1))
+
+
+def _get_signature(path: str) -> Tuple[int, int]:
+    """
+    Returns the size and modification time of a file, which change whenever Chrome is updated.
+
+    Args:
+        path: the path of the file
+
+    Returns:
+        A tuple containing the size and the modification time in nanoseconds
+    """
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _read_manifest(cache_dir: str) -> Dict[str, Dict[str, int]]:
+    """
+    Reads the manifest of the cache.
+
+    Args:
+        cache_dir: the directory of the cache
+
+    Returns:
+        The Chrome binaries mapped to their size, modification time and major version, empty if there is none
+    """
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_manifest(cache_dir: str, manifest: Dict[str, Dict[str, int]]) -> None:
+    """
+    Writes the manifest of the cache atomically.
+
+    Args:
+        cache_dir: the directory of the cache
+        manifest: the Chrome binaries mapped to their size, modification time and major version
+    """
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE_NAME)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def _download_patched_driver(driver_path: str, version_main: int) -> None:
+    """
+    Downloads the chromedriver of a Chrome version and patches it so it cannot be detected.
+
+    Args:
+        driver_path: the path where the patched driver will be stored
+        version_main: the major version of Chrome
+    """
+    os.makedirs(os.path.dirname(driver_path), exist_ok=True)
+    patcher = Patcher(version_main=version_main)
+    # Download into a temporary file so other processes never see a driver that is not patched yet, and keep
+    # the patcher from deleting it when it is garbage collected
+    patcher.executable_path = f"{driver_path}.tmp"
+    patcher._custom_exe_path = True
+    patcher.version_full = patcher.fetch_release_number()
+    patcher.unzip_package(patcher.fetch_package())
+    if not patcher.patch():
+        raise ValueError(f"Could not patch chromedriver {patcher.version_full}")
+    os.replace(patcher.executable_path, driver_path)
+
+
+def get_cached_driver(cache_dir: str = DEFAULT_DRIVER_CACHE_DIR, chrome_path: str = "") -> CachedDriver:
+    """
+    Returns the patched chromedriver for the installed Chrome, downloading and patching it only once per version.
+
+    When the Chrome binary has not changed since it was last seen, its version is taken from the manifest of the
+    cache instead of running Chrome to probe it, so a warm cache costs a couple of file stats.
+
+    Args:
+        cache_dir: the directory of the cache
+        chrome_path: the path of the Chrome binary, found automatically if empty
+
+    Raises:
+        FileNotFoundError: If Chrome is not installed
+        ValueError: If the version of Chrome could not be read or the driver could not be patched
+        TimeoutError: If another process holds the lock of the cache for too long
+
+    Returns:
+        The cached driver
+    """
+    chrome_path = chrome_path or find_chrome_executable()
+    if not chrome_path:
+        raise FileNotFoundError("Chrome binary not found")
+    chrome_path = os.path.abspath(chrome_path)
+    signature = _get_signature(chrome_path)
+
+    # Warm path: same Chrome binary and its driver is already cached
+    entry = _read_manifest(cache_dir).get(chrome_path)
+    if entry and (entry["size"], entry["mtime_ns"]) == signature:
+        driver_path = os.path.join(cache_dir, str(entry["version_main"]), DRIVER_FILE_NAME)
+        if os.path.isfile(driver_path):
+            return CachedDriver(driver_path, chrome_path, entry["version_main"], cache_hit=True)
+
+    # Cold path: probe the version of Chrome and download its driver unless another process already did it
+    version_main = probe_chrome_version(chrome_path)
+    driver_path = os.path.join(cache_dir, str(version_main), DRIVER_FILE_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    with driver_cache_lock(cache_dir):
+        if not os.path.isfile(driver_path):
+            logger.info(f"Downloading and patching chromedriver for Chrome {version_main}...")
+            _download_patched_driver(driver_path, version_main)
+        manifest = _read_manifest(cache_dir)
+        manifest[chrome_path] = {"size": signature[0], "mtime_ns": signature[1], "version_main": version_main}
+        _write_manifest(cache_dir, manifest)
+    return CachedDriver(driver_path, chrome_path, version_main, cache_hit=False)
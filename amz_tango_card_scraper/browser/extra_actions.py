@@ -2,39 +2,212 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Tuple
+import time
+from typing import TYPE_CHECKING, Dict, Tuple, Union
 
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
+from selenium.webdriver.support.wait import POLL_FREQUENCY, WebDriverWait
+
+from amz_tango_card_scraper.utils.logger import setup_logger
 
 if TYPE_CHECKING:
     from selenium.webdriver.remote.webdriver import WebDriver
     from selenium.webdriver.remote.webelement import WebElement
 
+logger = setup_logger(__name__)
+
+# Strategies used to wait for elements: "poll" checks the condition through WebDriverWait every poll_frequency
+# seconds, "observer" waits inside the page with a MutationObserver and returns as soon as the condition is met
+WAIT_STRATEGIES = ("poll", "observer")
+
+# Settings used by the waits when no strategy or poll frequency is given, see configure_waits
+wait_settings: Dict[str, Union[str, float]] = {"strategy": "poll", "poll_frequency": POLL_FREQUENCY}
+
+# Script that resolves with the element once it matches the condition, or with null after the timeout.
+# Mutations trigger a check right away, and the poll interval re-checks changes that cause no mutation
+# (e.g. stylesheets that finish loading).
+OBSERVER_WAIT_SCRIPT = """
+const [kind, value, condition, timeoutMs, pollMs, done] = arguments;
+
+function find() {
+    if (kind === "xpath") {
+        return document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    if (kind === "link text" || kind === "partial link text") {
+        return Array.from(document.querySelectorAll("a")).find((a) => {
+            const text = a.innerText.trim();
+            return kind === "link text" ? text === value : text.includes(value);
+        }) || null;
+    }
+    return document.querySelector(value);
+}
+
+function isVisible(el) {
+    const style = window.getComputedStyle(el);
+    return el.getClientRects().length > 0 && style.visibility !== "hidden" && style.display !== "none";
+}
+
+function check() {
+    const el = find();
+    if (!el || !isVisible(el)) {
+        return null;
+    }
+    if (condition === "clickable" && el.disabled) {
+        return null;
+    }
+    return el;
+}
+
+let observer = null;
+let interval = null;
+let timer = null;
+function finish(el) {
+    if (observer) observer.disconnect();
+    clearInterval(interval);
+    clearTimeout(timer);
+    done(el);
+}
 
-def wait_for_element_until_visible(browser: WebDriver, locator: Tuple[str, str], timeout: int = 10) -> WebElement:
+const el = check();
+if (el) {
+    finish(el);
+} else {
+    const onChange = () => {
+        const found = check();
+        if (found) finish(found);
+    };
+    observer = new MutationObserver(onChange);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    interval = setInterval(onChange, pollMs);
+    timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+
+def configure_waits(strategy: str = "poll", poll_frequency: float = POLL_FREQUENCY) -> None:
     """
-    Waits for an element to be visible and returns it.
+    Sets the strategy and poll frequency used by the waits when they are not given explicitly.
+
+    Args:
+        strategy: the wait strategy, one of WAIT_STRATEGIES
+        poll_frequency: the amount of seconds between checks of the condition
+
+    Raises:
+        ValueError: If the strategy does not exist
+    """
+    if strategy not in WAIT_STRATEGIES:
+        raise ValueError(f"Unknown wait strategy: {strategy}")
+    wait_settings["strategy"] = strategy
+    wait_settings["poll_frequency"] = poll_frequency
+
+
+def _locator_to_query(locator: Tuple[str, str]) -> Tuple[str, str]:
+    """
+    Converts a Selenium locator into the query used by the observer wait script.
+
+    Args:
+        locator: the locator of the element (e.g. (By.ID, "my-id"))
+
+    Returns:
+        A tuple with the kind of query ("css", "xpath", "link text" or "partial link text") and the query itself
+    """
+    by, value = locator
+    if by == By.ID:
+        return ("css", f'[id="{value}"]')
+    if by == By.NAME:
+        return ("css", f'[name="{value}"]')
+    if by == By.CLASS_NAME:
+        return ("css", f'[class~="{value}"]')
+    if by in (By.CSS_SELECTOR, By.TAG_NAME):
+        return ("css", value)
+    return (by, value)
+
+
+def _wait_with_polling(
+    browser: WebDriver, locator: Tuple[str, str], condition: str, timeout: float, poll_frequency: float
+) -> WebElement:
+    """
+    Waits for an element to match a condition by checking it through WebDriverWait every poll_frequency seconds.
 
     Args:
         browser: the browser that will be used to wait for the element
         locator: the locator of the element that will be waited for
-                 (e.g. (By.ID, "my-id"))
-        timeout: the max amount of time to wait for the element to be visible
+        condition: "visible" or "clickable"
+        timeout: the max amount of time to wait for the element
+        poll_frequency: the amount of seconds between checks of the condition
 
     Raises:
-        TimeoutException: If the element is not visible after the timeout
+        TimeoutException: If the element does not match the condition after the timeout
 
     Returns:
         The element that was waited for
     """
+    expected_condition = EC.element_to_be_clickable if condition == "clickable" else EC.visibility_of_element_located
+    wait = WebDriverWait(browser, timeout, poll_frequency=poll_frequency)
+    element = wait.until(expected_condition(locator))  # type: ignore # noqa
+    return element  # type: ignore
+
+
+def _wait_with_observer(
+    browser: WebDriver, locator: Tuple[str, str], condition: str, timeout: float, poll_frequency: float
+) -> WebElement:
+    """
+    Waits for an element to match a condition with a MutationObserver injected into the page.
+
+    The script dies with the page it was injected into, so if the page navigates while waiting (e.g. after a click
+    that submits a form) the rest of the wait falls back to polling. The script timeout of the browser is restored
+    afterwards.
 
-    wait = WebDriverWait(browser, timeout)
-    element = wait.until(EC.visibility_of_element_located(locator))  # type: ignore # noqa
+    Args:
+        browser: the browser that will be used to wait for the element
+        locator: the locator of the element that will be waited for
+        condition: "visible" or "clickable"
+        timeout: the max amount of time to wait for the element
+        poll_frequency: the amount of seconds between checks of changes that do not cause mutations
+
+    Raises:
+        TimeoutException: If the element does not match the condition after the timeout
+
+    Returns:
+        The element that was waited for
+    """
+    kind, query = _locator_to_query(locator)
+    start = time.monotonic()
+    script_timeout = browser.timeouts.script
+    # Leave some margin so the script resolves by itself before the driver gives up on it
+    browser.set_script_timeout(timeout + 5)
+    try:
+        element = browser.execute_async_script(
+            OBSERVER_WAIT_SCRIPT,
+            kind,
+            query,
+            condition,
+            int(timeout * 1000),
+            int(poll_frequency * 1000),
+        )
+    except TimeoutException:
+        raise
+    except WebDriverException as e:
+        # The page navigated and took the script with it, keep waiting for the element on the new page
+        logger.debug(f"Observer wait interrupted ({e.msg}), polling for the rest of the timeout...")
+        remaining = max(timeout - (time.monotonic() - start), 0)
+        return _wait_with_polling(browser, locator, condition, remaining, poll_frequency)
+    finally:
+        browser.set_script_timeout(script_timeout)
+    if element is None:
+        raise TimeoutException(f"Element {locator} is not {condition} after {timeout} seconds")
     return element  # type: ignore
 
 
-def wait_for_element_until_clickable(browser: WebDriver, locator: Tuple[str, str], timeout: int = 10) -> WebElement:
+def wait_for_element_until_visible(
+    browser: WebDriver,
+    locator: Tuple[str, str],
+    timeout: int = 10,
+    strategy: str = "",
+    poll_frequency: float = 0,
+) -> WebElement:
     """
     Waits for an element to be visible and returns it.
 
@@ -43,6 +216,8 @@ def wait_for_element_until_clickable(browser: WebDriver, locator: Tuple[str, str
         locator: the locator of the element that will be waited for
                  (e.g. (By.ID, "my-id"))
         timeout: the max amount of time to wait for the element to be visible
+        strategy: the wait strategy, one of WAIT_STRATEGIES (the configured one if empty)
+        poll_frequency: the amount of seconds between checks when polling (the configured one if 0)
 
     Raises:
         TimeoutException: If the element is not visible after the timeout
@@ -50,7 +225,37 @@ def wait_for_element_until_clickable(browser: WebDriver, locator: Tuple[str, str
     Returns:
         The element that was waited for
     """
+    poll_frequency = poll_frequency or float(wait_settings["poll_frequency"])
+    if (strategy or wait_settings["strategy"]) == "observer":
+        return _wait_with_observer(browser, locator, "visible", timeout, poll_frequency)
+    return _wait_with_polling(browser, locator, "visible", timeout, poll_frequency)
 
-    wait = WebDriverWait(browser, timeout)
-    element = wait.until(EC.element_to_be_clickable(locator))  # type: ignore # noqa
-    return element  # type: ignore
+
+def wait_for_element_until_clickable(
+    browser: WebDriver,
+    locator: Tuple[str, str],
+    timeout: int = 10,
+    strategy: str = "",
+    poll_frequency: float = 0,
+) -> WebElement:
+    """
+    Waits for an element to be clickable (displayed and not disabled) and returns it.
+
+    Args:
+        browser: the browser that will be used to wait for the element
+        locator: the locator of the element that will be waited for
+                 (e.g. (By.ID, "my-id"))
+        timeout: the max amount of time to wait for the element to be clickable
+        strategy: the wait strategy, one of WAIT_STRATEGIES (the configured one if empty)
+        poll_frequency: the amount of seconds between checks when polling (the configured one if 0)
+
+    Raises:
+        TimeoutException: If the element is not clickable after the timeout
+
+    Returns:
+        The element that was waited for
+    """
+    poll_frequency = poll_frequency or float(wait_settings["poll_frequency"])
+    if (strategy or wait_settings["strategy"]) == "observer":
+        return _wait_with_observer(browser, locator, "clickable", timeout, poll_frequency)
+    return _wait_with_polling(browser, locator, "clickable", timeout, poll_frequency)
@@ -0,0 +1,106 @@
+"""Module for launching the browser in the background while other work is done."""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+from pyvirtualdisplay.display import Display
+from selenium.common.exceptions import WebDriverException
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+
+from .chrome import quit_chrome_browser
+
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
+
+logger = setup_logger(__name__)
+
+
+class BrowserLauncher:
+    """
+    Launches a browser, and the virtual display it runs in if enabled, in a background thread.
+
+    The launch is started speculatively with start (e.g. as soon as the first Tango Card is found), so it overlaps
+    with the work still being done. get waits for it to finish and cancel discards it if it turns out not to be
+    needed. A launcher that was never started costs nothing.
+    """
+
+    def __init__(self, browser_factory: Callable[[], WebDriver], virtual_display: bool = False) -> None:
+        """
+        Args:
+            browser_factory: function that returns a new browser (e.g. a partial of get_chrome_browser)
+            virtual_display: whether to start a virtual display for the browser first
+        """
+        self.browser_factory = browser_factory
+        self.virtual_display = virtual_display
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._display: Optional[Display] = None
+        self._browser: Optional[WebDriver] = None
+        self._error: Optional[BaseException] = None
+
+    def _launch(self) -> None:
+        """Starts the virtual display and the browser, storing the error if any of them fails."""
+        try:
+            if self.virtual_display:
+                logger.info("Starting virtual display...")
+                self._display = Display(visible=False, size=(1920, 1080))
+                self._display.start()
+                logger.info("Virtual display started successfully")
+
+            logger.info("Loading Selenium browser...")
+            self._browser = self.browser_factory()
+            logger.info("Selenium browser loaded successfully")
+        except Exception as e:
+            self._error = e
+            if self._display:
+                self._display.stop()
+                self._display = None
+
+    def start(self) -> None:
+        """Starts launching the browser in the background, unless it has already been started."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._launch, daemon=True)
+                self._thread.start()
+
+    def get(self) -> Tuple[Optional[Display], WebDriver]:
+        """
+        Waits for the browser to be launched, launching it now if it was not started, and hands it over.
+
+        The caller owns the browser and the display from then on, and the launcher can be started again.
+
+        Raises:
+            Exception: The error raised while launching the browser, if any
+
+        Returns:
+            A tuple containing the virtual display (None if it is disabled) and the browser
+        """
+        self.start()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        thread.join()  # type: ignore
+        display, browser, error = self._display, self._browser, self._error
+        self._display, self._browser, self._error = None, None, None
+        if error:
+            raise error
+        return (display, browser)  # type: ignore
+
+    def cancel(self) -> None:
+        """Discards the browser if it was started, waiting for its launch to finish to quit it."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        logger.info("Browser not needed, closing it...")
+        thread.join()
+        if self._browser:
+            try:
+                quit_chrome_browser(self._browser)
+            except WebDriverException:
+                pass
+        if self._display:
+            self._display.stop()
+        self._display, self._browser, self._error = None, None, None
@@ -7,13 +7,18 @@ from undetected_chromedriver import ChromeOptions  # type: ignore
 
 from amz_tango_card_scraper.utils.logger import setup_logger
 
-from .proxies import get_random_working_proxy
+from .proxies import get_best_working_proxy
 
 logger = setup_logger(__name__)
 
 
 def get_chrome_browser_options(
-    headless: bool = False, no_images: bool = False, proxies: List[str] = []
+    headless: bool = False,
+    no_images: bool = False,
+    proxies: List[str] = [],
+    performance_log: bool = False,
+    user_data_dir: str = "",
+    proxy: str = "",
 ) -> ChromeOptions:
     """
     Returns a configured Chrome browser options instance.
@@ -21,6 +26,11 @@ def get_chrome_browser_options(
     Args:
         headless: whether to run the browser in headless mode
         no_images: whether to disable images
+        proxies: the proxies to pick the best working one from
+        performance_log: whether to record the network events in the performance log
+        user_data_dir: the directory of the Chrome profile to keep across runs, empty to use a temporary one
+        proxy: the proxy to use as is instead of picking one of the proxies (e.g. the one assigned by a
+               ProxyManager), without probing it again
 
     Returns:
         A Chrome browser options instance
@@ -33,8 +43,11 @@ def get_chrome_browser_options(
     if headless:
         options.add_argument("--headless")  # type: ignore
     # Add proxies if specified
-    if proxies:
-        proxy = get_random_working_proxy(proxies)
+    if proxy:
+        logger.info(f"Using proxy {proxy}")
+        options.add_argument(f"--proxy-server={proxy}")  # type: ignore
+    elif proxies:
+        proxy = get_best_working_proxy(proxies)
         # Only add a proxy if a working one was found
         if proxy:
             logger.info(f"Using proxy {proxy}")
@@ -42,6 +55,17 @@ def get_chrome_browser_options(
         else:
             logger.warning("No working proxies found, defaulting to no proxy")
 
+    # Record network events to report the blocked requests. Only the network domain is recorded to keep the log small,
+    # and the log is drained after every card (see blocking.drain_performance_log) as Chrome buffers it until read.
+    if performance_log:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})  # type: ignore
+        perf_logging_prefs = {"enableNetwork": True, "enablePage": False}
+        options.add_experimental_option("perfLoggingPrefs", perf_logging_prefs)  # type: ignore
+
+    # Keep the cookies and the rest of the profile across runs
+    if user_data_dir:
+        options.add_argument(f"--user-data-dir={user_data_dir}")  # type: ignore
+
     # Add options specific to Linux
     if platform.system() == "Linux":
         options.add_argument("--no-sandbox")  # type: ignore
@@ -1,25 +1,214 @@
+import json
+import os
 import random
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Union
 
 import requests
 from requests.exceptions import RequestException
 
+from amz_tango_card_scraper.utils.logger import setup_logger
 
-def is_proxy_working(proxy: str) -> bool:
+logger = setup_logger(__name__)
+
+# URL requested through every proxy to check whether it works
+PROXY_PROBE_URL = "https://www.google.com"
+# Max amount of seconds to wait for the response of a single probe
+PROXY_PROBE_TIMEOUT = 5
+# Max amount of seconds to wait for all the probes, the proxies that have not answered by then are skipped
+PROXY_PROBE_DEADLINE = 10
+# Max number of proxies probed at the same time
+PROXY_PROBE_WORKERS = 16
+# Seconds during which the result of a probe is reused instead of probing the proxy again
+PROXY_CACHE_TTL = 600
+
+# Settings used by the probes when they are not given explicitly, see configure_proxy_probing
+probe_settings: Dict[str, Union[str, float]] = {
+    "probe_url": PROXY_PROBE_URL,
+    "deadline": PROXY_PROBE_DEADLINE,
+    "cache_file": "",
+    "cache_ttl": PROXY_CACHE_TTL,
+}
+
+
+def configure_proxy_probing(
+    probe_url: str = PROXY_PROBE_URL,
+    deadline: float = PROXY_PROBE_DEADLINE,
+    cache_file: str = "",
+    cache_ttl: float = PROXY_CACHE_TTL,
+) -> None:
+    """
+    Sets the settings used by the probes when they are not given explicitly.
+
+    Args:
+        probe_url: the URL requested through every proxy
+        deadline: the max amount of seconds to wait for all the probes
+        cache_file: the file where the results of the probes are cached, empty to not cache them
+        cache_ttl: the seconds during which a cached result is reused
+    """
+    probe_settings["probe_url"] = probe_url
+    probe_settings["deadline"] = deadline
+    probe_settings["cache_file"] = cache_file
+    probe_settings["cache_ttl"] = cache_ttl
+
+
+def probe_proxy(proxy: str, probe_url: str = "", timeout: float = PROXY_PROBE_TIMEOUT) -> Optional[float]:
+    """
+    Measures the latency of a proxy by making a request through it.
+
+    Args:
+        proxy: the proxy server to test (e.g. "http://proxy.example.com:8080")
+        probe_url: the URL requested through the proxy (the configured one if empty)
+        timeout: the max amount of seconds to wait for the response
+
+    Returns:
+        The seconds it took to get the response or None if the proxy is not working
+    """
+    start = time.perf_counter()
+    try:
+        response = requests.get(
+            probe_url or str(probe_settings["probe_url"]), proxies={"http": proxy, "https": proxy}, timeout=timeout
+        )
+    except RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return time.perf_counter() - start
+
+
+def is_proxy_working(proxy: str, probe_url: str = "") -> bool:
     """
     Tests a proxy by making a request through it and checking the response status code.
 
     Args:
         proxy: the proxy server to test (e.g. "http://proxy.example.com:8080")
+        probe_url: the URL requested through the proxy (the configured one if empty)
 
     Returns:
         True if the proxy is working, False otherwise
     """
+    return probe_proxy(proxy, probe_url) is not None
+
+
+def _load_probe_cache(cache_file: str, probe_url: str, ttl: float) -> Dict[str, Optional[float]]:
+    """
+    Loads the results of the probes that have not expired yet.
+
+    Args:
+        cache_file: the file where the results are cached
+        probe_url: the URL the proxies were probed with, results of other URLs are ignored
+        ttl: the seconds during which a result is valid
+
+    Returns:
+        The proxies mapped to their latency, None for the proxies that were not working
+    """
+    now = time.time()
     try:
-        response = requests.get("https://www.google.com", proxies={"http": proxy, "https": proxy}, timeout=5)
-        return response.status_code == 200
-    except RequestException:
-        return False
+        with open(cache_file) as f:
+            entries = json.load(f).get(probe_url, {})
+        return {proxy: entry["latency"] for proxy, entry in entries.items() if now - entry["checked_at"] < ttl}
+    except (FileNotFoundError, ValueError, AttributeError, KeyError, TypeError):
+        return {}
+
+
+def _save_probe_cache(cache_file: str, probe_url: str, results: Dict[str, Optional[float]]) -> None:
+    """
+    Adds the results of new probes to the cache.
+
+    Args:
+        cache_file: the file where the results are cached
+        probe_url: the URL the proxies were probed with
+        results: the proxies mapped to their latency, None for the proxies that were not working
+    """
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    now = time.time()
+    cache.setdefault(probe_url, {}).update(
+        {proxy: {"latency": latency, "checked_at": now} for proxy, latency in results.items()}
+    )
+    # Write to a temporary file first so concurrent runs never read a half-written cache
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=4)
+    os.replace(tmp_file, cache_file)
+
+
+def rank_proxies(
+    proxies: List[str],
+    probe_url: str = "",
+    timeout: float = PROXY_PROBE_TIMEOUT,
+    deadline: Optional[float] = None,
+    cache_file: Optional[str] = None,
+    cache_ttl: Optional[float] = None,
+    workers: int = PROXY_PROBE_WORKERS,
+) -> List[str]:
+    """
+    Probes the proxies concurrently and returns the working ones, fastest first.
+
+    Proxies with a cached result that has not expired are not probed again. The rest are probed at the same time
+    and the ones that have not answered by the deadline are skipped, so a list full of dead proxies costs at most
+    the deadline instead of the timeout of every proxy.
+
+    Args:
+        proxies: the proxies to probe (e.g. ["http://proxy1.example.com:8080", "http://proxy2.example.com:8080"])
+        probe_url: the URL requested through every proxy (the configured one if empty)
+        timeout: the max amount of seconds to wait for the response of a single probe
+        deadline: the max amount of seconds to wait for all the probes (the configured one if None)
+        cache_file: the file where the results are cached, empty to not cache them (the configured one if None)
+        cache_ttl: the seconds during which a cached result is reused (the configured one if None)
+        workers: the max number of proxies probed at the same time
+
+    Returns:
+        The working proxies sorted by latency
+    """
+    probe_url = probe_url or str(probe_settings["probe_url"])
+    deadline = float(probe_settings["deadline"]) if deadline is None else deadline
+    cache_file = str(probe_settings["cache_file"]) if cache_file is None else cache_file
+    cache_ttl = float(probe_settings["cache_ttl"]) if cache_ttl is None else cache_ttl
+
+    latencies = _load_probe_cache(cache_file, probe_url, cache_ttl) if cache_file else {}
+    latencies = {proxy: latency for proxy, latency in latencies.items() if proxy in proxies}
+    to_probe = [proxy for proxy in dict.fromkeys(proxies) if proxy not in latencies]
+
+    if to_probe:
+        logger.info(f"Probing {len(to_probe)} proxy(ies)...")
+        executor = ThreadPoolExecutor(max_workers=max(min(workers, len(to_probe)), 1))
+        futures = {executor.submit(probe_proxy, proxy, probe_url, min(timeout, deadline)): proxy for proxy in to_probe}
+        done, not_done = wait(futures, timeout=deadline)
+        # Do not wait for the probes that are still running, they end by themselves after their timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+        if not_done:
+            logger.warning(f"{len(not_done)} proxy(ies) did not answer before the deadline")
+
+        results = {futures[future]: future.result() for future in done}
+        if cache_file and results:
+            try:
+                _save_probe_cache(cache_file, probe_url, results)
+            except OSError as e:
+                logger.warning(f"Could not cache the results of the proxy probes: {e}")
+        latencies.update(results)
+
+    working = {proxy: latency for proxy, latency in latencies.items() if latency is not None}
+    return sorted(working, key=lambda proxy: working[proxy])  # type: ignore
+
+
+def get_best_working_proxy(proxies: List[str]) -> str:
+    """
+    Returns the working proxy with the lowest latency from a list of proxies.
+
+    Args:
+        proxies: a list of proxies to choose from
+        (e.g. ["http://proxy1.example.com:8080", "http://proxy2.example.com:8080"])
+
+    Returns:
+        A working proxy server (e.g. "http://proxy.example.com:8080"), or an empty string if no working proxy was found
+    """
+    ranked = rank_proxies(proxies)
+    return ranked[0] if ranked else ""
 
 
 def get_random_working_proxy(proxies: List[str]) -> str:
@@ -33,8 +222,5 @@ def get_random_working_proxy(proxies: List[str]) -> str:
     Returns:
         A working proxy server (e.g. "http://proxy.example.com:8080"), or an empty string if no working proxy was found
     """
-    random.shuffle(proxies)
-    for proxy in proxies:
-        if is_proxy_working(proxy):
-            return proxy
-    return ""
+    ranked = rank_proxies(proxies)
+    return random.choice(ranked) if ranked else ""
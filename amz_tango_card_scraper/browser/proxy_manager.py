@@ -0,0 +1,130 @@
+"""Module for assigning proxies to the browser workers and moving them off the proxies that fail."""
+
+import threading
+from typing import Dict, List, Optional
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import ProxyStats
+
+from .proxies import rank_proxies
+
+logger = setup_logger(__name__)
+
+# Number of attempts in a row that can fail through a proxy before it is retired
+PROXY_ERROR_THRESHOLD = 3
+
+
+class ProxyManager:
+    """
+    Assigns a sticky proxy to every browser worker and tracks how each proxy performs during the run.
+
+    Workers keep their proxy for as long as it works, so the session of their browser is never moved to another
+    IP address. The proxies are handed out fastest first (see rank_proxies), spreading the workers over them
+    evenly. A proxy whose attempts fail error_threshold times in a row is retired, and the workers using it are
+    told to restart their browser on the next-best proxy (see should_rotate). The manager can be shared by threads.
+    """
+
+    def __init__(
+        self, proxies: List[str], error_threshold: int = PROXY_ERROR_THRESHOLD, ranked: Optional[List[str]] = None
+    ) -> None:
+        """
+        Args:
+            proxies: the proxies to assign (e.g. ["http://proxy1.example.com:8080", "http://proxy2.example.com:8080"])
+            error_threshold: the number of attempts in a row that can fail through a proxy before it is retired
+            ranked: the working proxies sorted by latency, probed with rank_proxies if None
+        """
+        self.error_threshold = error_threshold
+        self.ranked = rank_proxies(proxies) if ranked is None else ranked
+        self.stats: Dict[str, ProxyStats] = {proxy: ProxyStats(proxy) for proxy in self.ranked}
+        # Workers mapped to the proxy their browser uses
+        self.assignments: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def assign(self, worker_id: int) -> str:
+        """
+        Returns the proxy of a worker, assigning it the next-best proxy if it has none or its proxy was retired.
+
+        Args:
+            worker_id: the ID of the worker
+
+        Returns:
+            The proxy (e.g. "http://proxy.example.com:8080"), or an empty string if every proxy was retired
+        """
+        with self._lock:
+            proxy = self.assignments.get(worker_id)
+            if proxy and not self.stats[proxy].retired:
+                return proxy
+
+            # Pick the fastest of the proxies with the fewest workers
+            available = [proxy for proxy in self.ranked if not self.stats[proxy].retired]
+            if not available:
+                self.assignments.pop(worker_id, None)
+                logger.warning(f"No working proxies left for worker {worker_id}")
+                return ""
+            load = {proxy: 0 for proxy in available}
+            for assigned in self.assignments.values():
+                if assigned in load:
+                    load[assigned] += 1
+            proxy = min(available, key=lambda proxy: load[proxy])
+            self.assignments[worker_id] = proxy
+            logger.info(f"Assigned proxy {proxy} to worker {worker_id}")
+            return proxy
+
+    def record_success(self, worker_id: int, seconds: float) -> None:
+        """
+        Records that an attempt of a worker worked through its proxy.
+
+        Args:
+            worker_id: the ID of the worker
+            seconds: the seconds the attempt took
+        """
+        with self._lock:
+            proxy = self.assignments.get(worker_id)
+            if not proxy:
+                return
+            stats = self.stats[proxy]
+            self.stats[proxy] = stats._replace(
+                successes=stats.successes + 1, consecutive_failures=0, total_seconds=stats.total_seconds + seconds
+            )
+
+    def record_failure(self, worker_id: int) -> None:
+        """
+        Records that an attempt of a worker failed through its proxy, retiring the proxy if it crossed the threshold.
+
+        Args:
+            worker_id: the ID of the worker
+        """
+        with self._lock:
+            proxy = self.assignments.get(worker_id)
+            if not proxy:
+                return
+            stats = self.stats[proxy]
+            stats = stats._replace(failures=stats.failures + 1, consecutive_failures=stats.consecutive_failures + 1)
+            if not stats.retired and stats.consecutive_failures >= self.error_threshold:
+                logger.warning(f"Proxy {proxy} failed {stats.consecutive_failures} times in a row, retiring it")
+                stats = stats._replace(retired=True)
+            self.stats[proxy] = stats
+
+    def should_rotate(self, worker_id: int) -> bool:
+        """
+        Checks whether a worker has to restart its browser because its proxy was retired.
+
+        Args:
+            worker_id: the ID of the worker
+
+        Returns:
+            True if the proxy of the worker was retired, False otherwise
+        """
+        with self._lock:
+            proxy = self.assignments.get(worker_id)
+            return bool(proxy) and self.stats[proxy].retired  # type: ignore
+
+    def summary(self) -> str:
+        """
+        Returns a summary of how every proxy performed (e.g. "http://proxy.example.com:8080: 3 ok, 0 failed, ...").
+
+        Returns:
+            The summary
+        """
+        with self._lock:
+            return "; ".join(str(self.stats[proxy]) for proxy in self.ranked)
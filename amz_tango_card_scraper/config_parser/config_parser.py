@@ -5,6 +5,7 @@ from amz_tango_card_scraper.utils.schemas import ConfigFile
 from .helpers import (
     verify_amazon_section,
     verify_from_section,
+    verify_gmail_accounts_section,
     verify_gmail_section,
     verify_proxies_section,
     verify_script_section,
@@ -35,6 +36,9 @@ def parse_config(file_path: str) -> ConfigFile:
         # Verify and extract Gmail section
         gmail = verify_gmail_section(yaml_config.get("gmail", {}))
 
+        # Verify and extract Gmail Accounts section (optional)
+        gmail_accounts = verify_gmail_accounts_section(yaml_config.get("gmail_accounts") or [])
+
         # Verify and extract Amazon section
         amazon = verify_amazon_section(yaml_config.get("amazon", {}))
 
@@ -51,5 +55,11 @@ def parse_config(file_path: str) -> ConfigFile:
         telegram = verify_telegram_section(yaml_config.get("telegram", {}))
 
     return ConfigFile(
-        gmail=gmail, amazon=amazon, from_list=from_list, script=script, proxies=proxies, telegram=telegram
+        gmail=gmail,
+        amazon=amazon,
+        from_list=from_list,
+        script=script,
+        proxies=proxies,
+        telegram=telegram,
+        gmail_accounts=gmail_accounts,
     )
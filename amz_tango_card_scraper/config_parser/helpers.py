@@ -22,6 +22,28 @@ def verify_gmail_section(gmail: Dict[str, str]) -> Dict[str, str]:
     return gmail
 
 
+def verify_gmail_accounts_section(gmail_accounts: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Verify the Gmail Accounts section of the config file.
+
+    Args:
+        gmail_accounts: The Gmail Accounts section of the config file.
+
+    Raises:
+        ValueError: If the Gmail Accounts section is invalid.
+
+    Returns:
+        The verified Gmail Accounts section of the config file.
+    """
+    if not isinstance(gmail_accounts, list):
+        raise ValueError("Gmail Accounts section of config file must be a list.")
+    for gmail in gmail_accounts:
+        if not isinstance(gmail, dict):
+            raise ValueError("Invalid account in Gmail Accounts section of config file.")
+        verify_gmail_section(gmail)
+    return gmail_accounts
+
+
 def verify_amazon_section(amazon: Dict[str, str]) -> Dict[str, str]:
     """
     Verify the Amazon section of the config file.
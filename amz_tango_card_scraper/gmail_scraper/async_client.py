@@ -0,0 +1,239 @@
+"""Module containing a minimal asyncio IMAP client that supports command pipelining."""
+
+import asyncio
+import re
+import ssl
+from typing import Dict, List, Optional, Tuple, Union
+
+from .helpers import quote_imap_string
+
+IMAP_SSL_PORT = 993
+
+LITERAL_PATTERN = re.compile(rb"\{(\d+)\}$")
+UNTAGGED_PATTERN = re.compile(rb"^\* (?:(?P<number>\d+) )?(?P<type>[A-Za-z-]+)(?: (?P<data>.*))?$", re.DOTALL)
+RESPONSE_CODE_PATTERN = re.compile(rb"^\* OK \[(?P<code>[A-Za-z-]+)(?: (?P<data>[^\]]*))?\]")
+
+# Responses in the same format as the ones returned by imaplib, so the same parsers can be used for both
+ResponseData = List[Union[bytes, Tuple[bytes, bytes]]]
+
+
+class AsyncIMAPError(Exception):
+    """Exception raised when an IMAP command fails or the connection is closed."""
+
+
+class AsyncIMAPClient:
+    """
+    A minimal asyncio IMAP client over SSL.
+
+    Several commands can be sent at once with :meth:`pipeline` without waiting for the response of the previous
+    ones, which saves one round trip per command. Untagged responses are attributed to the oldest command that
+    has not completed yet, as servers such as Gmail process pipelined commands in order.
+    """
+
+    def __init__(self, host: str, port: int = IMAP_SSL_PORT) -> None:
+        """Initialize the client, call :meth:`connect` to establish the connection."""
+        self.host = host
+        self.port = port
+        self.capabilities: Tuple[str, ...] = ()
+        self.response_codes: Dict[str, bytes] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag_number = 0
+
+    async def connect(self) -> None:
+        """
+        Establish the connection with the server and get its capabilities.
+
+        Raises:
+            AsyncIMAPError: If the server does not greet the client.
+        """
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context()
+        )
+        greeting = await self._read_line()
+        if not greeting.startswith(b"* OK"):
+            raise AsyncIMAPError(f"Unexpected greeting: {greeting.decode('utf-8', 'replace').strip()}")
+
+        _, data = await self.command("CAPABILITY")
+        self.capabilities = tuple(data[-1].decode("utf-8").upper().split()) if data else ()  # type: ignore
+
+    async def login(self, user: str, password: str) -> None:
+        """
+        Authenticate with the given credentials.
+
+        Args:
+            user: User name (e.g. Gmail email address).
+            password: Password (e.g. Gmail app password).
+
+        Raises:
+            AsyncIMAPError: If the credentials are not valid.
+        """
+        await self.command(f"LOGIN {quote_imap_string(user)} {quote_imap_string(password)}")
+
+    async def select(self, mailbox: str = "INBOX") -> Tuple[int, int]:
+        """
+        Select the given mailbox.
+
+        Args:
+            mailbox: Mailbox to select.
+
+        Raises:
+            AsyncIMAPError: If the mailbox could not be selected.
+
+        Returns:
+            A tuple containing the UIDVALIDITY and the UIDNEXT of the mailbox
+        """
+        self.response_codes.clear()
+        await self.command(f"SELECT {quote_imap_string(mailbox)}")
+        uidvalidity = int(self.response_codes.get("UIDVALIDITY", b"0") or 0)
+        uidnext = int(self.response_codes.get("UIDNEXT", b"1") or 1)
+        return (uidvalidity, uidnext)
+
+    async def logout(self) -> None:
+        """Log out and close the connection."""
+        try:
+            await self.command("LOGOUT")
+        except (AsyncIMAPError, OSError):
+            pass
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection without logging out."""
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    async def command(self, command: str) -> Tuple[str, ResponseData]:
+        """
+        Send a command and wait for its response.
+
+        Args:
+            command: Command without tag (e.g. "UID SEARCH UNSEEN").
+
+        Raises:
+            AsyncIMAPError: If the command fails.
+
+        Returns:
+            A tuple containing the status of the command and the data of the untagged responses of its type
+        """
+        return (await self.pipeline([command]))[0]
+
+    async def pipeline(self, commands: List[str]) -> List[Tuple[str, ResponseData]]:
+        """
+        Send several commands at once and wait for all their responses.
+
+        Args:
+            commands: Commands without tag.
+
+        Raises:
+            AsyncIMAPError: If any of the commands fails.
+
+        Returns:
+            A tuple for every command with its status and the data of the untagged responses of its type
+            (e.g. the FETCH responses of a UID FETCH command)
+        """
+        if not commands:
+            return []
+        if not self._writer:
+            raise AsyncIMAPError("Not connected")
+
+        tags: List[bytes] = []
+        for command in commands:
+            self._tag_number += 1
+            tag = f"A{self._tag_number}".encode("utf-8")
+            tags.append(tag)
+            self._writer.write(tag + b" " + command.encode("utf-8") + b"\r\n")
+        await self._writer.drain()
+
+        untagged: Dict[bytes, Dict[str, ResponseData]] = {tag: {} for tag in tags}
+        statuses: Dict[bytes, str] = {}
+        pending = list(tags)
+        while pending:
+            items = await self._read_response()
+            head = items[0][0] if isinstance(items[0], tuple) else items[0]
+
+            if head.startswith(b"* "):
+                response_type, items = self._parse_untagged(items)
+                untagged[pending[0]].setdefault(response_type, []).extend(items)
+            elif head.startswith(b"+"):
+                raise AsyncIMAPError("Unexpected continuation request")
+            else:
+                tag, _, rest = head.partition(b" ")
+                status, _, text = rest.partition(b" ")
+                if tag not in statuses and tag in pending:
+                    pending.remove(tag)
+                    statuses[tag] = status.decode("utf-8").upper()
+                    if statuses[tag] != "OK":
+                        raise AsyncIMAPError(f"Command failed: {text.decode('utf-8', 'replace')}")
+
+        results: List[Tuple[str, ResponseData]] = []
+        for tag, command in zip(tags, commands):
+            words = command.upper().split()
+            response_type = words[1] if words[0] == "UID" and len(words) > 1 else words[0]
+            results.append((statuses[tag], untagged[tag].get(response_type, [])))
+        return results
+
+    async def _read_line(self) -> bytes:
+        """
+        Read a line from the server.
+
+        Raises:
+            AsyncIMAPError: If the connection has been closed.
+
+        Returns:
+            The line, including the CRLF.
+        """
+        if not self._reader:
+            raise AsyncIMAPError("Not connected")
+        line = await self._reader.readline()
+        if not line:
+            raise AsyncIMAPError("Connection closed by the server")
+        return line
+
+    async def _read_response(self) -> ResponseData:
+        """
+        Read a whole response from the server, including its literals.
+
+        Returns:
+            The response in the same format as imaplib, where each literal is returned as a tuple with the
+            preceding data and the literal itself, followed by the data after the last literal.
+        """
+        items: ResponseData = []
+        line = (await self._read_line()).rstrip(b"\r\n")
+        match = LITERAL_PATTERN.search(line)
+        while match:
+            literal = await self._reader.readexactly(int(match.group(1)))  # type: ignore
+            items.append((line, literal))
+            line = (await self._read_line()).rstrip(b"\r\n")
+            match = LITERAL_PATTERN.search(line)
+
+        if line or not items:
+            items.append(line)
+        return items
+
+    def _parse_untagged(self, items: ResponseData) -> Tuple[str, ResponseData]:
+        """
+        Parse an untagged response, storing its response code (e.g. [UIDVALIDITY 123]) if it has one.
+
+        Args:
+            items: Response as returned by :meth:`_read_response`.
+
+        Returns:
+            A tuple containing the type of the response and its data without the "* " and type prefix
+            (e.g. b"* 1 FETCH (UID 5)" becomes ("FETCH", [b"1 (UID 5)"]))
+        """
+        head = items[0][0] if isinstance(items[0], tuple) else items[0]
+
+        code_match = RESPONSE_CODE_PATTERN.match(head)
+        if code_match:
+            self.response_codes[code_match.group("code").decode("utf-8").upper()] = code_match.group("data") or b""
+
+        match = UNTAGGED_PATTERN.match(head)
+        if not match:
+            return ("", items)
+
+        data = match.group("data") or b""
+        if match.group("number"):
+            data = match.group("number") + b" " + data
+        first = (data, items[0][1]) if isinstance(items[0], tuple) else data
+        return (match.group("type").decode("utf-8").upper(), [first] + items[1:])
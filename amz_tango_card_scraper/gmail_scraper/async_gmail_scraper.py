@@ -0,0 +1,350 @@
+"""Module to scrape Tango Cards from several Gmail accounts concurrently with asyncio."""
+
+import asyncio
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from amz_tango_card_scraper.utils.concurrency import stream
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import (
+    FetchedMessage,
+    MailboxCheckpoint,
+    TangoCard,
+)
+
+from .async_client import AsyncIMAPClient, ResponseData
+from .checkpoint import load_checkpoint, save_checkpoint
+from .constants import (
+    ACCOUNT_SCRAPE_TIMEOUT,
+    DEFAULT_EXTRACTOR_ENGINE,
+    FETCH_BATCH_SIZE,
+    GMAIL_EXTENSION_CAPABILITY,
+    IMAP_GMAIL_URL,
+    MAX_IMAP_CONNECTIONS,
+    MAX_PIPELINED_FETCHES,
+    TANGO_CONTENT_FILTER,
+)
+from .helpers import (
+    build_search_criteria,
+    build_text_part_messages,
+    chunk_uids,
+    group_text_parts,
+    parse_fetch_response,
+    parse_fetched_message,
+    parse_search_response,
+    parse_status_response,
+)
+
+logger = setup_logger(logger_name=__name__)
+
+
+async def _pipeline_bounded(
+    client: AsyncIMAPClient, commands: List[str], max_in_flight: int = MAX_PIPELINED_FETCHES
+) -> List[Tuple[str, ResponseData]]:
+    """
+    Pipeline the given commands with at most max_in_flight of them waiting for their response at the same time.
+
+    Args:
+        client: IMAP client.
+        commands: Commands without tag.
+        max_in_flight: Max number of commands sent before reading their responses.
+
+    Raises:
+        AsyncIMAPError: If any of the commands fails.
+
+    Returns:
+        The status and the data of every command, in the same order as the commands.
+    """
+    responses: List[Tuple[str, ResponseData]] = []
+    for start in range(0, len(commands), max_in_flight):
+        end = start + max_in_flight
+        responses += await client.pipeline(commands[start:end])
+    return responses
+
+
+async def _fetch_text_parts(
+    client: AsyncIMAPClient, uids: List[bytes], batch_size: int
+) -> Dict[bytes, FetchedMessage]:
+    """
+    Fetch the text part of the emails with the given UIDs, pipelining the UID FETCH commands of every step.
+
+    This is the asyncio counterpart of :func:`fetch_text_parts`: the structures of the chunks are fetched with
+    pipelined commands, then the text parts of the chunks, and finally the emails whose text part could not be
+    located are fetched completely. At most MAX_PIPELINED_FETCHES commands are in flight at the same time.
+
+    Args:
+        client: IMAP client with the inbox selected.
+        uids: UIDs of the emails.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+
+    Returns:
+        Dictionary that maps the UID of every fetched email to the email.
+    """
+    chunks = list(chunk_uids(uids, batch_size))
+    responses = await _pipeline_bounded(
+        client, [f"UID FETCH {b','.join(chunk).decode('utf-8')} (UID FLAGS BODYSTRUCTURE)" for chunk in chunks]
+    )
+
+    # Fetch only the text part of the emails, grouped by section number
+    section_commands: List[str] = []
+    section_parts = []
+    for _, data in responses:
+        for section, parts in group_text_parts(data).items():
+            section_uids = b",".join(uid for uid, _, _ in parts).decode("utf-8")
+            section_commands.append(f"UID FETCH {section_uids} (UID BODY.PEEK[{section}])")
+            section_parts.append(parts)
+
+    fetched: Dict[bytes, FetchedMessage] = {}
+    for parts, (_, data) in zip(section_parts, await _pipeline_bounded(client, section_commands)):
+        fetched.update(build_text_part_messages(parts, data))
+
+    # Fall back to fetching the whole email if its text part could not be fetched
+    missing = [uid for uid in uids if uid not in fetched]
+    responses = await _pipeline_bounded(
+        client,
+        [
+            f"UID FETCH {b','.join(chunk).decode('utf-8')} (UID FLAGS BODY.PEEK[])"
+            for chunk in chunk_uids(missing, batch_size)
+        ],
+    )
+    for _, data in responses:
+        fetched.update({message.uid: message for message in parse_fetch_response(data)})
+
+    return fetched
+
+
+async def scrape_tango_cards_async(
+    email: str,
+    app_password: str,
+    from_list: List[str],
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    on_tango_card: Optional[Callable[[TangoCard], None]] = None,
+    on_checkpoint: Optional[Callable[[str, MailboxCheckpoint], None]] = None,
+) -> List[TangoCard]:
+    """
+    Scrape Tango Cards from Gmail with an asyncio IMAP client.
+
+    This has the same behaviour as :func:`scrape_tango_cards`, but the UID FETCH commands are pipelined and the
+    event loop is free to serve other accounts while waiting for the server.
+
+    Args:
+        email: Gmail email address.
+        app_password: Gmail app password.
+        from_list: List of email addresses to search for Tango Cards.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        on_tango_card: Function called with every Tango Card as soon as it is found.
+        on_checkpoint: Function called with the email address and the checkpoint the inbox has been scraped up to
+            once every email has been scraped, instead of saving it to the checkpoint file.
+
+    Raises:
+        AsyncIMAPError: If any IMAP command fails.
+
+    Returns:
+        List of scraped Tango Cards.
+    """
+    # Establish connection with Gmail and login
+    client = AsyncIMAPClient(IMAP_GMAIL_URL)
+    try:
+        await client.connect()
+        await client.login(email, app_password)
+
+        # Check whether there are new emails since the last run
+        checkpoint = load_checkpoint(checkpoint_file, email) if checkpoint_file else None
+        if checkpoint:
+            _, status_data = await client.command("STATUS INBOX (UIDNEXT UIDVALIDITY)")
+            status = parse_status_response(status_data)  # type: ignore
+            if status.get("UIDVALIDITY") != checkpoint.uidvalidity:
+                logger.info(f"Inbox UIDVALIDITY of {email} has changed, performing a full resync...")
+                checkpoint = None
+            elif status.get("UIDNEXT", 0) <= checkpoint.last_uid + 1:
+                logger.info(f"No new emails in {email} since last run")
+                await client.logout()
+                return []
+
+        # Search the inbox for unread emails from any of the specified email addresses
+        uidvalidity, uidnext = await client.select("INBOX")
+        last_uid = checkpoint.last_uid if checkpoint else 0
+        logger.info(f"Searching for Tango Cards in {email}...")
+        criteria = build_search_criteria(
+            from_list,
+            unseen_only=True,
+            min_uid=last_uid + 1,
+            content_filter=TANGO_CONTENT_FILTER if server_filter else None,
+            gmail_raw=GMAIL_EXTENSION_CAPABILITY in client.capabilities,
+        )
+        _, uid_data = await client.command(f"UID SEARCH {criteria}")
+        uids = [uid for uid in parse_search_response(uid_data) if int(uid) > last_uid]  # type: ignore
+        logger.info(f"Found {len(uids)} new unread email(s) in {email}")
+
+        # Fetch the text part of the emails, skipping the ones that have been read since the search
+        fetched = await _fetch_text_parts(client, uids, batch_size)
+        await client.logout()
+    finally:
+        client.close()
+
+    messages = [fetched[uid] for uid in uids if uid in fetched and "\\Seen" not in fetched[uid].flags]
+    # Parse the emails in a thread, so the event loop keeps serving the connections of the other accounts
+    parse = partial(parse_fetched_message, extractor=extractor)
+    parsed = await asyncio.get_running_loop().run_in_executor(None, lambda: [parse(message) for message in messages])
+    tango_cards = [card._replace(email_address=email) for card in parsed if card]
+    for tango_card in tango_cards:
+        logger.info(f"Tango Card found in email {tango_card.email_uid} of {email}")
+        if on_tango_card:
+            on_tango_card(tango_card)
+
+    # Store the highest UID that has been scraped so the next run starts from there
+    checkpoint = MailboxCheckpoint(
+        uidvalidity=uidvalidity, last_uid=max([last_uid, uidnext - 1] + [int(uid) for uid in uids])
+    )
+    if on_checkpoint:
+        on_checkpoint(email, checkpoint)
+    elif checkpoint_file:
+        save_checkpoint(checkpoint_file, email, checkpoint)
+
+    return tango_cards
+
+
+async def _scrape_accounts(
+    accounts: List[Dict[str, str]], max_connections: int, timeout: float, **kwargs
+) -> Dict[str, List[TangoCard]]:
+    """
+    Scrape the given Gmail accounts concurrently.
+
+    Args:
+        accounts: Gmail accounts, each one with an email and an app_password.
+        max_connections: Max number of accounts scraped at the same time.
+        timeout: Max amount of seconds to scrape a single account.
+        kwargs: Arguments passed to :func:`scrape_tango_cards_async`.
+
+    Returns:
+        Dictionary that maps the email address of every account to its Tango Cards.
+    """
+    semaphore = asyncio.Semaphore(max_connections)
+
+    async def scrape_account(email: str, app_password: str) -> List[TangoCard]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(scrape_tango_cards_async(email, app_password, **kwargs), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out scraping Tango Cards from {email}")
+            except Exception as e:
+                # Any error (IMAP, connection, truncated or unparsable responses) only affects its own account
+                logger.error(f"Could not scrape Tango Cards from {email}: {e!r}")
+            return []
+
+    emails = [account.get("email", "") for account in accounts]
+    results = await asyncio.gather(
+        *(scrape_account(email, account.get("app_password", "")) for email, account in zip(emails, accounts))
+    )
+    return dict(zip(emails, results))
+
+
+def scrape_tango_cards_from_accounts(
+    accounts: List[Dict[str, str]],
+    from_list: List[str],
+    max_connections: int = MAX_IMAP_CONNECTIONS,
+    timeout: float = ACCOUNT_SCRAPE_TIMEOUT,
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    on_tango_card: Optional[Callable[[TangoCard], None]] = None,
+    on_checkpoint: Optional[Callable[[str, MailboxCheckpoint], None]] = None,
+) -> Dict[str, List[TangoCard]]:
+    """
+    Scrape Tango Cards from several Gmail accounts concurrently, so the total time is close to the time of the slowest
+    account instead of the sum of all of them.
+
+    Every account is scraped over its own connection with :func:`scrape_tango_cards_async`, with at most the given
+    number of connections open at the same time. Accounts that fail or exceed the timeout are logged and return no
+    Tango Cards, so they do not affect the rest.
+
+    Args:
+        accounts: Gmail accounts, each one with an email and an app_password.
+        from_list: List of email addresses to search for Tango Cards.
+        max_connections: Max number of accounts scraped at the same time.
+        timeout: Max amount of seconds to scrape a single account.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        on_tango_card: Function called with every Tango Card as soon as it is found, while the slower accounts are
+            still being scraped.
+        on_checkpoint: Function called with the email address and the checkpoint every inbox has been scraped up to
+            once all its emails have been scraped, instead of saving it to the checkpoint file.
+
+    Returns:
+        Dictionary that maps the email address of every account to its Tango Cards.
+    """
+    return asyncio.run(
+        _scrape_accounts(
+            accounts,
+            max_connections,
+            timeout,
+            from_list=from_list,
+            batch_size=batch_size,
+            checkpoint_file=checkpoint_file,
+            server_filter=server_filter,
+            extractor=extractor,
+            on_tango_card=on_tango_card,
+            on_checkpoint=on_checkpoint,
+        )
+    )
+
+
+def iter_tango_cards_from_accounts(
+    accounts: List[Dict[str, str]],
+    from_list: List[str],
+    max_connections: int = MAX_IMAP_CONNECTIONS,
+    timeout: float = ACCOUNT_SCRAPE_TIMEOUT,
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    on_checkpoint: Optional[Callable[[str, MailboxCheckpoint], None]] = None,
+) -> Iterator[TangoCard]:
+    """
+    Scrape Tango Cards from several Gmail accounts concurrently, yielding every one as soon as its account is scraped.
+
+    This is the streaming variant of :func:`scrape_tango_cards_from_accounts`: the accounts are scraped in a
+    background thread and the Tango Cards of every account are yielded while the slower accounts are still being
+    scraped. The Tango Cards are queued without bound, so a slow consumer never blocks the event loop that serves
+    the connections of the other accounts.
+
+    Args:
+        accounts: Gmail accounts, each one with an email and an app_password.
+        from_list: List of email addresses to search for Tango Cards.
+        max_connections: Max number of accounts scraped at the same time.
+        timeout: Max amount of seconds to scrape a single account.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        on_checkpoint: Function called with the email address and the checkpoint every inbox has been scraped up to
+            once all its emails have been scraped, instead of saving it to the checkpoint file.
+
+    Returns:
+        An iterator over the scraped Tango Cards, in the order they are found.
+    """
+
+    def produce(emit: Callable[[TangoCard], None]) -> None:
+        scrape_tango_cards_from_accounts(
+            accounts,
+            from_list,
+            max_connections=max_connections,
+            timeout=timeout,
+            batch_size=batch_size,
+            checkpoint_file=checkpoint_file,
+            server_filter=server_filter,
+            extractor=extractor,
+            on_tango_card=emit,
+            on_checkpoint=on_checkpoint,
+        )
+
+    return stream(produce, maxsize=0)
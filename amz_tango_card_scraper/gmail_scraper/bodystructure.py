@@ -0,0 +1,202 @@
+"""Module for parsing IMAP FETCH responses and locating the text part of an email from its BODYSTRUCTURE."""
+
+from itertools import takewhile
+from typing import Any, Dict, List, Optional
+
+from amz_tango_card_scraper.utils.schemas import TextPart
+
+ATOM_DELIMITERS = ' ()"\r\n'
+
+
+def parse_imap_list(data: bytes) -> List[Any]:
+    """
+    Parse data sent by an IMAP server into nested lists (e.g. b'(UID 5 FLAGS (\\Seen))' -> [["UID", "5", ...]]).
+
+    Quoted strings and atoms are returned as strings, NIL is returned as None and parenthesized lists are returned
+    as lists. Literals are not supported as imaplib already splits them from the rest of the response.
+
+    Args:
+        data: Data to parse.
+
+    Raises:
+        ValueError: If the parentheses of the data are unbalanced.
+
+    Returns:
+        List with the parsed elements of the data.
+    """
+    stack: List[List[Any]] = [[]]
+    i = 0
+    while i < len(data):
+        char = chr(data[i])
+        if char in " \r\n":
+            i += 1
+        elif char == "(":
+            stack.append([])
+            i += 1
+        elif char == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parentheses in IMAP response")
+            closed = stack.pop()
+            stack[-1].append(closed)
+            i += 1
+        elif char == '"':
+            # Quoted string, backslashes escape the next character
+            value = bytearray()
+            i += 1
+            while i < len(data) and chr(data[i]) != '"':
+                if chr(data[i]) == "\\":
+                    i += 1
+                if i < len(data):
+                    value.append(data[i])
+                i += 1
+            stack[-1].append(value.decode("utf-8", "replace"))
+            i += 1
+        else:
+            start = i
+            while i < len(data) and chr(data[i]) not in ATOM_DELIMITERS:
+                i += 1
+            atom = data[start:i].decode("utf-8", "replace")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parentheses in IMAP response")
+    return stack[0]
+
+
+def parse_fetch_attributes(data: bytes) -> Dict[str, Any]:
+    """
+    Parse a FETCH response without literals (e.g. b'1 (UID 5 FLAGS (\\Seen) BODYSTRUCTURE (...))').
+
+    Args:
+        data: FETCH response of a single email.
+
+    Raises:
+        ValueError: If the response is malformed.
+
+    Returns:
+        Dictionary that maps every attribute name (in uppercase) to its value.
+    """
+    parsed = parse_imap_list(data)
+    if len(parsed) < 2 or not isinstance(parsed[1], list):
+        raise ValueError("Malformed FETCH response")
+
+    attributes = parsed[1]
+    return {str(name).upper(): value for name, value in zip(attributes[::2], attributes[1::2])}
+
+
+def _is_multipart(part: List[Any]) -> bool:
+    """
+    Check whether a BODYSTRUCTURE part is a multipart.
+
+    Args:
+        part: Parsed BODYSTRUCTURE part.
+
+    Returns:
+        True if the part is a multipart, False otherwise
+    """
+    return bool(part) and isinstance(part[0], list)
+
+
+def _get_params(part: List[Any]) -> Dict[str, str]:
+    """
+    Get the parameters of the content type of a BODYSTRUCTURE part (e.g. {"charset": "utf-8"}).
+
+    Args:
+        part: Parsed BODYSTRUCTURE part that is not a multipart.
+
+    Returns:
+        Dictionary with the parameters in lowercase.
+    """
+    params = part[2] if len(part) > 2 and isinstance(part[2], list) else []
+    return {str(name).lower(): str(value) for name, value in zip(params[::2], params[1::2])}
+
+
+def _is_attachment(part: List[Any]) -> bool:
+    """
+    Check whether a text BODYSTRUCTURE part is an attachment.
+
+    Args:
+        part: Parsed BODYSTRUCTURE part of type text.
+
+    Returns:
+        True if the part is an attachment, False otherwise
+    """
+    # The disposition of text parts comes after the type, subtype, params, id, description, encoding, size,
+    # number of lines and MD5 fields
+    disposition = part[9] if len(part) > 9 else None
+    return isinstance(disposition, list) and bool(disposition) and str(disposition[0]).lower() == "attachment"
+
+
+def _get_text_part(part: List[Any], section: str) -> TextPart:
+    """
+    Build the text part information of a BODYSTRUCTURE part.
+
+    Args:
+        part: Parsed BODYSTRUCTURE part that is not a multipart.
+        section: Section number of the part.
+
+    Returns:
+        Text part information.
+    """
+    encoding = str(part[5]).lower() if len(part) > 5 and part[5] else "7bit"
+    charset = _get_params(part).get("charset", "utf-8")
+    return TextPart(section=section, encoding=encoding, charset=charset)
+
+
+def _find_text_plain_part(part: List[Any], section: str) -> Optional[TextPart]:
+    """
+    Recursively search for the first text/plain part that is not an attachment.
+
+    Parts are visited in the same order as :meth:`email.message.Message.walk`.
+
+    Args:
+        part: Parsed BODYSTRUCTURE part.
+        section: Section number of the part, empty for the whole message.
+
+    Returns:
+        Text part information or None if there is no text/plain part.
+    """
+    if _is_multipart(part):
+        # Children are listed first, followed by the subtype and the extension data, which can also contain lists
+        children = takewhile(lambda child: isinstance(child, list), part)
+        for i, child in enumerate(children, 1):
+            text_part = _find_text_plain_part(child, f"{section}.{i}" if section else str(i))
+            if text_part:
+                return text_part
+        return None
+
+    ctype = f"{str(part[0]).lower()}/{str(part[1]).lower()}" if len(part) > 1 else ""
+    if ctype == "text/plain" and not _is_attachment(part):
+        return _get_text_part(part, section or "1")
+
+    # Emails attached as message/rfc822 parts contain their own body structure after the envelope
+    if ctype == "message/rfc822" and len(part) > 8 and isinstance(part[8], list):
+        nested = part[8]
+        nested_section = section or "1"
+        if _is_multipart(nested):
+            return _find_text_plain_part(nested, nested_section)
+        return _find_text_plain_part(nested, f"{nested_section}.1")
+
+    return None
+
+
+def find_text_part(bodystructure: List[Any]) -> Optional[TextPart]:
+    """
+    Find the part of an email that :func:`get_body_of_email` would return, using its BODYSTRUCTURE.
+
+    That is the first text/plain part that is not an attachment for multipart emails, and the body itself for
+    single part emails.
+
+    Args:
+        bodystructure: Parsed BODYSTRUCTURE of the email.
+
+    Returns:
+        Text part information or None if the email has no such part.
+    """
+    if not bodystructure:
+        return None
+
+    if not _is_multipart(bodystructure):
+        return _get_text_part(bodystructure, "1")
+
+    return _find_text_plain_part(bodystructure, "")
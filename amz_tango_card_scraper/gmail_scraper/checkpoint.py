@@ -0,0 +1,91 @@
+"""Module for persisting the point up to which each Gmail account has been scraped."""
+
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+from amz_tango_card_scraper.utils.schemas import MailboxCheckpoint
+
+
+def _read_checkpoints(file_path: str) -> Dict[str, Dict[str, int]]:
+    """
+    Read every checkpoint stored in the checkpoint file.
+
+    Args:
+        file_path: Path to the checkpoint file.
+
+    Returns:
+        Dictionary that maps every account to its checkpoint, empty if the file does not exist or is corrupted.
+    """
+    if not os.path.isfile(file_path):
+        return {}
+
+    try:
+        with open(file_path, "r") as f:
+            checkpoints = json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+    return checkpoints if isinstance(checkpoints, dict) else {}
+
+
+def load_checkpoint(file_path: str, email: str) -> Optional[MailboxCheckpoint]:
+    """
+    Load the checkpoint of the given account.
+
+    Args:
+        file_path: Path to the checkpoint file.
+        email: Email address of the account.
+
+    Returns:
+        The checkpoint of the account or None if the account has never been scraped.
+    """
+    checkpoint = _read_checkpoints(file_path).get(email)
+    if not checkpoint:
+        return None
+
+    try:
+        return MailboxCheckpoint(uidvalidity=int(checkpoint["uidvalidity"]), last_uid=int(checkpoint["last_uid"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def save_checkpoint(file_path: str, email: str, checkpoint: MailboxCheckpoint) -> None:
+    """
+    Save the checkpoint of the given account, keeping the checkpoints of the other accounts.
+
+    The file is replaced atomically so an interrupted run never leaves a corrupted checkpoint file behind.
+
+    Args:
+        file_path: Path to the checkpoint file.
+        email: Email address of the account.
+        checkpoint: Checkpoint to save.
+
+    Raises:
+        IOError: If the checkpoint could not be saved
+    """
+    checkpoints = _read_checkpoints(file_path)
+    checkpoints[email] = checkpoint._asdict()
+
+    tmp_file_path = file_path + ".tmp"
+    try:
+        with open(tmp_file_path, "w") as f:
+            json.dump(checkpoints, f, indent=2)
+        os.replace(tmp_file_path, file_path)
+    except IOError:
+        raise IOError("Checkpoint could not be saved")
+
+
+def cap_checkpoint(checkpoint: MailboxCheckpoint, unprocessed_uids: Iterable[str]) -> MailboxCheckpoint:
+    """
+    Lower the given checkpoint so the emails with the given UIDs are scraped again.
+
+    Args:
+        checkpoint: Checkpoint reached by the scrape.
+        unprocessed_uids: UIDs of the emails whose Tango Cards could not be processed.
+
+    Returns:
+        The checkpoint right below the lowest of the UIDs, or the given one if none of them is below it.
+    """
+    last_uid = min([checkpoint.last_uid] + [int(uid) - 1 for uid in unprocessed_uids if uid])
+    return checkpoint._replace(last_uid=last_uid)
@@ -1,6 +1,40 @@
 """Module containing constants for the Gmail scraper."""
 
+import os
+
 IMAP_GMAIL_URL = "imap.gmail.com"
 
+# Number of UIDs requested per UID FETCH command
+FETCH_BATCH_SIZE = 200
+
+# Capability advertised by Gmail's IMAP server that enables the X-GM-RAW search extension
+GMAIL_EXTENSION_CAPABILITY = "X-GM-EXT-1"
+# Seconds to idle before re-issuing the IDLE command (Gmail drops idling connections after about 29 minutes)
+IDLE_TIMEOUT = 25 * 60
+# Initial and max amount of seconds to wait before reconnecting after losing the connection in watch mode
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 5 * 60
+
+# Text that must be present in the content of an email for it to contain a Tango Card
+TANGO_CONTENT_FILTER = "tango"
+
+# Number of processes that parse the emails (one core is left for the IMAP connection)
+DEFAULT_PARSE_WORKERS = max((os.cpu_count() or 1) - 1, 1)
+# Min number of emails for the emails to be parsed in a process pool, as starting it is not worth it for a few ones
+PARSE_POOL_MIN_EMAILS = 50
+# Max number of emails waiting to be parsed per process, which bounds the memory used by fetched emails
+PARSE_MAX_IN_FLIGHT_PER_WORKER = 8
+
+# Max number of Gmail accounts scraped at the same time by the asyncio backend (one IMAP connection each)
+MAX_IMAP_CONNECTIONS = 10
+# Max amount of seconds to scrape a single account with the asyncio backend
+ACCOUNT_SCRAPE_TIMEOUT = 5 * 60
+# Max number of UID FETCH commands pipelined at the same time by the asyncio backend, which bounds the responses
+# buffered per account
+MAX_PIPELINED_FETCHES = 8
+
+# Engine used to extract Tango Cards from the body of the emails ("regex" or "soup")
+DEFAULT_EXTRACTOR_ENGINE = "regex"
+
 SECURITY_CODE_CLASS = "tango-credential-value"
 TANGO_LINK_CLASS = "tango-credential-key"
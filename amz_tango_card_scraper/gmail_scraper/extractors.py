@@ -0,0 +1,142 @@
+"""Module containing the engines that extract Tango Cards from the body of an email."""
+
+import html
+import re
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from amz_tango_card_scraper.utils.schemas import TangoCard
+
+from .constants import SECURITY_CODE_CLASS, TANGO_LINK_CLASS
+
+# Index of the credential divs that contain the Tango Card (the previous ones contain other reward details)
+CREDENTIAL_INDEX = 3
+
+
+def _build_div_pattern(class_name: str) -> re.Pattern:
+    """
+    Build a pattern that matches the divs with the given class and captures their inner HTML.
+
+    Args:
+        class_name: Class of the divs.
+
+    Returns:
+        The compiled pattern.
+    """
+    return re.compile(
+        r"<div\b[^>]*?(?<![\w-])class\s*=\s*([\"'])(?:[^\"']*\s)?"
+        + re.escape(class_name)
+        + r"(?:\s[^\"']*)?\1[^>]*>(?P<inner>.*?)</div\s*>",
+        re.IGNORECASE | re.DOTALL,
+    )
+
+
+SECURITY_CODE_DIV_PATTERN = _build_div_pattern(SECURITY_CODE_CLASS)
+TANGO_LINK_DIV_PATTERN = _build_div_pattern(TANGO_LINK_CLASS)
+HREF_PATTERN = re.compile(r"<a\b[^>]*?(?<![\w-])href\s*=\s*([\"'])(?P<href>.*?)\1", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<!--.*?-->|<[^>]*>", re.DOTALL)
+NESTED_DIV_PATTERN = re.compile(r"<div\b", re.IGNORECASE)
+
+
+def _extract_amazon_link(body: str) -> str:
+    """
+    Extract the Amazon link (e.g. "https://www.amazon.com") from the body of an email.
+
+    Args:
+        body: Body of the email.
+
+    Returns:
+        Extracted Amazon link.
+    """
+    return "https://www.amazon." + body.split("http://www.amazon.", 1)[1].split("/", 1)[0]
+
+
+def _find_credential_divs(pattern: re.Pattern, body: str) -> List[str]:
+    """
+    Find the inner HTML of the credential divs matched by the given pattern.
+
+    Args:
+        pattern: Pattern built with :func:`_build_div_pattern`.
+        body: Body of the email.
+
+    Raises:
+        ValueError: If there are not enough divs or if they contain nested divs, which regular expressions cannot
+            match reliably.
+
+    Returns:
+        Inner HTML of the divs up to the one that contains the Tango Card.
+    """
+    divs: List[str] = []
+    for match in pattern.finditer(body):
+        inner = match.group("inner")
+        if NESTED_DIV_PATTERN.search(inner):
+            raise ValueError("Nested divs are not supported by the regex extractor")
+        divs.append(inner)
+        if len(divs) > CREDENTIAL_INDEX:
+            return divs
+
+    raise ValueError("Tango Card credentials not found")
+
+
+def extract_tango_card_with_soup(body: str) -> TangoCard:
+    """
+    Extract Tango Card from the body of an email by building its whole tree with BeautifulSoup.
+
+    Args:
+        body: Body of the email.
+
+    Returns:
+        Extracted Tango Card.
+    """
+    soup = BeautifulSoup(body, "html.parser")
+
+    # Extract the security code
+    security_code = soup.find_all("div", {"class": SECURITY_CODE_CLASS})[CREDENTIAL_INDEX].get_text()
+
+    # Extract Tango link
+    tango_link = soup.find_all("div", {"class": TANGO_LINK_CLASS})[CREDENTIAL_INDEX].find("a").get("href")
+
+    # Extract Amazon link
+    amazon_link = _extract_amazon_link(body)
+
+    return TangoCard(security_code=security_code, tango_link=tango_link, amazon_link=amazon_link)  # type: ignore
+
+
+def extract_tango_card_with_regex(body: str) -> TangoCard:
+    """
+    Extract Tango Card from the body of an email with precompiled regular expressions, without building a tree.
+
+    Args:
+        body: Body of the email.
+
+    Raises:
+        ValueError: If the Tango Card could not be extracted.
+
+    Returns:
+        Extracted Tango Card.
+    """
+    # Extract the security code
+    security_code_div = _find_credential_divs(SECURITY_CODE_DIV_PATTERN, body)[CREDENTIAL_INDEX]
+    security_code = html.unescape(TAG_PATTERN.sub("", security_code_div))
+
+    # Extract Tango link
+    tango_link_div = _find_credential_divs(TANGO_LINK_DIV_PATTERN, body)[CREDENTIAL_INDEX]
+    href_match = HREF_PATTERN.search(tango_link_div)
+    if not href_match:
+        raise ValueError("Tango link not found")
+    tango_link = html.unescape(href_match.group("href"))
+
+    # Extract Amazon link
+    try:
+        amazon_link = _extract_amazon_link(body)
+    except IndexError:
+        raise ValueError("Amazon link not found")
+
+    return TangoCard(security_code=security_code, tango_link=tango_link, amazon_link=amazon_link)
+
+
+EXTRACTOR_ENGINES: Dict[str, Callable[[str], TangoCard]] = {
+    "regex": extract_tango_card_with_regex,
+    "soup": extract_tango_card_with_soup,
+}
@@ -1,75 +1,494 @@
 """Module to scrape Tango Cards from Gmail."""
 
-import email as em
 import imaplib
-from typing import List
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
+from amz_tango_card_scraper.utils.concurrency import bounded_ordered_map
 from amz_tango_card_scraper.utils.logger import setup_logger
-from amz_tango_card_scraper.utils.schemas import TangoCard
+from amz_tango_card_scraper.utils.schemas import (
+    FetchedMessage,
+    MailboxCheckpoint,
+    TangoCard,
+)
 
-from .constants import IMAP_GMAIL_URL
-from .helpers import extract_tango_card_from_body, get_body_of_email
+from .checkpoint import cap_checkpoint, load_checkpoint, save_checkpoint
+from .constants import (
+    DEFAULT_EXTRACTOR_ENGINE,
+    DEFAULT_PARSE_WORKERS,
+    FETCH_BATCH_SIZE,
+    GMAIL_EXTENSION_CAPABILITY,
+    IDLE_TIMEOUT,
+    IMAP_GMAIL_URL,
+    PARSE_MAX_IN_FLIGHT_PER_WORKER,
+    PARSE_POOL_MIN_EMAILS,
+    RECONNECT_MAX_DELAY,
+    RECONNECT_MIN_DELAY,
+    TANGO_CONTENT_FILTER,
+)
+from .helpers import (
+    build_search_criteria,
+    build_uid_sets,
+    fetch_text_parts,
+    parse_fetched_message,
+    parse_search_response,
+    parse_status_response,
+    quote_imap_string,
+)
+from .idle import wait_for_new_emails
 
 logger = setup_logger(logger_name=__name__)
 
 
-def scrape_tango_cards(email: str, app_password: str, from_list: List[str], trash: bool = False) -> List[TangoCard]:
+def _select_inbox(mail: imaplib.IMAP4) -> Tuple[int, int]:
     """
-    Scrape Tango Cards from Gmail using the IMAP protocol.
+    Select the inbox of the given IMAP connection.
+
+    Args:
+        mail: IMAP connection.
+
+    Returns:
+        A tuple containing the UIDVALIDITY and the UIDNEXT of the inbox
+    """
+    typ, data = mail.select("inbox")
+    if typ != "OK":
+        raise imaplib.IMAP4.error(f"Could not select the inbox: {data!r}")
+    uidvalidity = int(mail.response("UIDVALIDITY")[1][0] or 0)  # type: ignore
+    uidnext = int(mail.response("UIDNEXT")[1][0] or 1)  # type: ignore
+    return (uidvalidity, uidnext)
+
+
+def _is_unseen(fetched: FetchedMessage) -> bool:
+    """
+    Check whether a fetched email has not been read yet.
+
+    Args:
+        fetched: Fetched email.
+
+    Returns:
+        True if the email has not been read, False otherwise
+    """
+    if "\\Seen" in fetched.flags:
+        logger.info(f"Skipping email {fetched.uid.decode('utf-8')} as it has already been read...")
+        return False
+    return True
+
+
+def _search_inbox(mail: imaplib.IMAP4, from_list: List[str], last_uid: int, server_filter: bool) -> List[bytes]:
+    """
+    Search the selected inbox for unread emails newer than the given UID.
+
+    Args:
+        mail: IMAP connection with the inbox selected.
+        from_list: List of email addresses to search for Tango Cards.
+        last_uid: Highest UID that has already been scraped.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+
+    Returns:
+        The UIDs of the emails that matched the search
+    """
+    # Search for unread emails from any of the specified email addresses with a single command
+    logger.info(f"Searching for Tango Cards from {', '.join(from_list)}...")
+    criteria = build_search_criteria(
+        from_list,
+        unseen_only=True,
+        min_uid=last_uid + 1,
+        content_filter=TANGO_CONTENT_FILTER if server_filter else None,
+        gmail_raw=GMAIL_EXTENSION_CAPABILITY in mail.capabilities,
+    )
+    _, uid_data = mail.uid("SEARCH", None, criteria)  # type: ignore
+    # UID ranges always match the last email of the mailbox, even if its UID is lower than the start of the range
+    uids = [uid for uid in parse_search_response(uid_data) if int(uid) > last_uid]  # type: ignore
+    logger.info(f"Found {len(uids)} new unread email(s)")
+    return uids
+
+
+def _iter_inbox_tango_cards(
+    mail: imaplib.IMAP4, email: str, uids: List[bytes], batch_size: int, extractor: str, parse_workers: int
+) -> Iterator[TangoCard]:
+    """
+    Fetch the given emails of the selected inbox and yield the Tango Cards they contain as soon as they are parsed.
+
+    Args:
+        mail: IMAP connection with the inbox selected.
+        email: Gmail email address of the inbox, stored in the Tango Cards.
+        uids: UIDs of the emails to scrape.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        extractor: Engine used to extract the Tango Cards from the body of the emails.
+        parse_workers: Number of processes used to parse the emails when there are many of them.
+
+    Returns:
+        An iterator over the Tango Cards, in the order of the emails
+    """
+    # Fetch the text part of the emails in batches, skipping the ones that have been read since the search
+    messages = (fetched for fetched in fetch_text_parts(mail, uids, batch_size) if _is_unseen(fetched))
+    parse = partial(parse_fetched_message, extractor=extractor)
+
+    def found(cards: Iterable[Optional[TangoCard]]) -> Iterator[TangoCard]:
+        for tango_card in cards:
+            if tango_card:
+                logger.info(f"Tango Card found in email {tango_card.email_uid}")
+                yield tango_card._replace(email_address=email)
+
+    if parse_workers > 1 and len(uids) >= PARSE_POOL_MIN_EMAILS:
+        # Parse the emails in a process pool while the next ones are being fetched
+        logger.info(f"Parsing emails with {parse_workers} processes...")
+        with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+            max_in_flight = parse_workers * PARSE_MAX_IN_FLIGHT_PER_WORKER
+            yield from found(bounded_ordered_map(executor, parse, messages, max_in_flight))
+    else:
+        yield from found(map(parse, messages))
+
+
+def _scrape_inbox(
+    mail: imaplib.IMAP4,
+    email: str,
+    from_list: List[str],
+    last_uid: int,
+    batch_size: int,
+    server_filter: bool,
+    extractor: str,
+    parse_workers: int,
+) -> Tuple[List[TangoCard], List[bytes]]:
+    """
+    Search the selected inbox for unread emails newer than the given UID and scrape the Tango Cards they contain.
+
+    Args:
+        mail: IMAP connection with the inbox selected.
+        email: Gmail email address of the inbox, stored in the Tango Cards.
+        from_list: List of email addresses to search for Tango Cards.
+        last_uid: Highest UID that has already been scraped.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails.
+        parse_workers: Number of processes used to parse the emails when there are many of them.
+
+    Returns:
+        A tuple containing the scraped Tango Cards and the UIDs of the emails that matched the search
+    """
+    uids = _search_inbox(mail, from_list, last_uid, server_filter)
+    tango_cards = list(_iter_inbox_tango_cards(mail, email, uids, batch_size, extractor, parse_workers))
+    return (tango_cards, uids)
+
+
+def iter_tango_cards(
+    email: str,
+    app_password: str,
+    from_list: List[str],
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    on_checkpoint: Optional[Callable[[str, MailboxCheckpoint], None]] = None,
+) -> Iterator[TangoCard]:
+    """
+    Scrape Tango Cards from Gmail using the IMAP protocol, yielding every one as soon as its email is parsed.
+
+    This is the streaming variant of :func:`scrape_tango_cards`, which describes how the emails are searched and
+    fetched. Only one batch of emails is held in memory at a time, however large the mailbox is. The checkpoint is
+    only stored once every email has been scraped, and the connection is closed as soon as the iterator is closed.
+    Pass on_checkpoint to store it only once the Tango Cards have been processed instead.
 
     Args:
         email: Gmail email address.
         app_password: Gmail app password.
         from_list: List of email addresses to search for Tango Cards.
-        trash: Whether to trash the emails after scraping them.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        parse_workers: Number of processes used to parse the emails when there are many of them (e.g. backfills).
+        on_checkpoint: Function called with the email address and the checkpoint the inbox has been scraped up to
+            once every email has been scraped, instead of saving it to the checkpoint file. The caller saves it (see
+            :func:`cap_checkpoint`) once the Tango Cards have been processed, so a run that fails before that
+            scrapes the same emails again.
 
     Returns:
-        List of scraped Tango Cards.
+        An iterator over the scraped Tango Cards.
     """
     # Establish connection with Gmail
     mail = imaplib.IMAP4_SSL(IMAP_GMAIL_URL)
     # Login to Gmail
     mail.login(email, app_password)
-    # Select Inbox to search for Tango Card emails
-    mail.select("inbox")
 
+    try:
+        # Check whether there are new emails since the last run
+        checkpoint = load_checkpoint(checkpoint_file, email) if checkpoint_file else None
+        if checkpoint:
+            _, status_data = mail.status("inbox", "(UIDNEXT UIDVALIDITY)")
+            status = parse_status_response(status_data)  # type: ignore
+            if status.get("UIDVALIDITY") != checkpoint.uidvalidity:
+                logger.info("Inbox UIDVALIDITY has changed, performing a full resync...")
+                checkpoint = None
+            elif status.get("UIDNEXT", 0) <= checkpoint.last_uid + 1:
+                logger.info("No new emails since last run")
+                return
+
+        # Select Inbox to search for Tango Card emails
+        uidvalidity, uidnext = _select_inbox(mail)
+        last_uid = checkpoint.last_uid if checkpoint else 0
+
+        uids = _search_inbox(mail, from_list, last_uid, server_filter)
+        yield from _iter_inbox_tango_cards(mail, email, uids, batch_size, extractor, parse_workers)
+        mail.close()
+    finally:
+        mail.logout()
+
+    # Store the highest UID that has been scraped so the next run starts from there
+    checkpoint = MailboxCheckpoint(
+        uidvalidity=uidvalidity, last_uid=max([last_uid, uidnext - 1] + [int(uid) for uid in uids])
+    )
+    if on_checkpoint:
+        on_checkpoint(email, checkpoint)
+    elif checkpoint_file:
+        save_checkpoint(checkpoint_file, email, checkpoint)
+
+
+def scrape_tango_cards(
+    email: str,
+    app_password: str,
+    from_list: List[str],
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    on_tango_card: Optional[Callable[[TangoCard], None]] = None,
+    on_checkpoint: Optional[Callable[[str, MailboxCheckpoint], None]] = None,
+) -> List[TangoCard]:
+    """
+    Scrape Tango Cards from Gmail using the IMAP protocol.
+
+    The senders and the unread rule are compiled into a single UID SEARCH command, so every matching email is
+    only fetched once and emails that have already been read are never downloaded. Emails are then fetched in
+    batches with one UID FETCH command per chunk of UIDs, downloading only the text part that contains the Tango Card
+    instead of the whole email with its images and attachments.
+
+    If a checkpoint file is given, only the emails that arrived after the last run are searched. A cheap STATUS
+    command is issued first so runs without new emails return without selecting or searching the inbox, and a
+    change of UIDVALIDITY triggers a full resync.
+
+    If server filtering is enabled, the Tango content filter is also pushed to the server (through Gmail's X-GM-RAW
+    extension or the standard BODY key on other servers), so emails without Tango Cards are never downloaded.
+
+    Emails are left untouched (BODY.PEEK is used), use :func:`apply_mailbox_actions` with the UIDs of the Tango
+    Cards once they have been processed to trash them or mark them as read.
+
+    Args:
+        email: Gmail email address.
+        app_password: Gmail app password.
+        from_list: List of email addresses to search for Tango Cards.
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        parse_workers: Number of processes used to parse the emails when there are many of them (e.g. backfills).
+        on_tango_card: Function called with every Tango Card as soon as it is found, so work that depends on the
+            Tango Cards can start while the rest of the emails are scraped.
+        on_checkpoint: Function called with the email address and the checkpoint the inbox has been scraped up to
+            once every email has been scraped, instead of saving it to the checkpoint file.
+
+    Returns:
+        List of scraped Tango Cards.
+    """
     tango_cards: List[TangoCard] = []
-    # Search for Tango Card emails from the specified email addresses
-    for from_address in from_list:
-        logger.info(f"Searching for Tango Cards from {from_address}...")
-        # Fetch all emails from the specified email address
-        _, msg_ids = mail.search(None, "FROM", from_address)
-
-        # Iterate over all the emails
-        for msg_id in msg_ids[0].split():
-            # Fetch the email flags for the given ID
-            _, flags_data = mail.fetch(msg_id, "(FLAGS)")
-
-            # Fetch the email data (RFC822) for the given ID
-            _, msg_data = mail.fetch(msg_id, "(RFC822)")
-
-            # Iterate over all the responses
-            for response in msg_data:
-                # Check if the response is a tuple (contains the email data)
-                if isinstance(response, tuple):
-                    msg = em.message_from_bytes(response[1])
-                    # Check if email has been read, if so, skip it
-                    if "\\Seen" in flags_data[0].decode("utf-8"):  # type: ignore
-                        logger.info(f"Skipping email {msg_id.decode('utf-8')} as it has already been read...")
-                        continue
-
-                    body = get_body_of_email(msg)
-
-                    # Check if body contains Tango Card
-                    if "tango" in body:
-                        logger.info(f"Tango Card found in email {msg_id.decode('utf-8')}")
-                        # If it does, extract the Tango Card
-                        tango_cards.append(extract_tango_card_from_body(body))
-
-                        # Trash the email if specified
-                        if trash:
-                            logger.info(f"Trashing email {msg_id.decode('utf-8')}...")
-                            mail.store(msg_id, "+X-GM-LABELS", "\\Trash")
+    for tango_card in iter_tango_cards(
+        email,
+        app_password,
+        from_list,
+        batch_size,
+        checkpoint_file,
+        server_filter,
+        extractor,
+        parse_workers,
+        on_checkpoint,
+    ):
+        tango_cards.append(tango_card)
+        if on_tango_card:
+            on_tango_card(tango_card)
+    return tango_cards
+
+
+def _logout_quietly(mail: imaplib.IMAP4) -> None:
+    """
+    Log out of an IMAP connection, ignoring the errors of connections that have already been lost.
+
+    Args:
+        mail: IMAP connection.
+    """
+    try:
+        mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+
+def _is_authentication_failure(e: Exception) -> bool:
+    """
+    Check whether an IMAP error means that the server rejected the credentials, which reconnecting does not fix.
+
+    Args:
+        e: Error raised by the IMAP connection.
+
+    Returns:
+        True if the server answered with the AUTHENTICATIONFAILED response code, False otherwise
+    """
+    return (
+        isinstance(e, imaplib.IMAP4.error)
+        and not isinstance(e, imaplib.IMAP4.abort)
+        and "AUTHENTICATIONFAILED" in str(e)
+    )
+
+
+def watch_tango_cards(
+    email: str,
+    app_password: str,
+    from_list: List[str],
+    on_tango_cards: Callable[[List[TangoCard]], Optional[List[TangoCard]]],
+    batch_size: int = FETCH_BATCH_SIZE,
+    checkpoint_file: Optional[str] = None,
+    server_filter: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    idle_timeout: float = IDLE_TIMEOUT,
+    checkpoint: Optional[MailboxCheckpoint] = None,
+) -> None:
+    """
+    Watch the Gmail inbox with the IMAP IDLE command and scrape Tango Cards as soon as new emails arrive.
+
+    Only the emails that arrive after the checkpoint (the one in the checkpoint file or the given one) are scraped,
+    or after the watch starts if there is none, so :func:`scrape_tango_cards` should be called first to scrape the
+    existing ones. The IDLE command is re-issued before Gmail drops idling connections and the connection is
+    re-established with exponential backoff whenever it is lost. The checkpoint only moves past an email once its
+    Tango Card has been processed by on_tango_cards, whose errors are logged and do not stop the watch. This
+    function never returns, it only raises if Gmail rejects the credentials.
+
+    Args:
+        email: Gmail email address.
+        app_password: Gmail app password.
+        from_list: List of email addresses to search for Tango Cards.
+        on_tango_cards: Function that will be called with the Tango Cards scraped from every batch of new emails. It
+            can return the Tango Cards that could not be processed, so their emails are scraped again (all of them
+            are if it raises).
+        batch_size: Maximum number of emails fetched per UID FETCH command.
+        checkpoint_file: Path to the file where the checkpoint of every account is stored.
+        server_filter: Whether to let the server filter out the emails that do not contain Tango Cards.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        parse_workers: Number of processes used to parse the emails when there are many of them (e.g. backfills).
+        idle_timeout: Max amount of seconds to idle before re-issuing the IDLE command.
+        checkpoint: Checkpoint to start watching from if there is none in the checkpoint file, e.g. the one reached
+            by the initial scrape, so the emails that arrive while its Tango Cards are processed are not missed.
+    """
+    # Resume from the last scraped email if a checkpoint is available
+    checkpoint = (load_checkpoint(checkpoint_file, email) if checkpoint_file else None) or checkpoint
+    reconnect_delay = RECONNECT_MIN_DELAY
+    mail: Optional[imaplib.IMAP4] = None
+    while True:
+        try:
+            # Establish connection with Gmail and select Inbox
+            mail = imaplib.IMAP4_SSL(IMAP_GMAIL_URL)
+            mail.login(email, app_password)
+            uidvalidity, uidnext = _select_inbox(mail)
+            logger.info("Watching Gmail inbox for new Tango Cards...")
+            reconnect_delay = RECONNECT_MIN_DELAY
+
+            # Start watching from the current end of the inbox if there is no valid checkpoint
+            if checkpoint is None or checkpoint.uidvalidity != uidvalidity:
+                checkpoint = MailboxCheckpoint(uidvalidity=uidvalidity, last_uid=uidnext - 1)
+
+            # Emails that arrived since the checkpoint (e.g. while reconnecting) are scraped right away
+            new_emails = checkpoint.last_uid < uidnext - 1
+            while True:
+                if new_emails:
+                    tango_cards, uids = _scrape_inbox(
+                        mail,
+                        email,
+                        from_list,
+                        checkpoint.last_uid,
+                        batch_size,
+                        server_filter,
+                        extractor,
+                        parse_workers,
+                    )
+                    unprocessed_tango_cards: Optional[List[TangoCard]] = []
+                    if tango_cards:
+                        try:
+                            unprocessed_tango_cards = on_tango_cards(tango_cards)
+                        except Exception as e:
+                            # A batch that fails to be processed must not stop the watch
+                            logger.error(f"Could not process the Tango Cards of the new emails: {e!r}")
+                            unprocessed_tango_cards = tango_cards
+
+                    # Move the checkpoint up to the last email, but below the ones that could not be processed
+                    last_uid = max([checkpoint.last_uid] + [int(uid) for uid in uids])
+                    checkpoint = cap_checkpoint(
+                        MailboxCheckpoint(uidvalidity=uidvalidity, last_uid=last_uid),
+                        [tc.email_uid for tc in unprocessed_tango_cards or []],
+                    )
+                    if checkpoint_file:
+                        save_checkpoint(checkpoint_file, email, checkpoint)
+
+                # Wait until the server notifies new emails, re-issuing IDLE before the server drops the connection
+                new_emails = wait_for_new_emails(mail, idle_timeout)
+        except (imaplib.IMAP4.error, OSError) as e:
+            # Close the old connection so it is not left open on the server
+            if mail is not None:
+                _logout_quietly(mail)
+                mail = None
+            if _is_authentication_failure(e):
+                raise
+            logger.warning(f"Connection to Gmail failed ({e}), reconnecting in {reconnect_delay} seconds...")
+            time.sleep(reconnect_delay)
+            reconnect_delay = min(reconnect_delay * 2, RECONNECT_MAX_DELAY)
+
+
+def apply_mailbox_actions(
+    email: str,
+    app_password: str,
+    uids: List[str],
+    trash: bool = False,
+    mark_seen: bool = False,
+    label: Optional[str] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> None:
+    """
+    Apply the given actions to the emails with the given UIDs in the Gmail inbox.
+
+    UIDs are compressed into ranges and every action is applied with one UID STORE command per chunk of UIDs.
+    This should only be called once the Tango Cards of the emails have been processed, so an email is never trashed
+    before its Tango Card has been redeemed.
+
+    Args:
+        email: Gmail email address.
+        app_password: Gmail app password.
+        uids: UIDs of the emails.
+        trash: Whether to trash the emails.
+        mark_seen: Whether to mark the emails as read.
+        label: Gmail label to add to the emails (e.g. "processed"), None to not add any label.
+        batch_size: Maximum number of UIDs per UID STORE command.
+    """
+    uids = [uid for uid in uids if uid]
+    if not uids or not (trash or mark_seen or label):
+        return
+
+    # Establish connection with Gmail and select Inbox
+    mail = imaplib.IMAP4_SSL(IMAP_GMAIL_URL)
+    mail.login(email, app_password)
+    mail.select("inbox")
+
+    for uid_set in build_uid_sets(uids, batch_size):
+        if mark_seen:
+            logger.info(f"Marking emails {uid_set} as read...")
+            mail.uid("STORE", uid_set, "+FLAGS.SILENT", "(\\Seen)")
+        if label:
+            logger.info(f"Labelling emails {uid_set} as {label}...")
+            mail.uid("STORE", uid_set, "+X-GM-LABELS", f"({quote_imap_string(label)})")
+        # Trash the emails last, as they could be removed from the inbox right away
+        if trash:
+            logger.info(f"Trashing emails {uid_set}...")
+            mail.uid("STORE", uid_set, "+X-GM-LABELS", "(\\Trash)")
 
     mail.close()
-    return tango_cards
+    mail.logout()
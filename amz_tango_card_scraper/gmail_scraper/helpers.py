@@ -1,10 +1,27 @@
+import base64
+import binascii
+import email as em
+import imaplib
+import quopri
+import re
 from email.message import Message
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
 
-from bs4 import BeautifulSoup
+from amz_tango_card_scraper.utils.schemas import FetchedMessage, TangoCard, TextPart
 
-from amz_tango_card_scraper.utils.schemas import TangoCard
+from .bodystructure import find_text_part, parse_fetch_attributes
+from .constants import DEFAULT_EXTRACTOR_ENGINE, FETCH_BATCH_SIZE, TANGO_CONTENT_FILTER
+from .extractors import (
+    EXTRACTOR_ENGINES,
+    extract_tango_card_with_regex,
+    extract_tango_card_with_soup,
+)
 
-from .constants import SECURITY_CODE_CLASS, TANGO_LINK_CLASS
+T = TypeVar("T")
+
+UID_PATTERN = re.compile(rb"UID (\d+)")
+FLAGS_PATTERN = re.compile(rb"FLAGS \(([^)]*)\)")
+STATUS_ITEMS_PATTERN = re.compile(rb"\(([^()]*)\)\s*$")
 
 
 def get_body_of_email(msg: Message) -> str:  # type: ignore
@@ -29,31 +46,379 @@ def get_body_of_email(msg: Message) -> str:  # type: ignore
         return msg.get_payload(decode=True).decode("utf-8")
 
 
-def extract_tango_card_from_body(body: str) -> TangoCard:
+def extract_tango_card_from_body(body: str, engine: str = DEFAULT_EXTRACTOR_ENGINE) -> TangoCard:
     """
     Extract Tango Card from the body of an email.
 
     Args:
         body: Body of the email.
+        engine: Extractor engine to use (see :data:`EXTRACTOR_ENGINES`). If the regex engine cannot extract the
+            Tango Card, the BeautifulSoup engine is used instead.
+
+    Raises:
+        ValueError: If the engine does not exist.
 
     Returns:
         Extracted Tango Card.
     """
-    soup = BeautifulSoup(body, "html.parser")
+    if engine not in EXTRACTOR_ENGINES:
+        raise ValueError(f"Unknown extractor engine: {engine}")
+
+    if engine == "regex":
+        try:
+            return extract_tango_card_with_regex(body)
+        except ValueError:
+            # Fall back to the slower but more tolerant BeautifulSoup engine
+            return extract_tango_card_with_soup(body)
+
+    return EXTRACTOR_ENGINES[engine](body)
+
+
+def quote_imap_string(value: str) -> str:
+    """
+    Quote a string so it can be used as an argument of an IMAP command.
+
+    Args:
+        value: String to quote.
+
+    Returns:
+        The quoted string.
+    """
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_search_criteria(
+    from_list: List[str],
+    unseen_only: bool = True,
+    min_uid: int = 1,
+    content_filter: Optional[str] = None,
+    gmail_raw: bool = False,
+) -> str:
+    """
+    Compile the list of senders into a single IMAP SEARCH criteria.
+
+    IMAP's OR key only takes two search keys, so the senders are nested as
+    OR (OR (OR FROM a FROM b) FROM c) FROM d, which is written in prefix form as OR OR OR FROM a FROM b FROM c FROM d.
+
+    Args:
+        from_list: List of email addresses to search for.
+        unseen_only: Whether to only match emails that have not been read yet.
+        min_uid: Lowest UID that can be matched, used to only search emails that arrived after the last run.
+        content_filter: Text that the content of the email must contain.
+        gmail_raw: Whether to filter the content with Gmail's X-GM-RAW extension instead of the standard BODY key.
+
+    Returns:
+        The IMAP SEARCH criteria.
+    """
+    from_keys = [f"FROM {quote_imap_string(from_address)}" for from_address in from_list]
+    criteria = " ".join(["OR"] * (len(from_keys) - 1) + from_keys)
+
+    if unseen_only:
+        criteria = f"UNSEEN {criteria}"
+
+    if content_filter:
+        content_key = "X-GM-RAW" if gmail_raw else "BODY"
+        criteria = f"{criteria} {content_key} {quote_imap_string(content_filter)}"
+
+    if min_uid > 1:
+        criteria = f"UID {min_uid}:* {criteria}"
+
+    return criteria
+
+
+def parse_search_response(data: List[bytes]) -> List[bytes]:
+    """
+    Parse the response of a UID SEARCH command into a list of unique UIDs sorted in ascending order.
+
+    Args:
+        data: Data returned by imaplib for the UID SEARCH command.
+
+    Returns:
+        List of unique UIDs.
+    """
+    uids = {uid for line in data if line for uid in line.split()}
+    return sorted(uids, key=int)
+
+
+def parse_status_response(data: List[bytes]) -> Dict[str, int]:
+    """
+    Parse the response of a STATUS command (e.g. b'"INBOX" (UIDNEXT 1234 UIDVALIDITY 5)').
+
+    Args:
+        data: Data returned by imaplib for the STATUS command.
+
+    Returns:
+        Dictionary that maps every status item to its value.
+    """
+    items = STATUS_ITEMS_PATTERN.search(data[0]) if data and data[0] else None
+    if not items:
+        return {}
+
+    tokens = items.group(1).split()
+    return {name.decode("utf-8").upper(): int(value) for name, value in zip(tokens[::2], tokens[1::2])}
+
+
+def build_uid_sets(uids: Sequence[Union[bytes, str]], size: int = FETCH_BATCH_SIZE) -> List[str]:
+    """
+    Compress UIDs into IMAP sequence sets of consecutive ranges (e.g. "1:3,7,9:10"), with at most size UIDs per set.
+
+    Args:
+        uids: UIDs to compress.
+        size: Maximum number of UIDs per sequence set.
+
+    Returns:
+        List of sequence sets that cover all the UIDs.
+    """
+    sorted_uids = sorted({int(uid) for uid in uids})
+
+    sequence_sets: List[str] = []
+    for chunk in chunk_uids(sorted_uids, size):
+        ranges: List[str] = []
+        start = end = chunk[0]
+        for uid in chunk[1:] + [None]:
+            if uid is not None and uid == end + 1:
+                end = uid
+                continue
+            ranges.append(f"{start}:{end}" if start != end else str(start))
+            if uid is not None:
+                start = end = uid
+        sequence_sets.append(",".join(ranges))
+
+    return sequence_sets
+
+
+def chunk_uids(uids: Sequence[T], size: int = FETCH_BATCH_SIZE) -> Iterator[List[T]]:
+    """
+    Split a sequence of UIDs into chunks of at most the given size.
+
+    Args:
+        uids: UIDs to split.
+        size: Maximum number of UIDs per chunk.
+
+    Returns:
+        An iterator over the chunks of UIDs.
+    """
+    for start in range(0, len(uids), size):
+        end = start + size
+        yield list(uids[start:end])
+
+
+def parse_fetch_response(data: List[Union[bytes, Tuple[bytes, bytes]]]) -> List[FetchedMessage]:
+    """
+    Parse the response of a UID FETCH command that requested the FLAGS and the body of several emails.
+
+    Each email is returned by imaplib as a tuple containing the response header and the literal with the
+    email content. Depending on the server, the FLAGS item can be placed before the literal (in the header)
+    or after it (in the bytes that follow the tuple), so both places are checked.
+
+    Args:
+        data: Data returned by imaplib for the UID FETCH command.
+
+    Returns:
+        List of fetched emails in the order they were returned by the server.
+    """
+    messages: List[FetchedMessage] = []
+    for i, response in enumerate(data):
+        # Only tuples contain the email content, the rest are closing parentheses or unsolicited responses
+        if not isinstance(response, tuple):
+            continue
 
-    # Extract the security code
-    security_code = soup.find_all("div", {"class": SECURITY_CODE_CLASS})[3].get_text()
+        header, raw = response
+        # Items that come after the literal are returned in the next element
+        trailer = data[i + 1] if i + 1 < len(data) and isinstance(data[i + 1], bytes) else b""
+        meta = header + b" " + trailer  # type: ignore
+
+        uid_match = UID_PATTERN.search(meta)
+        if not uid_match:
+            continue
+        flags_match = FLAGS_PATTERN.search(meta)
+        flags = flags_match.group(1).decode("utf-8") if flags_match else ""
+
+        messages.append(FetchedMessage(uid=uid_match.group(1), flags=flags, raw=raw))
+
+    return messages
+
+
+def fetch_messages(
+    mail: imaplib.IMAP4, uids: Sequence[bytes], batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[FetchedMessage]:
+    """
+    Fetch the flags and the content of the given emails with one UID FETCH command per chunk of UIDs.
+
+    BODY.PEEK[] is used instead of RFC822 so fetching an email does not mark it as read.
+
+    Args:
+        mail: IMAP connection with a selected mailbox.
+        uids: UIDs of the emails to fetch.
+        batch_size: Maximum number of UIDs requested per UID FETCH command.
+
+    Returns:
+        An iterator over the fetched emails.
+    """
+    for chunk in chunk_uids(uids, batch_size):
+        _, data = mail.uid("FETCH", b",".join(chunk).decode("utf-8"), "(UID FLAGS BODY.PEEK[])")
+        yield from parse_fetch_response(data)  # type: ignore
+
+
+def decode_part(payload: bytes, encoding: str, charset: str) -> str:
+    """
+    Decode the raw content of a single part of an email.
+
+    Args:
+        payload: Raw content of the part.
+        encoding: Content transfer encoding of the part (e.g. "base64").
+        charset: Charset of the part (e.g. "utf-8").
+
+    Returns:
+        Decoded content of the part.
+    """
+    encoding = encoding.lower()
+    if encoding == "base64":
+        try:
+            payload = base64.b64decode(payload)
+        except binascii.Error:
+            # Same behavior as email.message.Message.get_payload with malformed base64 content
+            pass
+    elif encoding == "quoted-printable":
+        payload = quopri.decodestring(payload)
+
+    try:
+        return payload.decode(charset)
+    except LookupError:
+        # Unknown charset
+        return payload.decode("utf-8")
+
+
+def get_text_of_fetched_message(fetched: FetchedMessage) -> str:
+    """
+    Get the body of a fetched email, as returned by :func:`get_body_of_email`.
+
+    Args:
+        fetched: Fetched email, either complete or only its text part.
+
+    Returns:
+        Body of the email.
+    """
+    if fetched.section is None:
+        return get_body_of_email(em.message_from_bytes(fetched.raw))
+    return decode_part(fetched.raw, fetched.encoding, fetched.charset)
+
+
+def parse_fetched_message(fetched: FetchedMessage, extractor: str = DEFAULT_EXTRACTOR_ENGINE) -> Optional[TangoCard]:
+    """
+    Decode a fetched email and extract the Tango Card it contains.
+
+    This function only depends on its arguments so it can be run in a separate process.
+
+    Args:
+        fetched: Fetched email.
+        extractor: Engine used to extract the Tango Card from the body of the email.
+
+    Returns:
+        Extracted Tango Card, with the UID of the email, or None if the email does not contain a Tango Card.
+    """
+    body = get_text_of_fetched_message(fetched)
+
+    # Check if body contains Tango Card
+    if not body or TANGO_CONTENT_FILTER not in body:
+        return None
+
+    return extract_tango_card_from_body(body, extractor)._replace(email_uid=fetched.uid.decode("utf-8"))
+
+
+def group_text_parts(data: List[Union[bytes, Tuple[bytes, bytes]]]) -> Dict[str, List[Tuple[bytes, str, TextPart]]]:
+    """
+    Locate the text part of every email in the response of a UID FETCH (UID FLAGS BODYSTRUCTURE) command and group
+    the emails by the section number of their text part.
+
+    Emails whose structure cannot be parsed (e.g. because it contains literals) are left out.
+
+    Args:
+        data: Data returned for the UID FETCH command.
+
+    Returns:
+        Dictionary that maps every section number to the UID, flags and text part of the emails.
+    """
+    sections: Dict[str, List[Tuple[bytes, str, TextPart]]] = {}
+    for response in data:
+        if not isinstance(response, bytes) or b"BODYSTRUCTURE" not in response:
+            continue
+        try:
+            attributes = parse_fetch_attributes(response)
+        except ValueError:
+            continue
+        text_part = find_text_part(attributes.get("BODYSTRUCTURE") or [])
+        if "UID" in attributes and text_part:
+            flags = " ".join(str(flag) for flag in attributes.get("FLAGS") or [])
+            uid = str(attributes["UID"]).encode("utf-8")
+            sections.setdefault(text_part.section, []).append((uid, flags, text_part))
+
+    return sections
+
+
+def build_text_part_messages(
+    parts: List[Tuple[bytes, str, TextPart]], data: List[Union[bytes, Tuple[bytes, bytes]]]
+) -> Dict[bytes, FetchedMessage]:
+    """
+    Build the fetched emails from the response of a UID FETCH (UID BODY.PEEK[<section>]) command.
+
+    Args:
+        parts: UID, flags and text part of the emails whose section was fetched, as returned by
+            :func:`group_text_parts`.
+        data: Data returned for the UID FETCH command.
+
+    Returns:
+        Dictionary that maps the UID of every email that was returned by the server to the fetched email.
+    """
+    payloads = {message.uid: message.raw for message in parse_fetch_response(data)}
+    return {
+        uid: FetchedMessage(
+            uid=uid,
+            flags=flags,
+            raw=payloads[uid],
+            section=text_part.section,
+            encoding=text_part.encoding,
+            charset=text_part.charset,
+        )
+        for uid, flags, text_part in parts
+        if uid in payloads
+    }
+
+
+def fetch_text_parts(
+    mail: imaplib.IMAP4, uids: Sequence[bytes], batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[FetchedMessage]:
+    """
+    Fetch the flags and the text part of the given emails, without downloading the rest of their parts.
+
+    The BODYSTRUCTURE of every chunk of emails is fetched first to locate the part that :func:`get_body_of_email`
+    would return. Then only that part is fetched with one UID FETCH command per section number in the chunk.
+    Emails whose structure cannot be parsed are fetched completely instead.
+
+    Args:
+        mail: IMAP connection with a selected mailbox.
+        uids: UIDs of the emails to fetch.
+        batch_size: Maximum number of UIDs requested per UID FETCH command.
+
+    Returns:
+        An iterator over the fetched emails, in the same order as the given UIDs.
+    """
+    for chunk in chunk_uids(uids, batch_size):
+        # Locate the text part of every email and group the emails by its section number
+        _, data = mail.uid("FETCH", b",".join(chunk).decode("utf-8"), "(UID FLAGS BODYSTRUCTURE)")
+        sections = group_text_parts(data)  # type: ignore
 
-    # Extract Tango link
-    tango_link = soup.find_all("div", {"class": TANGO_LINK_CLASS})[3].find("a").get("href")
+        # Fetch only the text part of the emails
+        fetched: Dict[bytes, FetchedMessage] = {}
+        for section, parts in sections.items():
+            section_uids = b",".join(uid for uid, _, _ in parts).decode("utf-8")
+            _, data = mail.uid("FETCH", section_uids, f"(UID BODY.PEEK[{section}])")
+            fetched.update(build_text_part_messages(parts, data))  # type: ignore
 
-    # Extract Amazon link
-    amazon_link = (  # type: ignore
-        "https://www.amazon."
-        + body.split("http://www.amazon.", 1)[1].split(  # type: ignore
-            "/",
-            1,
-        )[0]
-    )
+        # Fall back to fetching the whole email if its text part could not be fetched
+        missing = [uid for uid in chunk if uid not in fetched]
+        fetched.update({message.uid: message for message in fetch_messages(mail, missing, batch_size)})
 
-    return TangoCard(security_code=security_code, tango_link=tango_link, amazon_link=amazon_link)  # type: ignore
+        for uid in chunk:
+            if uid in fetched:
+                yield fetched[uid]
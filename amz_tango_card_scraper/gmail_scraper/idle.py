@@ -0,0 +1,96 @@
+"""Module implementing the IMAP IDLE command (RFC 2177) on top of imaplib connections."""
+
+import imaplib
+import re
+import socket
+import time
+
+from .constants import IDLE_TIMEOUT
+
+EXISTS_PATTERN = re.compile(rb"^\* \d+ EXISTS")
+
+
+def _read_idle_line(mail: imaplib.IMAP4, timeout: float) -> bytes:
+    """
+    Read a line sent by the server while idling, waiting at most the given amount of time.
+
+    Args:
+        mail: IMAP connection.
+        timeout: Max amount of seconds to wait for the line.
+
+    Raises:
+        socket.timeout: If no line has been received after the timeout.
+        imaplib.IMAP4.abort: If the connection has been closed by the server.
+
+    Returns:
+        The line sent by the server.
+    """
+    mail.sock.settimeout(timeout)
+    try:
+        line = mail.readline()
+    except socket.timeout:
+        # A file object whose socket timed out cannot be read again, so a new one is created.
+        # No data is lost as the timeout means that the server has not sent anything.
+        mail.file = mail.sock.makefile("rb")
+        raise
+    finally:
+        mail.sock.settimeout(None)
+
+    if not line:
+        raise imaplib.IMAP4.abort("Connection closed by the server while idling")
+    return line
+
+
+def wait_for_new_emails(mail: imaplib.IMAP4, timeout: float = IDLE_TIMEOUT) -> bool:
+    """
+    Issue the IDLE command on the selected mailbox and wait until the server notifies new emails or the timeout expires.
+
+    The timeout must be lower than the time the server allows a connection to idle (around 29 minutes for Gmail),
+    so the caller can re-issue the command before the server drops the connection.
+
+    Args:
+        mail: IMAP connection with a selected mailbox.
+        timeout: Max amount of seconds to idle.
+
+    Raises:
+        imaplib.IMAP4.abort: If the server rejects the command or closes the connection.
+
+    Returns:
+        True if the server notified new emails, False if the timeout expired.
+    """
+    tag = mail._new_tag()  # type: ignore
+    mail.send(tag + b" IDLE\r\n")
+
+    # Wait for the server to accept the command
+    line = mail.readline()
+    if not line.startswith(b"+"):
+        mail.tagged_commands.pop(tag, None)  # type: ignore
+        raise imaplib.IMAP4.abort(f"IDLE command rejected: {line.decode('utf-8', 'replace').strip()}")
+
+    # Wait for an EXISTS response, ignoring keep-alive responses sent by the server
+    new_emails = False
+    deadline = time.monotonic() + timeout
+    while not new_emails:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            new_emails = EXISTS_PATTERN.match(_read_idle_line(mail, remaining)) is not None
+        except socket.timeout:
+            break
+
+    # Finish idling and wait for the tagged response of the IDLE command
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed by the server while idling")
+        if line.startswith(tag):
+            break
+        new_emails = new_emails or EXISTS_PATTERN.match(line) is not None
+    mail.tagged_commands.pop(tag, None)  # type: ignore
+
+    if not line.startswith(tag + b" OK"):
+        raise imaplib.IMAP4.abort(f"IDLE command failed: {line.decode('utf-8', 'replace').strip()}")
+
+    return new_emails
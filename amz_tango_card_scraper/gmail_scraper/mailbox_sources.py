@@ -0,0 +1,258 @@
+"""Module to scrape Tango Cards from exported mailboxes (mbox files, Maildir trees and .eml directories)."""
+
+import email as em
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from amz_tango_card_scraper.utils.concurrency import bounded_ordered_map
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import TangoCard
+
+from .constants import (
+    DEFAULT_EXTRACTOR_ENGINE,
+    DEFAULT_PARSE_WORKERS,
+    PARSE_MAX_IN_FLIGHT_PER_WORKER,
+    PARSE_POOL_MIN_EMAILS,
+    TANGO_CONTENT_FILTER,
+)
+from .helpers import extract_tango_card_from_body, get_body_of_email
+
+logger = setup_logger(logger_name=__name__)
+
+# Lines of the body that start with "From " are quoted with ">" in mbox files (mboxrd)
+MBOX_QUOTED_FROM_PATTERN = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+
+def iter_mbox_messages(file_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Iterate over the emails of an mbox file.
+
+    The file is memory-mapped and split on the "From " lines that start every email, so only one email is copied
+    into memory at a time regardless of the size of the file.
+
+    Args:
+        file_path: Path to the mbox file.
+
+    Returns:
+        An iterator over tuples containing the location of every email (e.g. "inbox.mbox:1024") and its raw content
+    """
+    if os.path.getsize(file_path) == 0:
+        return
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        if mm[:5] == b"From ":
+            start = 0
+        else:
+            # Skip anything before the first email
+            separator = mm.find(b"\nFrom ")
+            if separator == -1:
+                return
+            start = separator + 1
+
+        while start < size:
+            # Every email ends where the "From " line of the next one starts
+            separator = mm.find(b"\nFrom ", start)
+            end = separator + 1 if separator != -1 else size
+
+            # Skip the "From " line itself
+            content_start = mm.find(b"\n", start, end) + 1 or end
+            raw = mm[content_start:end]
+            if b">From " in raw:
+                raw = MBOX_QUOTED_FROM_PATTERN.sub(rb"\1", raw)
+            yield (f"{file_path}:{start}", raw)
+
+            start = end
+
+
+def iter_maildir_messages(dir_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Iterate over the emails of a Maildir tree (its "cur" and "new" subdirectories).
+
+    Args:
+        dir_path: Path to the Maildir tree.
+
+    Returns:
+        An iterator over tuples containing the path of every email and its raw content
+    """
+    for subdir in ("cur", "new"):
+        subdir_path = os.path.join(dir_path, subdir)
+        if not os.path.isdir(subdir_path):
+            continue
+        for entry in sorted(os.scandir(subdir_path), key=lambda entry: entry.name):
+            if entry.is_file() and not entry.name.startswith("."):
+                with open(entry.path, "rb") as f:
+                    yield (entry.path, f.read())
+
+
+def iter_eml_messages(path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Iterate over the .eml files of a directory, or over a single .eml file.
+
+    Args:
+        path: Path to the directory or the .eml file.
+
+    Returns:
+        An iterator over tuples containing the path of every email and its raw content
+    """
+    if os.path.isdir(path):
+        file_paths = sorted(
+            entry.path for entry in os.scandir(path) if entry.is_file() and entry.name.lower().endswith(".eml")
+        )
+    else:
+        file_paths = [path]
+
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            yield (file_path, f.read())
+
+
+def iter_mailbox_messages(path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Iterate over the emails of an exported mailbox, detecting its format from the path.
+
+    Directories with a "cur" or "new" subdirectory are read as Maildir trees, other directories and .eml files as
+    .eml files, and any other file as an mbox file.
+
+    Args:
+        path: Path to the mailbox.
+
+    Raises:
+        FileNotFoundError: If the path does not exist.
+
+    Returns:
+        An iterator over tuples containing the location of every email and its raw content
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Mailbox "{path}" not found')
+
+    if os.path.isdir(path):
+        if os.path.isdir(os.path.join(path, "cur")) or os.path.isdir(os.path.join(path, "new")):
+            return iter_maildir_messages(path)
+        return iter_eml_messages(path)
+    if path.lower().endswith(".eml"):
+        return iter_eml_messages(path)
+    return iter_mbox_messages(path)
+
+
+def parse_mailbox_message(
+    message: Tuple[str, bytes], from_list: Optional[List[str]] = None, extractor: str = DEFAULT_EXTRACTOR_ENGINE
+) -> Optional[TangoCard]:
+    """
+    Parse an email of an exported mailbox and extract the Tango Card it contains.
+
+    This function only depends on its arguments so it can be run in a separate process.
+
+    Args:
+        message: Location and raw content of the email.
+        from_list: List of email addresses that can send Tango Cards, None to accept any sender.
+        extractor: Engine used to extract the Tango Card from the body of the email.
+
+    Returns:
+        Extracted Tango Card or None if the email does not contain a Tango Card.
+    """
+    location, raw = message
+    msg = em.message_from_bytes(raw)
+
+    # Check if the email comes from any of the specified email addresses
+    if from_list:
+        sender = str(msg.get("From", "")).lower()
+        if not any(address.lower() in sender for address in from_list):
+            return None
+
+    # Check if body contains Tango Card
+    try:
+        body = get_body_of_email(msg)
+    except (AttributeError, UnicodeDecodeError):
+        logger.warning(f"Skipping email {location} as its body could not be decoded...")
+        return None
+    if not body or TANGO_CONTENT_FILTER not in body:
+        return None
+
+    try:
+        return extract_tango_card_from_body(body, extractor)
+    except (IndexError, AttributeError, ValueError):
+        logger.warning(f"Skipping email {location} as its Tango Card could not be extracted...")
+        return None
+
+
+def iter_tango_cards_from_mailbox(
+    path: str,
+    from_list: Optional[List[str]] = None,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+) -> Iterator[TangoCard]:
+    """
+    Scrape Tango Cards from an exported mailbox, yielding every one as soon as its email is parsed.
+
+    This is the streaming variant of :func:`scrape_tango_cards_from_mailbox`, emails are read from disk as they are
+    needed so the memory used does not depend on the size of the mailbox.
+
+    Args:
+        path: Path to the mailbox.
+        from_list: List of email addresses that can send Tango Cards, None to accept any sender.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        parse_workers: Number of processes used to parse the emails when there are many of them.
+
+    Raises:
+        FileNotFoundError: If the path does not exist.
+
+    Returns:
+        An iterator over the scraped Tango Cards.
+    """
+    logger.info(f"Reading emails from {path}...")
+    messages = iter_mailbox_messages(path)
+    parse = partial(parse_mailbox_message, from_list=from_list, extractor=extractor)
+
+    # Only start a process pool if there are enough emails to make it worth it
+    head = list(islice(messages, PARSE_POOL_MIN_EMAILS))
+    if parse_workers > 1 and len(head) >= PARSE_POOL_MIN_EMAILS:
+        logger.info(f"Parsing emails with {parse_workers} processes...")
+        with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+            max_in_flight = parse_workers * PARSE_MAX_IN_FLIGHT_PER_WORKER
+            results = bounded_ordered_map(executor, parse, chain(head, messages), max_in_flight)
+            yield from (tango_card for tango_card in results if tango_card)
+    else:
+        yield from (tango_card for tango_card in map(parse, chain(head, messages)) if tango_card)
+
+
+def scrape_tango_cards_from_mailbox(
+    path: str,
+    from_list: Optional[List[str]] = None,
+    extractor: str = DEFAULT_EXTRACTOR_ENGINE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    on_tango_card: Optional[Callable[[TangoCard], None]] = None,
+) -> List[TangoCard]:
+    """
+    Scrape Tango Cards from an exported mailbox (an mbox file, a Maildir tree or a directory of .eml files).
+
+    Emails are read straight from disk and parsed the same way as emails fetched from Gmail, in a process pool if
+    there are many of them. Read emails are also scraped, and the Tango Cards have no email UID, so no mailbox
+    actions are applied to them.
+
+    Args:
+        path: Path to the mailbox.
+        from_list: List of email addresses that can send Tango Cards, None to accept any sender.
+        extractor: Engine used to extract the Tango Cards from the body of the emails ("regex" or "soup").
+        parse_workers: Number of processes used to parse the emails when there are many of them.
+        on_tango_card: Function called with every Tango Card as soon as it is found.
+
+    Raises:
+        FileNotFoundError: If the path does not exist.
+
+    Returns:
+        List of scraped Tango Cards.
+    """
+    tango_cards: List[TangoCard] = []
+    for tango_card in iter_tango_cards_from_mailbox(path, from_list, extractor, parse_workers):
+        tango_cards.append(tango_card)
+        if on_tango_card:
+            on_tango_card(tango_card)
+
+    logger.info(f"Found {len(tango_cards)} Tango Card(s) in {path}")
+    return tango_cards
@@ -0,0 +1,191 @@
+"""Module containing the SQLite ledger that records the state of every card across runs."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from amz_tango_card_scraper.utils.schemas import AmazonCard, LedgerEntry, TangoCard
+
+from .constants import (
+    AMAZON_REDEEMED,
+    CARD_STATES,
+    LEDGER_SCHEMA,
+    LEDGER_TIMEOUT,
+    SCRAPED,
+    TANGO_REDEEMED,
+)
+
+
+def _now() -> str:
+    """
+    Returns the current UTC time in ISO 8601 format, which sorts chronologically as text.
+
+    Returns:
+        The current time (e.g. "2024-01-31T12:00:00+00:00")
+    """
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class CardLedger:
+    """
+    A SQLite ledger of the cards keyed by Tango link and security code.
+
+    Every card goes through the states in CARD_STATES and is written to disk as soon as it reaches each of them, so
+    a run that dies halfway can be resumed and reruns skip the work that has already been done. States only move
+    forward. The ledger can be shared by threads.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        """Open the ledger, creating it if it does not exist."""
+        self._connection = sqlite3.connect(
+            file_path, timeout=LEDGER_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(LEDGER_SCHEMA)
+
+    def __enter__(self) -> CardLedger:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the ledger."""
+        self._connection.close()
+
+    def _record(self, tc: TangoCard, status: str, redeem_code: Optional[str] = None) -> None:
+        """
+        Records that a card has reached a state, unless it is already in that state or a later one.
+
+        Args:
+            tc: the tango card of the card
+            status: the state the card has reached
+            redeem_code: the code of the amazon gift card, None if it is not known yet
+        """
+        earlier_states = CARD_STATES[: CARD_STATES.index(status)]
+        placeholders = ", ".join("?" for _ in earlier_states) or "NULL"
+        now = _now()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO cards (tango_link, security_code, amazon_link, email_address, email_uid, status,"
+                " redeem_code, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (tango_link, security_code) DO UPDATE SET status = excluded.status,"
+                " redeem_code = COALESCE(excluded.redeem_code, cards.redeem_code), updated_at = excluded.updated_at"
+                f" WHERE cards.status IN ({placeholders})",
+                (
+                    tc.tango_link,
+                    tc.security_code,
+                    tc.amazon_link,
+                    tc.email_address,
+                    tc.email_uid,
+                    status,
+                    redeem_code,
+                    now,
+                    now,
+                    *earlier_states,
+                ),
+            )
+
+    def record_scraped(self, tango_cards: Iterable[TangoCard]) -> None:
+        """
+        Records that the tango cards have been scraped from Gmail.
+
+        Args:
+            tango_cards: the tango cards that were scraped
+        """
+        for tc in tango_cards:
+            self._record(tc, SCRAPED)
+
+    def record_tango_redeemed(self, amazon_card: AmazonCard) -> None:
+        """
+        Records that the tango card of an amazon gift card has been redeemed.
+
+        Args:
+            amazon_card: the amazon gift card obtained from the tango card
+        """
+        if amazon_card.tango_card:
+            self._record(amazon_card.tango_card, TANGO_REDEEMED, amazon_card.redeem_code)
+
+    def record_amazon_redeemed(self, amazon_card: AmazonCard) -> None:
+        """
+        Records that an amazon gift card has been redeemed.
+
+        Args:
+            amazon_card: the amazon gift card that was redeemed
+        """
+        if amazon_card.tango_card:
+            self._record(amazon_card.tango_card, AMAZON_REDEEMED, amazon_card.redeem_code)
+
+    def get_entry(self, tc: TangoCard) -> Optional[LedgerEntry]:
+        """
+        Returns the entry of a tango card.
+
+        Args:
+            tc: the tango card
+
+        Returns:
+            The entry of the tango card or None if it is not in the ledger
+        """
+        entries = self._query("WHERE tango_link = ? AND security_code = ?", (tc.tango_link, tc.security_code))
+        return entries[0] if entries else None
+
+    def get_entries(
+        self, status: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[LedgerEntry]:
+        """
+        Returns the entries in a state and/or first recorded in a period of time, oldest first.
+
+        Args:
+            status: the state of the entries (see CARD_STATES), None for any state
+            since: the min time the entries were first recorded at, None for no min
+            until: the max time the entries were first recorded at, None for no max
+
+        Returns:
+            The entries
+        """
+        conditions = []
+        params: List[str] = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since.astimezone(timezone.utc).isoformat(timespec="seconds"))
+        if until:
+            conditions.append("created_at <= ?")
+            params.append(until.astimezone(timezone.utc).isoformat(timespec="seconds"))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"{where} ORDER BY created_at", tuple(params))
+
+    def _query(self, clause: str, params: tuple) -> List[LedgerEntry]:
+        """
+        Runs a query over the cards table.
+
+        Args:
+            clause: the SQL that follows the FROM clause (e.g. "WHERE status = ?")
+            params: the parameters of the clause
+
+        Returns:
+            The entries returned by the query
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT security_code, tango_link, amazon_link, email_uid, email_address, status, redeem_code,"
+                f" created_at, updated_at FROM cards {clause}",
+                params,
+            ).fetchall()
+        return [
+            LedgerEntry(
+                tango_card=TangoCard(*row[:5]),
+                status=row[5],
+                redeem_code=row[6],
+                created_at=row[7],
+                updated_at=row[8],
+            )
+            for row in rows
+        ]
@@ -0,0 +1,27 @@
+"""Module containing constants for the card ledger."""
+
+# States of a card, in the order it goes through them
+SCRAPED = "scraped"
+TANGO_REDEEMED = "tango_redeemed"
+AMAZON_REDEEMED = "amazon_redeemed"
+CARD_STATES = (SCRAPED, TANGO_REDEEMED, AMAZON_REDEEMED)
+
+# Seconds to wait for a lock on the database before failing
+LEDGER_TIMEOUT = 30
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    tango_link TEXT NOT NULL,
+    security_code TEXT NOT NULL,
+    amazon_link TEXT NOT NULL,
+    email_address TEXT NOT NULL DEFAULT '',
+    email_uid TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    redeem_code TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (tango_link, security_code)
+);
+CREATE INDEX IF NOT EXISTS cards_status_updated_at ON cards (status, updated_at);
+CREATE INDEX IF NOT EXISTS cards_created_at ON cards (created_at);
+"""
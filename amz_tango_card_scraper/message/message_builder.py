@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from amz_tango_card_scraper.amazon_redeemer.helpers import get_marketplace
 
 if TYPE_CHECKING:
     from amz_tango_card_scraper.utils.schemas import AmazonCard, TangoCard
@@ -27,12 +29,16 @@ def build_tango_cards_message(tango_cards: List[TangoCard]) -> str:
     return title + body
 
 
-def build_amazon_cards_message(amazon_cards: List[AmazonCard], balance_results: Tuple[str, str] = ("", "")) -> str:
+def build_amazon_cards_message(
+    amazon_cards: List[AmazonCard], balance_results: Dict[str, Tuple[str, str]] = {}
+) -> str:
     """
     Builds a message that contains the amazon cards.
 
     Args:
         amazon_cards: the amazon cards that will be included in the message
+        balance_results: the marketplaces (e.g. "amazon.es") mapped to a tuple containing their previous balance and
+                         current balance
 
     Returns:
         A message that contains the amazon cards
@@ -44,13 +50,21 @@ def build_amazon_cards_message(amazon_cards: List[AmazonCard], balance_results:
     title = "******************\n" + "*  AMAZON CARDS  *\n" + "******************\n"
     body = "\n\n".join([str(i + 1) + " - " + str(tc) for i, tc in enumerate(amazon_cards)])
 
-    # Add the balance results to the body if they are not empty
-    if balance_results[0] and balance_results[1]:
-        body += f"\n\nPrevious balance: {balance_results[0]}\nCurrent balance: {balance_results[1]}"
-
-    # Check if any of the cards has not been redeemed
-    if any([not ac.redeem_status for ac in amazon_cards]):
-        # Add a message to the body that explains how to redeem the cards
-        body += f"\n\nYou can redeem the Amazon gift cards here: {amazon_cards[0].amazon_link}/gc/redeem"
+    # Add the balance results to the body if they are not empty, naming the marketplace if there are several
+    for marketplace, (prev_balance, balance) in balance_results.items():
+        if prev_balance and balance:
+            region = f" ({marketplace})" if len(balance_results) > 1 else ""
+            body += f"\n\nPrevious balance{region}: {prev_balance}\nCurrent balance{region}: {balance}"
+
+    # Add a message to the body that explains how to redeem the cards that have not been redeemed, with a single
+    # link per marketplace
+    amazon_links: Dict[str, str] = {}
+    for ac in amazon_cards:
+        if not ac.redeem_status:
+            amazon_links.setdefault(get_marketplace(ac.amazon_link), ac.amazon_link.rstrip("/"))
+    if amazon_links:
+        body += "\n\nYou can redeem the Amazon gift cards here: " + ", ".join(
+            [f"{amazon_link}/gc/redeem" for amazon_link in amazon_links.values()]
+        )
 
     return title + body
@@ -1,5 +1,8 @@
 """Module containing constants for the Tango scraper."""
 
+# Number of browsers that scrape Tango Cards at the same time
+DEFAULT_TANGO_WORKERS = 1
+
 SECURITY_CODE_ID = "t-input"
 
 REDEEM_BUTTON_ID = "btn-primary"
@@ -9,3 +12,44 @@ HEADS_UP_CSS_SELECTOR = ".v-snack__wrapper"
 HEADS_UP_ERROR_CLASS = "error"
 
 AMZ_GIFT_CARD_CODE_WRAPPER_CSS_SELECTOR = 'div[data-test-id="rewardCredentialValue-cardNumber"]'
+
+# Path, relative to the Tango link, where the redemption page posts the security code
+TANGO_HTTP_REDEEM_PATH = "redeem"
+# Field of the JSON payload that contains the security code
+TANGO_HTTP_SECURITY_CODE_FIELD = "securityCode"
+# Key of the gift card number in the JSON response (the same one as in AMZ_GIFT_CARD_CODE_WRAPPER_CSS_SELECTOR)
+TANGO_HTTP_CARD_NUMBER_KEY = "cardNumber"
+# Max amount of seconds to wait for every request of the HTTP redeemer
+TANGO_HTTP_TIMEOUT = 15
+# Number of connections kept open per host by the HTTP redeemer
+TANGO_HTTP_POOL_SIZE = 10
+
+# Elements shown instead of the redemption form when Tango asks for a CAPTCHA
+CAPTCHA_CSS_SELECTOR = 'iframe[src*="recaptcha"], iframe[src*="hcaptcha"], iframe[src*="challenges.cloudflare.com"]'
+
+# Reasons why scraping a Tango Card can fail
+FAILURE_TIMEOUT = "timeout"
+FAILURE_PROXY = "proxy"
+FAILURE_BROWSER = "browser"
+FAILURE_INVALID_CODE = "invalid_code"
+FAILURE_CAPTCHA = "captcha"
+# Failures that may not happen again, so the Tango Card is retried. The rest will fail every time.
+RETRYABLE_FAILURES = (FAILURE_TIMEOUT, FAILURE_PROXY, FAILURE_BROWSER)
+# Prefixes of the Chrome network errors caused by the proxy
+PROXY_ERROR_PREFIXES = ("net::ERR_PROXY_", "net::ERR_TUNNEL_", "net::ERR_SOCKS_", "net::ERR_NO_SUPPORTED_PROXIES")
+
+# States of a Tango Card while it is scraped
+CARD_PENDING = "pending"
+CARD_IN_PROGRESS = "in_progress"
+CARD_RETRY_SCHEDULED = "retry_scheduled"
+CARD_SUCCEEDED = "succeeded"
+CARD_FAILED = "failed"
+CARD_EXPIRED = "expired"
+
+# Max number of times a Tango Card is attempted
+TANGO_MAX_ATTEMPTS = 3
+# Seconds to wait before the first retry, doubled on every retry up to TANGO_RETRY_MAX_DELAY
+TANGO_RETRY_BASE_DELAY = 2
+TANGO_RETRY_MAX_DELAY = 30
+# Max amount of seconds to spend scraping Tango Cards, no attempt is started after it
+TANGO_DEADLINE = 600
@@ -0,0 +1,206 @@
+"""Module for redeeming Tango Cards over HTTP, without launching a browser."""
+
+import html
+import re
+from typing import Any, Callable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import AmazonCard, TangoCard
+
+from .constants import (
+    TANGO_HTTP_CARD_NUMBER_KEY,
+    TANGO_HTTP_POOL_SIZE,
+    TANGO_HTTP_REDEEM_PATH,
+    TANGO_HTTP_SECURITY_CODE_FIELD,
+    TANGO_HTTP_TIMEOUT,
+)
+
+logger = setup_logger(logger_name=__name__)
+
+CSRF_TOKEN_PATTERN = re.compile(
+    r"<meta\b[^>]*?\bname=[\"']csrf-token[\"'][^>]*?\bcontent=[\"']([^\"']*)", re.IGNORECASE
+)
+CARD_NUMBER_HTML_PATTERN = re.compile(
+    r"data-test-id=[\"']rewardCredentialValue-cardNumber[\"'][^>]*>\s*<span[^>]*>([^<]+)</span>", re.IGNORECASE
+)
+# Status codes returned when the security code is not valid
+INVALID_SECURITY_CODE_STATUS_CODES = (400, 422)
+# Error reported in the body of those responses when the security code is not valid (e.g. "invalid security code"),
+# the same status codes are also returned for malformed requests
+INVALID_SECURITY_CODE_PATTERN = re.compile(r"(invalid|incorrect|wrong)[\s_-]*(security[\s_-]*)?code", re.IGNORECASE)
+
+
+class TangoHTTPError(Exception):
+    """Exception raised when a Tango Card cannot be redeemed over HTTP and the browser should be used instead."""
+
+
+def create_tango_session(proxy: str = "") -> requests.Session:
+    """
+    Returns a session that reuses its connections to Tango across requests.
+
+    Args:
+        proxy: the proxy server to use (e.g. "http://proxy.example.com:8080"), empty to not use any proxy
+
+    Returns:
+        A configured session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=TANGO_HTTP_POOL_SIZE, pool_maxsize=TANGO_HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept": "application/json, text/html;q=0.9"})
+    if proxy:
+        session.proxies = {"http": proxy, "https": proxy}
+    return session
+
+
+def _build_redeem_url(tango_link: str) -> str:
+    """
+    Returns the URL where the security code of a Tango Card is posted.
+
+    Args:
+        tango_link: the link of the Tango Card (e.g. "https://sites.tangocard.com/redeem/xyz?t=1")
+
+    Returns:
+        The redeem URL (e.g. "https://sites.tangocard.com/redeem/xyz/redeem?t=1")
+    """
+    parts = urlsplit(tango_link)
+    return urlunsplit(parts._replace(path=f"{parts.path.rstrip('/')}/{TANGO_HTTP_REDEEM_PATH}"))
+
+
+def _find_card_number(data: Any) -> Optional[str]:
+    """
+    Recursively searches a JSON response for the gift card number.
+
+    Both {"cardNumber": "..."} and [{"type": "cardNumber", "value": "..."}] layouts are supported.
+
+    Args:
+        data: the decoded JSON response
+
+    Returns:
+        The gift card number or None if it was not found
+    """
+    if isinstance(data, dict):
+        value = data.get(TANGO_HTTP_CARD_NUMBER_KEY)
+        if isinstance(value, str) and value:
+            return value
+        if TANGO_HTTP_CARD_NUMBER_KEY in (data.get("type"), data.get("name"), data.get("label")):
+            if isinstance(data.get("value"), str) and data["value"]:
+                return data["value"]
+        children = list(data.values())
+    elif isinstance(data, list):
+        children = data
+    else:
+        return None
+
+    for child in children:
+        card_number = _find_card_number(child)
+        if card_number:
+            return card_number
+    return None
+
+
+def redeem_tango_card_http(
+    session: requests.Session, tc: TangoCard, timeout: float = TANGO_HTTP_TIMEOUT
+) -> Optional[AmazonCard]:
+    """
+    Redeems a Tango Card over HTTP, doing the same exchange as the redemption page (security code in, gift card
+    number out).
+
+    Args:
+        session: the session that will be used to send the requests
+        tc: the tango card that will be redeemed
+        timeout: the max amount of seconds to wait for every request
+
+    Raises:
+        TangoHTTPError: If the response is not the expected one, so the browser should be used instead
+
+    Returns:
+        The amazon gift card that was obtained or None if the security code was not valid
+    """
+    try:
+        # Load the redemption page to get its cookies and CSRF token
+        page = session.get(tc.tango_link, timeout=timeout)
+        page.raise_for_status()
+        headers = {}
+        csrf_match = CSRF_TOKEN_PATTERN.search(page.text)
+        if csrf_match:
+            headers["X-CSRF-Token"] = html.unescape(csrf_match.group(1))
+
+        # Send the security code
+        response = session.post(
+            _build_redeem_url(tc.tango_link),
+            json={TANGO_HTTP_SECURITY_CODE_FIELD: tc.security_code},
+            headers=headers,
+            timeout=timeout,
+        )
+    except RequestException as e:
+        raise TangoHTTPError(f"Request failed: {e}")
+
+    if response.status_code in INVALID_SECURITY_CODE_STATUS_CODES:
+        # The endpoint is inferred from the redemption page, so only trust an explicit invalid code error and leave
+        # the rest (e.g. a request the API no longer accepts) to the browser
+        if not INVALID_SECURITY_CODE_PATTERN.search(response.text):
+            raise TangoHTTPError(f"Unexpected status code {response.status_code}: {response.text[:200]}")
+        logger.error("Failed to redeem Tango Card")
+        return None
+    if not response.ok:
+        raise TangoHTTPError(f"Unexpected status code {response.status_code}")
+
+    # Get the gift card number from the JSON response or from the rendered page
+    card_number = None
+    if "json" in response.headers.get("Content-Type", ""):
+        try:
+            card_number = _find_card_number(response.json())
+        except ValueError:
+            pass
+    else:
+        html_match = CARD_NUMBER_HTML_PATTERN.search(response.text)
+        card_number = html.unescape(html_match.group(1)).strip() if html_match else None
+    if not card_number:
+        raise TangoHTTPError("Gift card number not found in the response")
+
+    logger.info("Tango Card successfully redeemed")
+    return AmazonCard(redeem_code=card_number, redeem_status=False, amazon_link=tc.amazon_link, tango_card=tc)
+
+
+def scrap_amazon_gift_cards_http(
+    tango_cards: List[TangoCard],
+    session: Optional[requests.Session] = None,
+    on_amazon_card: Optional[Callable[[AmazonCard], None]] = None,
+) -> Tuple[List[AmazonCard], List[TangoCard]]:
+    """
+    Scrapes the amazon gift cards from the tango cards over HTTP.
+
+    Args:
+        tango_cards: the tango cards that will be scraped
+        session: the session that will be used to send the requests, a new one is created if None
+        on_amazon_card: function called with every amazon gift card as soon as it is scraped
+
+    Returns:
+        A tuple containing the amazon gift cards that were scraped and the tango cards that could not be
+        redeemed over HTTP and should be scraped with the browser
+    """
+    session = session or create_tango_session()
+    amazon_cards: List[AmazonCard] = []
+    failed_tango_cards: List[TangoCard] = []
+    for tc in tango_cards:
+        logger.info("Redeeming Tango Card over HTTP...")
+        logger.debug(f"Tango Card URL: {tc.tango_link}")
+        try:
+            amazon_card = redeem_tango_card_http(session, tc)
+        except TangoHTTPError as e:
+            logger.warning(f"Could not redeem Tango Card over HTTP ({e}), falling back to the browser...")
+            failed_tango_cards.append(tc)
+            continue
+        if amazon_card:
+            amazon_cards.append(amazon_card)
+            if on_amazon_card:
+                on_amazon_card(amazon_card)
+
+    return (amazon_cards, failed_tango_cards)
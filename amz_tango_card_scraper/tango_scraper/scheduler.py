@@ -0,0 +1,256 @@
+"""Module for scheduling the attempts to scrape Tango Cards, retrying the ones that fail with backoff."""
+
+import heapq
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from amz_tango_card_scraper.utils.logger import setup_logger
+from amz_tango_card_scraper.utils.schemas import AmazonCard, TangoCard
+
+from .constants import (
+    CARD_EXPIRED,
+    CARD_FAILED,
+    CARD_IN_PROGRESS,
+    CARD_PENDING,
+    CARD_RETRY_SCHEDULED,
+    CARD_SUCCEEDED,
+    RETRYABLE_FAILURES,
+    TANGO_DEADLINE,
+    TANGO_MAX_ATTEMPTS,
+    TANGO_RETRY_BASE_DELAY,
+    TANGO_RETRY_MAX_DELAY,
+)
+
+logger = setup_logger(logger_name=__name__)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Returns the seconds to wait before retrying, with exponential backoff and jitter.
+
+    Half of the delay is fixed and the other half is random ("equal jitter"), so retries of cards that failed at
+    the same time are spread out but never happen right away.
+
+    Args:
+        attempt: the number of the attempt that failed, starting at 1
+        base_delay: the delay after the first attempt, before jitter
+        max_delay: the max delay, before jitter
+
+    Returns:
+        The seconds to wait
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CardScheduler:
+    """
+    Hands out the tango cards to scrape and keeps track of the state of each one.
+
+    Every card starts pending and is handed out by next_card. It then succeeds, fails for good or, if the failure
+    is retryable and it has attempts left, is scheduled to be retried after a backoff delay. Cards waiting for a
+    retry do not block the rest, which are handed out in the meantime. No card is handed out after the deadline,
+    and the ones left at that point expire. The scheduler can be shared by threads.
+
+    A streaming scheduler starts empty or partially filled and gets the rest of the cards with add as they are
+    scraped, until close is called. Its deadline only starts counting when it is closed, so the time spent waiting
+    for new cards does not count against the ones already added.
+    """
+
+    def __init__(
+        self,
+        tango_cards: List[TangoCard],
+        max_attempts: int = TANGO_MAX_ATTEMPTS,
+        deadline: float = TANGO_DEADLINE,
+        base_delay: float = TANGO_RETRY_BASE_DELAY,
+        max_delay: float = TANGO_RETRY_MAX_DELAY,
+        streaming: bool = False,
+    ) -> None:
+        """
+        Args:
+            tango_cards: the tango cards to scrape
+            max_attempts: the max number of times every card is attempted
+            deadline: the max amount of seconds to spend, counted from now (or from close if streaming)
+            base_delay: the seconds to wait before the first retry
+            max_delay: the max seconds to wait before a retry
+            streaming: whether more cards will be added with add until close is called
+        """
+        self.tango_cards = list(tango_cards)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.closed = not streaming
+        self.deadline_at = time.monotonic() + deadline if self.closed else float("inf")
+        self.states = [CARD_PENDING] * len(tango_cards)
+        self.attempts = [0] * len(tango_cards)
+        self.failures: Dict[int, str] = {}
+        self.results: List[Optional[AmazonCard]] = [None] * len(tango_cards)
+        # Cards ready to be handed out, as (time they are ready at, index)
+        self._schedule = [(0.0, i) for i in range(len(tango_cards))]
+        self._condition = threading.Condition()
+
+    def add(self, tango_card: TangoCard) -> int:
+        """
+        Adds a card to a streaming scheduler, ready to be attempted right away.
+
+        Args:
+            tango_card: the tango card to scrape
+
+        Raises:
+            ValueError: If the scheduler has already been closed
+
+        Returns:
+            The index of the card
+        """
+        with self._condition:
+            if self.closed:
+                raise ValueError("Cannot add Tango Cards to a closed scheduler")
+            i = len(self.tango_cards)
+            self.tango_cards.append(tango_card)
+            self.states.append(CARD_PENDING)
+            self.attempts.append(0)
+            self.results.append(None)
+            heapq.heappush(self._schedule, (0.0, i))
+            self._condition.notify_all()
+            return i
+
+    def close(self) -> None:
+        """Records that no more cards will be added and starts counting the deadline."""
+        with self._condition:
+            if not self.closed:
+                self.closed = True
+                self.deadline_at = time.monotonic() + self.deadline
+                self._condition.notify_all()
+
+    def next_card(self, block: bool = True) -> Optional[Tuple[int, TangoCard]]:
+        """
+        Waits until a card is ready to be attempted and returns it.
+
+        Args:
+            block: whether to wait for a card to be ready, otherwise None is returned if no card is ready now
+
+        Returns:
+            A tuple containing the index of the card and the card, or None if there are no cards left to attempt
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now >= self.deadline_at:
+                    self._expire()
+                    return None
+                if self._schedule and self._schedule[0][0] <= now:
+                    _, i = heapq.heappop(self._schedule)
+                    self.states[i] = CARD_IN_PROGRESS
+                    self.attempts[i] += 1
+                    return (i, self.tango_cards[i])
+                if not block:
+                    return None
+                if self._schedule:
+                    # Wake up earlier if another thread schedules a card that is ready sooner
+                    self._condition.wait(min(self._schedule[0][0], self.deadline_at) - now)
+                elif CARD_IN_PROGRESS in self.states or not self.closed:
+                    # Cards being attempted by other threads may still be scheduled for a retry, and more cards may
+                    # still be added
+                    self._condition.wait(None if self.deadline_at == float("inf") else self.deadline_at - now)
+                else:
+                    return None
+
+    def succeed(self, i: int, amazon_card: AmazonCard) -> None:
+        """
+        Records that a card has been scraped.
+
+        Args:
+            i: the index of the card
+            amazon_card: the amazon gift card that was scraped
+        """
+        with self._condition:
+            self.states[i] = CARD_SUCCEEDED
+            self.results[i] = amazon_card
+            self._condition.notify_all()
+
+    def fail(self, i: int, failure: str) -> None:
+        """
+        Records that an attempt of a card failed, scheduling a retry if the failure is retryable.
+
+        Args:
+            i: the index of the card
+            failure: the reason of the failure (see RETRYABLE_FAILURES)
+        """
+        with self._condition:
+            # Ignore failures of cards that are not being attempted (e.g. raised after the card succeeded)
+            if self.states[i] != CARD_IN_PROGRESS:
+                return
+            self.failures[i] = failure
+            if failure in RETRYABLE_FAILURES and self.attempts[i] < self.max_attempts:
+                delay = backoff_delay(self.attempts[i], self.base_delay, self.max_delay)
+                if time.monotonic() + delay >= self.deadline_at:
+                    # The retry could not be attempted before the deadline, which may have expired the rest already
+                    logger.error(f"Deadline reached, Tango Card {self.tango_cards[i].tango_link} could not be retried")
+                    self.states[i] = CARD_EXPIRED
+                    self._condition.notify_all()
+                    return
+                logger.warning(
+                    f"Attempt {self.attempts[i]} of Tango Card {self.tango_cards[i].tango_link} failed ({failure}), "
+                    f"retrying in {delay:.1f} seconds..."
+                )
+                self.states[i] = CARD_RETRY_SCHEDULED
+                heapq.heappush(self._schedule, (time.monotonic() + delay, i))
+            else:
+                logger.error(f"Giving up on Tango Card {self.tango_cards[i].tango_link} ({failure})")
+                self.states[i] = CARD_FAILED
+            self._condition.notify_all()
+
+    def expire_remaining(self, reason: str) -> None:
+        """
+        Expires the cards that are still waiting to be attempted, e.g. when no browser is left to attempt them.
+
+        Args:
+            reason: why the cards could not be scraped, for the log (e.g. "no browser could be started")
+        """
+        with self._condition:
+            self._expire(reason)
+            self._condition.notify_all()
+
+    def _expire(self, reason: str = "the deadline was reached") -> None:
+        """
+        Expires the cards that are still waiting to be attempted.
+
+        Args:
+            reason: why the cards could not be scraped, for the log
+        """
+        expired = [i for _, i in self._schedule]
+        self._schedule.clear()
+        for i in expired:
+            self.states[i] = CARD_EXPIRED
+        if expired:
+            logger.error(f"{len(expired)} Tango Card(s) could not be scraped as {reason}")
+
+    def get_amazon_cards(self) -> List[AmazonCard]:
+        """
+        Returns the amazon gift cards scraped so far.
+
+        Returns:
+            The amazon gift cards, in the same order as the tango cards
+        """
+        with self._condition:
+            return [amazon_card for amazon_card in self.results if amazon_card]
+
+    def summary(self) -> str:
+        """
+        Returns a summary of the states of the cards (e.g. "succeeded: 3, failed (timeout): 1").
+
+        Returns:
+            The summary
+        """
+        with self._condition:
+            counts = Counter(
+                f"{state} ({self.failures[i]})"
+                if state in (CARD_FAILED, CARD_EXPIRED) and i in self.failures
+                else state
+                for i, state in enumerate(self.states)
+            )
+        return ", ".join(f"{state}: {count}" for state, count in counts.items())
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional
 
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
+from urllib3.exceptions import HTTPError
 
+from amz_tango_card_scraper.browser.blocking import drain_performance_log
+from amz_tango_card_scraper.browser.chrome import quit_chrome_browser
 from amz_tango_card_scraper.browser.extra_actions import (
     wait_for_element_until_clickable,
     wait_for_element_until_visible,
@@ -11,83 +17,464 @@ from amz_tango_card_scraper.browser.extra_actions import (
 from amz_tango_card_scraper.utils.logger import setup_logger
 from amz_tango_card_scraper.utils.schemas import AmazonCard
 
+from .constants import (
+    DEFAULT_TANGO_WORKERS,
+    FAILURE_BROWSER,
+    FAILURE_CAPTCHA,
+    FAILURE_INVALID_CODE,
+    FAILURE_PROXY,
+    FAILURE_TIMEOUT,
+    PROXY_ERROR_PREFIXES,
+    TANGO_DEADLINE,
+    TANGO_MAX_ATTEMPTS,
+    TANGO_RETRY_BASE_DELAY,
+)
+from .scheduler import CardScheduler
+
 if TYPE_CHECKING:
     from selenium.webdriver.chrome.webdriver import WebDriver
 
+    from amz_tango_card_scraper.browser.proxy_manager import ProxyManager
     from amz_tango_card_scraper.utils.schemas import TangoCard
 
 logger = setup_logger(logger_name=__name__)
 
 
-def scrap_amazon_gift_cards(browser: WebDriver, tango_cards: List[TangoCard]) -> List[AmazonCard]:
+class CaptchaRequiredError(WebDriverException):
+    """Exception raised when Tango asks for a CAPTCHA instead of showing the redemption form."""
+
+
+def classify_failure(e: WebDriverException) -> str:
     """
-    Scrapes the amazon gift cards from the tango cards.
+    Classifies the error raised while scraping a tango card.
 
     Args:
-        browser: the browser that will be used to scrape the amazon gift cards
-        tango_cards: the tango cards that will be scraped
+        e: the error
 
     Returns:
-        The amazon gift cards that were scraped
+        The reason of the failure (FAILURE_CAPTCHA, FAILURE_TIMEOUT, FAILURE_PROXY or FAILURE_BROWSER)
+    """
+    if isinstance(e, CaptchaRequiredError):
+        return FAILURE_CAPTCHA
+    if isinstance(e, TimeoutException):
+        return FAILURE_TIMEOUT
+    if any(prefix in str(e.msg) for prefix in PROXY_ERROR_PREFIXES):
+        return FAILURE_PROXY
+    return FAILURE_BROWSER
+
+
+def scrap_amazon_gift_card(browser: WebDriver, tc: TangoCard) -> Optional[AmazonCard]:
+    """
+    Scrapes the amazon gift card from a tango card.
+
+    Args:
+        browser: the browser that will be used to scrape the amazon gift card
+        tc: the tango card that will be scraped
+
+    Raises:
+        CaptchaRequiredError: If Tango asks for a CAPTCHA
+        WebDriverException: If the browser fails or the page does not load in time
+
+    Returns:
+        The amazon gift card that was scraped or None if the security code was not valid
     """
     from .constants import (
         AMZ_GIFT_CARD_CODE_WRAPPER_CSS_SELECTOR,
+        CAPTCHA_CSS_SELECTOR,
         HEADS_UP_CSS_SELECTOR,
         HEADS_UP_ERROR_CLASS,
         REDEEM_BUTTON_ID,
         SECURITY_CODE_ID,
     )
 
-    amazon_cards: List[AmazonCard] = []
-    for tc in tango_cards:
-        # Go to the Tango card URL
-        logger.info("Going to Tango Card URL...")
-        logger.debug(f"Tango Card URL: {tc.tango_link}")
-        browser.get(tc.tango_link)
+    # Go to the Tango card URL
+    logger.info("Going to Tango Card URL...")
+    logger.debug(f"Tango Card URL: {tc.tango_link}")
+    browser.get(tc.tango_link)
 
-        # Send security code to security code field (wait until it is visible)
-        logger.debug(f"Security code: {tc.security_code}")
+    # Send security code to security code field (wait until it is visible)
+    logger.debug(f"Security code: {tc.security_code}")
+    try:
         security_code_field = wait_for_element_until_clickable(
             browser,
             (By.ID, SECURITY_CODE_ID),
         )
-        logger.info("Writing security code to security code field...")
-        security_code_field.send_keys(tc.security_code)  # type: ignore
+    except TimeoutException:
+        if browser.find_elements(By.CSS_SELECTOR, CAPTCHA_CSS_SELECTOR):  # type: ignore
+            raise CaptchaRequiredError("Tango asked for a CAPTCHA")
+        raise
+    logger.info("Writing security code to security code field...")
+    security_code_field.send_keys(tc.security_code)  # type: ignore
+
+    # Click redeem button
+    redeem_button = browser.find_element(By.ID, REDEEM_BUTTON_ID)  # type: ignore
+    logger.info("Clicking redeem button...")
+    redeem_button.click()
 
-        # Click redeem button
-        redeem_button = browser.find_element(By.ID, REDEEM_BUTTON_ID)  # type: ignore
-        logger.info("Clicking redeem button...")
-        redeem_button.click()
+    # Check whether the security code was valid or not
+    logger.info("Checking whether the security code was valid or not...")
+    heads_up = wait_for_element_until_visible(
+        browser,
+        (By.CSS_SELECTOR, HEADS_UP_CSS_SELECTOR),
+    )
+    # Check whether the heads up message is a success or an error
+    if HEADS_UP_ERROR_CLASS in heads_up.get_attribute("class"):  # type: ignore
+        # Invalid security code
+        logger.error("Failed to redeem Tango Card")
+        return None
 
-        # Check whether the security code was valid or not
-        logger.info("Checking whether the security code was valid or not...")
-        heads_up = wait_for_element_until_visible(
+    # Valid security code
+    logger.info("Tango Card successfully redeemed")
+
+    # Wait for Amazon gift card code to be visible and get it
+    redeem_code = (
+        wait_for_element_until_visible(  # type: ignore
             browser,
-            (By.CSS_SELECTOR, HEADS_UP_CSS_SELECTOR),
+            (
+                By.CSS_SELECTOR,
+                AMZ_GIFT_CARD_CODE_WRAPPER_CSS_SELECTOR,
+            ),
         )
-        # Check whether the heads up message is a success or an error
-        if HEADS_UP_ERROR_CLASS in heads_up.get_attribute("class"):  # type: ignore
-            # Invalid security code
-            logger.error("Failed to redeem Tango Card")
+        .find_element(By.XPATH, "./span")
+        .text
+    )  # type: ignore
+
+    return AmazonCard(redeem_code=redeem_code, redeem_status=False, amazon_link=tc.amazon_link, tango_card=tc)
+
+
+def scrap_amazon_gift_cards(
+    browser: WebDriver,
+    tango_cards: List[TangoCard],
+    on_amazon_card: Optional[Callable[[AmazonCard], None]] = None,
+    max_attempts: int = TANGO_MAX_ATTEMPTS,
+    deadline: float = TANGO_DEADLINE,
+    retry_delay: float = TANGO_RETRY_BASE_DELAY,
+    browser_factory: Optional[Callable[[], WebDriver]] = None,
+    on_browser_replaced: Optional[Callable[[Optional[WebDriver]], None]] = None,
+) -> List[AmazonCard]:
+    """
+    Scrapes the amazon gift cards from the tango cards.
+
+    Tango cards that fail for a reason that may not happen again (e.g. a timeout) are retried with backoff, while
+    the rest of the tango cards are scraped in the meantime. If the browser crashes, it is quit and replaced with
+    a new one from browser_factory, or the tango cards left expire if there is no factory or it fails.
+
+    Args:
+        browser: the browser that will be used to scrape the amazon gift cards
+        tango_cards: the tango cards that will be scraped
+        on_amazon_card: function called with every amazon gift card as soon as it is scraped
+        max_attempts: the max number of times every tango card is attempted
+        deadline: the max amount of seconds to spend, no tango card is attempted after it
+        retry_delay: the seconds to wait before the first retry of a tango card, doubled on every retry
+        browser_factory: function that returns a new browser to replace the browser if it crashes
+        on_browser_replaced: function called with the browser that replaces the given one, or None if it was quit
+                             and could not be replaced. The new browser belongs to the caller from then on.
+
+    Returns:
+        The amazon gift cards that were scraped, in the same order as the tango cards
+    """
+    scheduler = CardScheduler(tango_cards, max_attempts=max_attempts, deadline=deadline, base_delay=retry_delay)
+    # Browsers started here are only quit here if they are not handed over to the caller
+    owned = False
+    while True:
+        next_card = scheduler.next_card()
+        if next_card is None:
+            break
+        i, tc = next_card
+        if _attempt_tango_card(scheduler, browser, i, tc, on_amazon_card) or _is_browser_alive(browser):
             continue
 
-        # Valid security code
-        logger.info("Tango Card successfully redeemed")
-
-        # Wait for Amazon gift card code to be visible and get it
-        redeem_code = (
-            wait_for_element_until_visible(  # type: ignore
-                browser,
-                (
-                    By.CSS_SELECTOR,
-                    AMZ_GIFT_CARD_CODE_WRAPPER_CSS_SELECTOR,
-                ),
-            )
-            .find_element(By.XPATH, "./span")
-            .text
-        )  # type: ignore
-
-        # Add Amazon gift card to list
-        amazon_cards.append(AmazonCard(redeem_code=redeem_code, redeem_status=False, amazon_link=tc.amazon_link))
-
-    return amazon_cards
+        # Replace the browser if it has crashed, retrying on a dead driver would only use up the attempts
+        logger.warning("Browser crashed, replacing it...")
+        _quit_browser(browser)
+        try:
+            if browser_factory is None:
+                raise WebDriverException("no browser factory to replace it")
+            logger.info("Loading Selenium browser...")
+            browser = browser_factory()
+        except Exception as e:
+            logger.error(f"Could not replace the browser: {e}")
+            if on_browser_replaced:
+                on_browser_replaced(None)
+            scheduler.expire_remaining("no browser could be started")
+            break
+        owned = on_browser_replaced is None
+        if on_browser_replaced:
+            on_browser_replaced(browser)
+
+    if owned:
+        _quit_browser(browser)
+    logger.info(f"Tango Cards: {scheduler.summary()}")
+    return scheduler.get_amazon_cards()
+
+
+def iter_amazon_gift_cards(
+    browser_factory: Callable[[], WebDriver],
+    tango_cards: Iterable[TangoCard],
+    on_amazon_card: Optional[Callable[[AmazonCard], None]] = None,
+    max_attempts: int = TANGO_MAX_ATTEMPTS,
+    deadline: float = TANGO_DEADLINE,
+    retry_delay: float = TANGO_RETRY_BASE_DELAY,
+) -> Iterator[AmazonCard]:
+    """
+    Scrapes the amazon gift cards from the tango cards as they arrive, yielding every one as soon as it is scraped.
+
+    This is the streaming variant of scrap_amazon_gift_cards: the tango cards can come from a generator that is
+    still scraping them (e.g. iter_tango_cards) and every one is attempted as soon as it arrives. Retries are
+    scheduled the same way and attempted between arrivals, and the deadline only starts counting once the last
+    tango card has arrived. The browser is started when the first tango card arrives, replaced if it crashes and
+    quit when the generator finishes.
+
+    Args:
+        browser_factory: function that returns a new browser (e.g. a partial of get_chrome_browser)
+        tango_cards: the tango cards that will be scraped
+        on_amazon_card: function called with every amazon gift card as soon as it is scraped
+        max_attempts: the max number of times every tango card is attempted
+        deadline: the max amount of seconds to spend after the last tango card arrives
+        retry_delay: the seconds to wait before the first retry of a tango card, doubled on every retry
+
+    Returns:
+        An iterator over the amazon gift cards, in the order they are scraped
+    """
+    scheduler = CardScheduler([], max_attempts=max_attempts, deadline=deadline, base_delay=retry_delay, streaming=True)
+    browser: Optional[WebDriver] = None
+
+    def attempt_ready_cards(block: bool) -> Iterator[AmazonCard]:
+        nonlocal browser
+        while True:
+            next_card = scheduler.next_card(block=block)
+            if next_card is None:
+                return
+            i, tc = next_card
+
+            try:
+                if browser is None:
+                    logger.info("Loading Selenium browser...")
+                    browser = browser_factory()
+                attempt_ok = _attempt_tango_card(scheduler, browser, i, tc, on_amazon_card)
+            except Exception:
+                scheduler.fail(i, FAILURE_BROWSER)
+                raise
+
+            # Replace the browser if it has crashed
+            if not attempt_ok and not _is_browser_alive(browser):
+                logger.warning("Browser crashed, replacing it...")
+                _quit_browser(browser)
+                browser = None
+            amazon_card = scheduler.results[i]
+            if amazon_card:
+                yield amazon_card
+
+    try:
+        for tc in tango_cards:
+            scheduler.add(tc)
+            yield from attempt_ready_cards(block=False)
+        scheduler.close()
+        yield from attempt_ready_cards(block=True)
+    finally:
+        if browser is not None:
+            _quit_browser(browser)
+
+    logger.info(f"Tango Cards: {scheduler.summary()}")
+
+
+def _attempt_tango_card(
+    scheduler: CardScheduler,
+    browser: WebDriver,
+    i: int,
+    tc: TangoCard,
+    on_amazon_card: Optional[Callable[[AmazonCard], None]] = None,
+) -> bool:
+    """
+    Attempts to scrape a tango card handed out by a scheduler and records the outcome in it.
+
+    Args:
+        scheduler: the scheduler that handed out the tango card
+        browser: the browser that will be used to scrape the amazon gift card
+        i: the index of the tango card in the scheduler
+        tc: the tango card
+        on_amazon_card: function called with the amazon gift card if it is scraped
+
+    Returns:
+        False if the attempt failed because of the browser or the page, True otherwise
+    """
+    try:
+        amazon_card = scrap_amazon_gift_card(browser, tc)
+    except WebDriverException as e:
+        logger.error(f"Failed to scrape Tango Card {tc.tango_link}: {e.msg}")
+        scheduler.fail(i, classify_failure(e))
+        return False
+    except (HTTPError, OSError) as e:
+        # The connection to chromedriver is lost (e.g. it crashed) before the browser can answer
+        logger.error(f"Failed to scrape Tango Card {tc.tango_link}: {e!r}")
+        scheduler.fail(i, FAILURE_BROWSER)
+        return False
+    finally:
+        # Keep the performance log of long sessions from growing with every card
+        drain_performance_log(browser)
+
+    if amazon_card is None:
+        scheduler.fail(i, FAILURE_INVALID_CODE)
+        return True
+    scheduler.succeed(i, amazon_card)
+    if on_amazon_card:
+        on_amazon_card(amazon_card)
+    return True
+
+
+def _is_browser_alive(browser: WebDriver) -> bool:
+    """
+    Checks whether a browser still responds to commands.
+
+    Args:
+        browser: the browser that will be checked
+
+    Returns:
+        True if the browser responds, False otherwise
+    """
+    try:
+        browser.current_url
+        return True
+    except (WebDriverException, HTTPError, OSError):
+        return False
+
+
+def _quit_browser(browser: WebDriver) -> None:
+    """
+    Quits a browser, ignoring the errors of browsers that have already crashed.
+
+    Args:
+        browser: the browser that will be quit
+    """
+    try:
+        quit_chrome_browser(browser)
+    except (WebDriverException, HTTPError, OSError):
+        pass
+
+
+def scrap_amazon_gift_cards_in_parallel(
+    browser_factory: Callable[..., WebDriver],
+    tango_cards: List[TangoCard],
+    workers: int = DEFAULT_TANGO_WORKERS,
+    browser: Optional[WebDriver] = None,
+    on_amazon_card: Optional[Callable[[AmazonCard], None]] = None,
+    max_attempts: int = TANGO_MAX_ATTEMPTS,
+    deadline: float = TANGO_DEADLINE,
+    retry_delay: float = TANGO_RETRY_BASE_DELAY,
+    proxy_manager: Optional[ProxyManager] = None,
+    on_browser_replaced: Optional[Callable[[Optional[WebDriver]], None]] = None,
+) -> List[AmazonCard]:
+    """
+    Scrapes the amazon gift cards from the tango cards with a pool of browsers.
+
+    Every worker owns a browser and pulls tango cards from a shared scheduler until none are left. Failures are
+    isolated per worker: a tango card whose page fails is retried with backoff (see scrap_amazon_gift_cards), a
+    browser that crashes is replaced, and a worker whose browser cannot be started stops while the rest keep
+    pulling tango cards. With a proxy manager, every worker keeps its own proxy and its browser is restarted on
+    the next-best proxy once its proxy fails too many times in a row.
+
+    Args:
+        browser_factory: function that returns a new browser (e.g. a partial of get_chrome_browser). With a proxy
+                         manager it is called with the proxy keyword argument set to the proxy of the worker,
+                         which must be used as is. A worker stops if the manager has no proxy left for it.
+        tango_cards: the tango cards that will be scraped
+        workers: the max number of browsers running at the same time
+        browser: an already started browser that will be used by the first worker instead of starting a new one.
+                 It is not quit when the workers finish, unless it is replaced (see on_browser_replaced).
+        on_amazon_card: function called with every amazon gift card as soon as it is scraped, from the thread of
+                        the worker that scraped it
+        max_attempts: the max number of times every tango card is attempted
+        deadline: the max amount of seconds to spend, no tango card is attempted after it
+        retry_delay: the seconds to wait before the first retry of a tango card, doubled on every retry
+        proxy_manager: the manager that assigns a proxy to every worker, None to let browser_factory pick it.
+                       The already started browser is assumed to use the best proxy, the one of the first worker.
+        on_browser_replaced: function called, from the thread of the first worker, with the browser that replaces
+                             the already started one when it crashes or its proxy is retired, or None if it was
+                             quit and not replaced yet. The browser the first worker ends up with belongs to the
+                             caller and is not quit when the workers finish. Without it, the already started
+                             browser is left running when it is replaced.
+
+    Returns:
+        The amazon gift cards that were scraped, in the same order as the tango cards
+    """
+    scheduler = CardScheduler(tango_cards, max_attempts=max_attempts, deadline=deadline, base_delay=retry_delay)
+
+    def work(worker_id: int, worker_browser: Optional[WebDriver]) -> None:
+        owned = worker_browser is None
+        # The first worker hands its browser over to the caller, so the caller never reuses a dead or retired one
+        hand_over = worker_browser is not None and on_browser_replaced is not None
+
+        def release_browser(old_browser: WebDriver) -> None:
+            # Quit the browser that is being replaced and tell the caller it is gone if it was handed over
+            if owned or hand_over:
+                _quit_browser(old_browser)
+            if hand_over:
+                on_browser_replaced(None)  # type: ignore
+
+        try:
+            while True:
+                next_card = scheduler.next_card()
+                if next_card is None:
+                    break
+                i, tc = next_card
+
+                try:
+                    if worker_browser is None:
+                        logger.info(f"Loading Selenium browser for worker {worker_id}...")
+                        if proxy_manager:
+                            proxy = proxy_manager.assign(worker_id)
+                            if not proxy:
+                                # Never scrape from the host IP while the proxies are being tracked
+                                raise ValueError(f"No working proxies left for worker {worker_id}")
+                            worker_browser = browser_factory(proxy=proxy)
+                        else:
+                            worker_browser = browser_factory()
+                        owned = not hand_over
+                        if hand_over:
+                            on_browser_replaced(worker_browser)  # type: ignore
+                    start = time.perf_counter()
+                    attempt_ok = _attempt_tango_card(scheduler, worker_browser, i, tc, on_amazon_card)
+                except Exception:
+                    # Hand the tango card back so the other workers do not wait for it
+                    scheduler.fail(i, FAILURE_BROWSER)
+                    raise
+
+                if proxy_manager:
+                    if attempt_ok:
+                        proxy_manager.record_success(worker_id, time.perf_counter() - start)
+                    else:
+                        proxy_manager.record_failure(worker_id)
+                    # Restart the browser on the next-best proxy if its proxy was retired
+                    if proxy_manager.should_rotate(worker_id):
+                        logger.warning(f"Restarting the browser of worker {worker_id} on another proxy...")
+                        release_browser(worker_browser)
+                        worker_browser = None
+                        continue
+
+                if not attempt_ok:
+                    # Replace the browser if it has crashed
+                    if not _is_browser_alive(worker_browser):
+                        logger.warning(f"Browser of worker {worker_id} crashed, replacing it...")
+                        release_browser(worker_browser)
+                        worker_browser = None
+        except Exception as e:
+            logger.error(f"Worker {worker_id} stopped: {e}")
+        finally:
+            if worker_browser is not None and owned:
+                _quit_browser(worker_browser)
+
+    workers = max(min(workers, len(tango_cards)), 1)
+    if proxy_manager:
+        # Assign the proxies in order of the workers, so the first one gets the best proxy like the started browser
+        for worker_id in range(workers):
+            proxy_manager.assign(worker_id)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for worker_id in range(workers):
+            executor.submit(work, worker_id, browser if worker_id == 0 else None)
+    # The workers only stop with cards left if none of them could keep a browser running
+    scheduler.expire_remaining("no browser could be started")
+
+    logger.info(f"Tango Cards: {scheduler.summary()}")
+    if proxy_manager:
+        logger.info(f"Proxies: {proxy_manager.summary()}")
+    return scheduler.get_amazon_cards()
@@ -0,0 +1,157 @@
+"""Module containing concurrency helpers."""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Deque, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Max number of items a stage of a stream can be ahead of the next one
+STREAM_QUEUE_SIZE = 16
+# Seconds between checks of whether the consumer of a stream has stopped, while the producer waits for room
+STREAM_STOP_CHECK_INTERVAL = 0.1
+
+
+class StreamStopped(Exception):
+    """Exception raised in the producer of a stream when its consumer stops iterating."""
+
+
+class _StreamEnd:
+    """Marker put in the queue of a stream when its producer finishes, with the error it raised if any."""
+
+    def __init__(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+
+
+def bounded_ordered_map(
+    executor: Executor, fn: Callable[[T], R], items: Iterable[T], max_in_flight: int
+) -> Iterator[R]:
+    """
+    Lazily map a function over some items with an executor, keeping the order of the items.
+
+    Unlike :meth:`concurrent.futures.Executor.map`, items are consumed as results are yielded, so no more than
+    max_in_flight items are submitted to the executor at the same time and the memory used stays bounded even if
+    the items are produced faster than they are processed.
+
+    Args:
+        executor: Executor that will run the function.
+        fn: Function to map.
+        items: Items to map the function over.
+        max_in_flight: Max number of items submitted to the executor at the same time.
+
+    Returns:
+        An iterator over the results, in the same order as the items.
+    """
+    pending: Deque[Future[R]] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Do not leave work behind if the caller stops iterating or an item fails
+        for future in pending:
+            future.cancel()
+
+
+def stream(produce: Callable[[Callable[[T], None]], None], maxsize: int = STREAM_QUEUE_SIZE) -> Iterator[T]:
+    """
+    Run a producer in a background thread and iterate over the items it emits as soon as they are emitted.
+
+    The producer and the consumer are connected by a bounded queue, so the producer blocks once it is maxsize items
+    ahead and the memory used stays bounded however many items it produces. An error raised by the producer is
+    raised by the iterator after the items emitted before it. If the consumer stops iterating, the next call to emit
+    raises :class:`StreamStopped` in the producer so it can unwind.
+
+    Args:
+        produce: Function that produces the items, called with the function that emits every item downstream.
+        maxsize: Max number of items emitted and not consumed yet.
+
+    Returns:
+        An iterator over the items, in the order they are emitted.
+    """
+    items: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item: object) -> None:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=STREAM_STOP_CHECK_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise StreamStopped()
+
+    def run() -> None:
+        try:
+            produce(put)
+            put(_StreamEnd())
+        except StreamStopped:
+            pass
+        except BaseException as e:
+            try:
+                put(_StreamEnd(e))
+            except StreamStopped:
+                pass
+
+    # Start producing right away, not when the consumer asks for the first item
+    threading.Thread(target=run, daemon=True).start()
+    return _consume_stream(items, stopped)
+
+
+def _consume_stream(items: "queue.Queue[object]", stopped: threading.Event) -> Iterator[T]:
+    """
+    Iterate over the items of a stream until its producer finishes (see :func:`stream`).
+
+    Args:
+        items: Queue the producer puts the items in.
+        stopped: Event set when the consumer stops iterating.
+
+    Returns:
+        An iterator over the items, in the order they are emitted.
+    """
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, _StreamEnd):
+                if item.error:
+                    raise item.error
+                return
+            yield item  # type: ignore
+    finally:
+        # Let the producer know nobody is consuming its items anymore
+        stopped.set()
+
+
+def prefetch(items: Iterable[T], maxsize: int = STREAM_QUEUE_SIZE) -> Iterator[T]:
+    """
+    Iterate over some items that are produced in a background thread, at most maxsize items ahead of the consumer.
+
+    This turns a generator into a stage of a pipeline (see :func:`stream`): it keeps producing while the consumer
+    is busy with the previous items.
+
+    Args:
+        items: Items to iterate over (e.g. a generator that scrapes them).
+        maxsize: Max number of items produced and not consumed yet.
+
+    Returns:
+        An iterator over the items, in the same order.
+    """
+
+    def produce(emit: Callable[[T], None]) -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                emit(item)
+        finally:
+            # Close generators right away if the consumer stopped, so they release their resources (e.g. connections)
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    return stream(produce, maxsize)
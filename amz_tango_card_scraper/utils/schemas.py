@@ -1,6 +1,6 @@
 """Module that contains the schemas used in the project."""
 
-from typing import Dict, List, NamedTuple, Union
+from typing import Dict, List, NamedTuple, Optional, Union
 
 
 class ConfigFile(NamedTuple):
@@ -10,6 +10,9 @@ class ConfigFile(NamedTuple):
     gmail: the Gmail section of the config file
         - email: the email address of the Gmail account
         - app_password: the app password of the Gmail account
+    gmail_accounts: the Gmail Accounts section of the config file with a list of
+        additional Gmail accounts, each one with an email and an app_password (optional, the parser always sets it
+        to a list)
     amazon: the Amazon section of the config file
         - email: the email address of the Amazon account
         - password: the password of the Amazon account
@@ -20,11 +23,41 @@ class ConfigFile(NamedTuple):
         - no_images: whether to disable images in the browser
         - headless: whether to run the browser in headless mode
         - virtual_display: whether to use a virtual display
+        - driver_cache: whether to cache the patched chromedriver per Chrome version, True by default (optional)
+        - prelaunch_browser: whether to start the browser as soon as the first Tango Card is found (optional)
         - trash: whether to trash the emails after scraping
+        - mark_seen: whether to mark the emails as read after scraping (optional)
+        - processed_label: Gmail label to add to the emails after scraping (optional)
         - redeem_amz: whether to redeem the amazon gift cards
+        - persistent_profile: whether to keep the Amazon session in a Chrome profile to skip the sign in (optional)
+        - incremental: whether to only search the emails that arrived after the last run (optional)
+        - server_filter: whether to let the server discard the emails without Tango Cards (optional)
+        - extractor: engine used to extract the Tango Cards from the emails, "regex" or "soup" (optional)
+        - parse_workers: number of processes that parse the emails on large backfills (optional)
+        - watch: whether to keep watching the inbox for new Tango Cards after the first scrape (optional)
+        - max_imap_connections: max number of Gmail accounts scraped at the same time (optional)
+        - account_timeout: max amount of seconds to scrape a single Gmail account (optional)
+        - wait_strategy: how the browser waits for elements, "poll" or "observer" (optional)
+        - wait_poll_frequency: seconds between checks of the elements the browser waits for (optional)
+        - block_resources: resource types blocked by the browser (e.g. font, media, analytics) (optional)
+        - block_urls: URL patterns blocked by the browser (e.g. *tracking.example.com*) (optional)
+        - ledger: whether to record the state of every card in a SQLite ledger to skip finished work (optional)
+        - tango_http: whether to redeem the Tango Cards over HTTP before falling back to the browser (optional)
+        - tango_workers: number of browsers that scrape Tango Cards at the same time (optional)
+        - tango_max_attempts: max number of times a Tango Card is attempted (optional)
+        - tango_deadline: max amount of seconds to spend scraping Tango Cards with the browser (optional)
+        - mailbox_source: path to an exported mailbox (mbox file, Maildir tree or .eml directory) to scrape
+            instead of Gmail (optional)
+        - streaming: whether to redeem every card as soon as it is scraped instead of waiting for the whole inbox
+            (optional)
     proxies:
         - enable: whether to enable proxies for the browser
         - list: a list of proxies to use
+        - probe_url: the URL requested through every proxy to check whether it works (optional)
+        - probe_deadline: the max amount of seconds to wait for all the proxy probes (optional)
+        - cache_ttl: the seconds during which the results of the proxy probes are reused (optional)
+        - error_threshold: the number of attempts in a row that can fail through a proxy before it is retired
+            (optional)
     telegram: the Telegram section of the config file
         - enable: whether to enable Telegram notifications
         - token: the token of the Telegram bot
@@ -37,6 +70,7 @@ class ConfigFile(NamedTuple):
     script: Dict[str, bool]
     proxies: Union[Dict[str, str], Dict[str, bool]]
     telegram: Dict[str, str]
+    gmail_accounts: Optional[List[Dict[str, str]]] = None
 
 
 class TangoCard(NamedTuple):
@@ -46,11 +80,15 @@ class TangoCard(NamedTuple):
     security_code: the security code of the tango card
     tango_link: the link that will be used to redeem the tango card
     amazon_link: the link that will be used to redeem the amazon gift card
+    email_uid: the UID of the email that contained the tango card, empty if unknown
+    email_address: the Gmail account that received the email, empty if unknown
     """
 
     security_code: str
     tango_link: str
     amazon_link: str
+    email_uid: str = ""
+    email_address: str = ""
 
     def __str__(self) -> str:
         """
@@ -65,6 +103,174 @@ class TangoCard(NamedTuple):
         )
 
 
+class FetchedMessage(NamedTuple):
+    """
+    A schema that represents an email fetched from an IMAP server.
+
+    uid: the UID of the email in the selected mailbox
+    flags: the flags of the email (e.g. "\\Seen \\Flagged")
+    raw: the raw RFC822 content of the email, or the raw content of a single part if a section is set
+    section: the section number of the part contained in raw, None if raw contains the whole email
+    encoding: the content transfer encoding of the part (e.g. "base64")
+    charset: the charset of the part (e.g. "utf-8")
+    """
+
+    uid: bytes
+    flags: str
+    raw: bytes
+    section: Optional[str] = None
+    encoding: str = "7bit"
+    charset: str = "utf-8"
+
+
+class TextPart(NamedTuple):
+    """
+    A schema that represents the location of the text part of an email.
+
+    section: the section number of the part (e.g. "1.2")
+    encoding: the content transfer encoding of the part (e.g. "base64")
+    charset: the charset of the part (e.g. "utf-8")
+    """
+
+    section: str
+    encoding: str
+    charset: str
+
+
+class MailboxCheckpoint(NamedTuple):
+    """
+    A schema that represents the point up to which a mailbox has already been scraped.
+
+    uidvalidity: the UIDVALIDITY of the mailbox when it was scraped (UIDs are only valid while it does not change)
+    last_uid: the highest UID that has already been scraped
+    """
+
+    uidvalidity: int
+    last_uid: int
+
+
+class LedgerEntry(NamedTuple):
+    """
+    A schema that represents the state of a card in the card ledger.
+
+    tango_card: the tango card of the card
+    status: the state of the card ("scraped", "tango_redeemed" or "amazon_redeemed")
+    redeem_code: the code of the amazon gift card, None if the tango card has not been redeemed yet
+    created_at: the time the card was first recorded at, in ISO 8601 format (UTC)
+    updated_at: the time the card reached its current state at, in ISO 8601 format (UTC)
+    """
+
+    tango_card: TangoCard
+    status: str
+    redeem_code: Optional[str]
+    created_at: str
+    updated_at: str
+
+
+class BlockingReport(NamedTuple):
+    """
+    A schema that represents the requests blocked by a browser.
+
+    blocked_requests: the number of requests that were blocked
+    blocked_bytes: the estimated number of bytes that were not downloaded thanks to the blocked requests
+    loaded_requests: the number of requests that were loaded
+    loaded_bytes: the number of bytes that were downloaded by the loaded requests
+    """
+
+    blocked_requests: int
+    blocked_bytes: int
+    loaded_requests: int
+    loaded_bytes: int
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the blocking report.
+
+        Returns:
+            A string representation of the blocking report
+        """
+        return (
+            f"Blocked {self.blocked_requests} request(s) (~{self.blocked_bytes / 1024:.1f} KiB saved),"
+            f" loaded {self.loaded_requests} request(s) ({self.loaded_bytes / 1024:.1f} KiB)"
+        )
+
+
+class CachedDriver(NamedTuple):
+    """
+    A schema that represents a patched chromedriver binary stored in the driver cache.
+
+    driver_path: the path of the patched chromedriver
+    chrome_path: the path of the Chrome binary the driver belongs to
+    version_main: the major version of Chrome
+    cache_hit: whether the driver was found in the cache without probing the version of Chrome
+    """
+
+    driver_path: str
+    chrome_path: str
+    version_main: int
+    cache_hit: bool
+
+
+class StartupTiming(NamedTuple):
+    """
+    A schema that represents the time it took to start a browser.
+
+    driver_seconds: the seconds spent resolving the chromedriver binary
+    launch_seconds: the seconds spent launching Chrome and connecting the driver to it
+    driver_cache: "warm" if the driver came from the cache without probing Chrome, "cold" if it was cached by this
+        launch, or "off" if undetected_chromedriver resolved it by itself
+    """
+
+    driver_seconds: float
+    launch_seconds: float
+    driver_cache: str
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the startup timing.
+
+        Returns:
+            A string representation of the startup timing
+        """
+        return (
+            f"Browser started in {self.driver_seconds + self.launch_seconds:.2f}s"
+            f" (driver: {self.driver_seconds:.2f}s, {self.driver_cache} cache; launch: {self.launch_seconds:.2f}s)"
+        )
+
+
+class ProxyStats(NamedTuple):
+    """
+    A schema that represents how a proxy has performed during a run.
+
+    proxy: the proxy server (e.g. "http://proxy.example.com:8080")
+    successes: the number of attempts through the proxy that worked
+    failures: the number of attempts through the proxy that failed
+    consecutive_failures: the number of attempts that failed since the last one that worked
+    total_seconds: the seconds spent by the attempts that worked, to compute their average latency
+    retired: whether the proxy crossed the error threshold and is no longer assigned to workers
+    """
+
+    proxy: str
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    total_seconds: float = 0.0
+    retired: bool = False
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the proxy stats.
+
+        Returns:
+            A string representation of the proxy stats
+        """
+        latency = f"{self.total_seconds / self.successes:.2f}s" if self.successes else "n/a"
+        return (
+            f"{self.proxy}: {self.successes} ok, {self.failures} failed, avg {latency}"
+            f"{' (retired)' if self.retired else ''}"
+        )
+
+
 class AmazonCard:
     """
     A schema that represents a mutable amazon gift card.
@@ -72,13 +278,17 @@ class AmazonCard:
     redeem_code: the code of the amazon gift card
     redeem_status: the status of the amazon gift card (True if redeemed, False otherwise)
     amazon_link: the link that will be used to redeem the amazon gift card
+    tango_card: the tango card the amazon gift card was obtained from, None if unknown
     """
 
-    def __init__(self, redeem_code: str, redeem_status: bool, amazon_link: str) -> None:
+    def __init__(
+        self, redeem_code: str, redeem_status: bool, amazon_link: str, tango_card: Optional[TangoCard] = None
+    ) -> None:
         """Initialize the amazon gift card."""
         self.redeem_code = redeem_code
         self.redeem_status = redeem_status
         self.amazon_link = amazon_link
+        self.tango_card = tango_card
 
     def __str__(self) -> str:
         """
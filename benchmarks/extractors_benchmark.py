@@ -0,0 +1,88 @@
+"""
+Benchmark of the engines that extract Tango Cards from the body of an email.
+
+Builds a corpus of emails shaped like the Microsoft Rewards ones (styles, nested layout tables, four credential
+rows and a long footer), checks that every engine extracts the same Tango Cards and reports the cost per email.
+
+Usage: python benchmarks/extractors_benchmark.py [number of emails]
+"""
+
+import random
+import string
+import sys
+import time
+from typing import List
+
+from amz_tango_card_scraper.gmail_scraper.extractors import EXTRACTOR_ENGINES
+
+
+def build_email_body(rng: random.Random) -> str:
+    """
+    Build the body of an email that contains a Tango Card.
+
+    Args:
+        rng: Random number generator used to vary the content of the email.
+
+    Returns:
+        Body of the email.
+    """
+    code = "".join(rng.choices(string.ascii_uppercase + string.digits, k=16))
+    token = "".join(rng.choices(string.ascii_letters + string.digits, k=32))
+    domain = rng.choice(["com", "es", "co.uk", "de"])
+
+    style = "".join(f".c{i} {{ font-family: Segoe UI, Arial; padding: {i}px; color: #{i:06x}; }}\n" for i in range(80))
+    header = "".join(
+        f'<tr><td class="c{i}" style="padding:0 24px"><table role="presentation" width="100%"><tr>'
+        f'<td><img src="https://rewards.example.com/img/{i}.png" alt="" width="32"></td>'
+        f"<td>Reward update {i} &amp; more</td></tr></table></td></tr>\n"
+        for i in range(30)
+    )
+    credentials = [
+        ("Reward", "Amazon.{} gift card".format(domain)),
+        ("Amount", "${}.00".format(rng.choice([5, 10, 25]))),
+        ("Order", str(rng.randint(10**8, 10**9))),
+        (
+            f'<a href="https://sites.tangocard.com/redeem?token={token}&amp;utm=rewards" target="_blank">Redeem</a>',
+            code,
+        ),
+    ]
+    rows = "".join(
+        '<tr><td><div class="tango-credential-key" style="font-weight:600">{}</div></td>'
+        '<td><div class="credential tango-credential-value">{}</div></td></tr>\n'.format(key, value)
+        for key, value in credentials
+    )
+    footer = "".join(
+        f'<p class="c{i % 80}">Terms {i}: <a href="https://rewards.example.com/terms/{i}">details</a></p>\n'
+        for i in range(60)
+    )
+
+    return (
+        f"<html><head><style>{style}</style></head><body><table>{header}</table>"
+        f"<p>Your tango reward is ready</p><table>{rows}</table>"
+        f'<p>Redeem it at <a href="http://www.amazon.{domain}/gc/redeem">http://www.amazon.{domain}/gc/redeem</a></p>'
+        f"{footer}</body></html>"
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(0)
+    corpus: List[str] = [build_email_body(rng) for _ in range(count)]
+    size = sum(len(body) for body in corpus) / count
+    print(f"Corpus: {count} emails, {size / 1024:.1f} KiB per email")
+
+    results = {}
+    for name, engine in EXTRACTOR_ENGINES.items():
+        start = time.perf_counter()
+        results[name] = [engine(body) for body in corpus]
+        elapsed = time.perf_counter() - start
+        print(f"{name:>6}: {elapsed / count * 1e6:10.1f} us per email ({elapsed:.3f} s total)")
+
+    reference = results.pop("soup")
+    for name, cards in results.items():
+        mismatches = sum(card != expected for card, expected in zip(cards, reference))
+        print(f"{name:>6}: {mismatches} mismatches with the BeautifulSoup engine")
+
+
+if __name__ == "__main__":
+    main()
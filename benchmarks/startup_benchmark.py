@@ -0,0 +1,42 @@
+"""
+Benchmark of the browser startup with a cold and a warm chromedriver cache.
+
+Launches the browser once with an empty cache, which probes Chrome and downloads and patches its driver, and then
+several times with the cache warm, reporting how long resolving the driver and launching Chrome took in each case.
+Requires Chrome and network access, like the scraper itself.
+
+Usage: python benchmarks/startup_benchmark.py [number of warm launches]
+"""
+
+import statistics
+import sys
+import tempfile
+
+from amz_tango_card_scraper.browser.chrome import (
+    get_chrome_browser,
+    quit_chrome_browser,
+    startup_timings,
+)
+
+
+def main() -> None:
+    warm_launches = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for _ in range(warm_launches + 1):
+            quit_chrome_browser(get_chrome_browser(headless=True, driver_cache_dir=cache_dir))
+
+    cold, warm = startup_timings[0], startup_timings[1:]
+    print(f"{'launch':<8}{'driver (s)':>12}{'launch (s)':>12}{'total (s)':>12}")
+    print(
+        f"{'cold':<8}{cold.driver_seconds:>12.3f}{cold.launch_seconds:>12.3f}"
+        f"{cold.driver_seconds + cold.launch_seconds:>12.3f}"
+    )
+    driver_seconds = statistics.median(timing.driver_seconds for timing in warm)
+    launch_seconds = statistics.median(timing.launch_seconds for timing in warm)
+    print(f"{'warm':<8}{driver_seconds:>12.3f}{launch_seconds:>12.3f}{driver_seconds + launch_seconds:>12.3f}")
+    print(f"(warm values are the median of {len(warm)} launches)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the strategies used to wait for elements in the browser.
+
+Serves a local page that inserts an element after a random delay and reports, for every wait strategy, how long
+the wait returns after the element has been inserted. Requires Chrome, like the scraper itself.
+
+Usage: python benchmarks/waits_benchmark.py [number of waits per strategy]
+"""
+
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from selenium.webdriver.common.by import By
+
+from amz_tango_card_scraper.browser.chrome import get_chrome_browser
+from amz_tango_card_scraper.browser.extra_actions import (
+    WAIT_STRATEGIES,
+    wait_for_element_until_visible,
+)
+
+PAGE = b"""<html><body><div id="app"></div><script>
+function insertLater(delayMs) {
+    const old = document.getElementById("target");
+    if (old) old.remove();
+    setTimeout(() => {
+        const el = document.createElement("div");
+        el.id = "target";
+        el.textContent = "gift card";
+        document.getElementById("app").appendChild(el);
+    }, delayMs);
+}
+</script></body></html>"""
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    browser = get_chrome_browser(headless=True)
+    try:
+        browser.get(f"http://127.0.0.1:{server.server_address[1]}/")
+        rng = random.Random(0)
+        delays = [rng.uniform(0.05, 0.5) for _ in range(count)]
+
+        results = {}
+        for strategy in WAIT_STRATEGIES:
+            latencies: List[float] = []
+            for delay in delays:
+                start = time.perf_counter()
+                browser.execute_script("insertLater(arguments[0])", int(delay * 1000))
+                wait_for_element_until_visible(browser, (By.ID, "target"), strategy=strategy)
+                latencies.append(time.perf_counter() - start - delay)
+            results[strategy] = statistics.mean(latencies)
+            print(
+                f"{strategy:>8}: {results[strategy] * 1000:7.1f} ms mean latency after insertion,"
+                f" {max(latencies) * 1000:7.1f} ms max ({count} waits)"
+            )
+
+        print(f"Saved per wait by the observer: {(results['poll'] - results['observer']) * 1000:.1f} ms")
+    finally:
+        browser.quit()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Module for testing the amazon_redeemer module."""
+import threading
+
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from amz_tango_card_scraper.amazon_redeemer import amazon_redeemer
+from amz_tango_card_scraper.amazon_redeemer.helpers import get_marketplace
+from amz_tango_card_scraper.utils.schemas import AmazonCard
+
+
+class _FakeBrowser:
+    def __init__(self, marketplace: str) -> None:
+        self.marketplace = marketplace
+        self.quit_calls = 0
+
+    def get_log(self, log_type: str) -> list:
+        raise WebDriverException(f"log type '{log_type}' not found")
+
+    def quit(self) -> None:
+        self.quit_calls += 1
+
+
+def test_get_marketplace():
+    # Test case 1: links of the same region map to the same marketplace
+    assert get_marketplace("https://www.amazon.es") == "amazon.es"
+    assert get_marketplace("https://www.Amazon.es/gc/redeem") == "amazon.es"
+    assert get_marketplace("www.amazon.co.uk") == "amazon.co.uk"
+
+
+def test_redeem_amazon_gift_cards_by_marketplace(monkeypatch):
+    browsers = []
+
+    def browser_factory(marketplace):
+        browsers.append(_FakeBrowser(marketplace))
+        return browsers[-1]
+
+    # Only passed once the two marketplaces that work are being redeemed at the same time
+    both_redeeming = threading.Barrier(2, timeout=5)
+
+    def fake_redeem_amazon_gift_cards(browser, amazon_cards, email, password, otp, on_redeemed, reuse_session):
+        if browser.marketplace == "amazon.de":
+            raise ValueError("Malformed OTP code or CAPTCHA required")
+        both_redeeming.wait()
+        for ac in amazon_cards:
+            ac.redeem_status = True
+            on_redeemed(ac)
+        return (f"{browser.marketplace} 0", f"{browser.marketplace} {len(amazon_cards)}")
+
+    monkeypatch.setattr(amazon_redeemer, "redeem_amazon_gift_cards", fake_redeem_amazon_gift_cards)
+    links = ["https://www.amazon.com", "https://www.amazon.es", "https://www.amazon.com/", "https://www.amazon.de"]
+    amazon_cards = [
+        AmazonCard(redeem_code=str(i), redeem_status=False, amazon_link=link) for i, link in enumerate(links)
+    ]
+    main_browser = _FakeBrowser("amazon.com")
+    redeemed = []
+    balance_results = amazon_redeemer.redeem_amazon_gift_cards_by_marketplace(
+        browser_factory, amazon_cards, "", "", "", on_redeemed=redeemed.append, browser=main_browser
+    )
+
+    # Test case 1: every marketplace is redeemed at the same time and reports its own balance
+    assert balance_results == {
+        "amazon.com": ("amazon.com 0", "amazon.com 2"),
+        "amazon.es": ("amazon.es 0", "amazon.es 1"),
+        "amazon.de": ("", ""),
+    }
+    assert sorted(ac.redeem_code for ac in redeemed) == ["0", "1", "2"]
+
+    # Test case 2: the given browser is used by the first marketplace and only the new browsers are quit
+    assert [browser.marketplace for browser in browsers] == ["amazon.es", "amazon.de"]
+    assert main_browser.quit_calls == 0 and all(browser.quit_calls == 1 for browser in browsers)
+
+
+class _FakeElement:
+    def __init__(self, text: str = "", hidden: bool = False) -> None:
+        self.text = text
+        self.classes = {"a-hidden"} if hidden else set()
+        self.value = ""
+        self.on_click = None
+
+    def is_displayed(self) -> bool:
+        return "a-hidden" not in self.classes
+
+    def is_enabled(self) -> bool:
+        return True
+
+    def clear(self) -> None:
+        self.value = ""
+
+    def send_keys(self, keys: str) -> None:
+        self.value += keys
+
+    def click(self) -> None:
+        self.on_click()
+
+
+class _FakeRedeemPage:
+    """Stand-in for a browser on the Amazon redeem page, which applies the codes without reloading."""
+
+    def __init__(self) -> None:
+        self.current_url = "about:blank"
+        self.page_loads = 0
+        self.balance = 0
+        self.elements = {}
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+        self.page_loads += 1
+        self.elements = {
+            "gc-current-balance": _FakeElement(f"${self.balance}"),
+            "gc-redemption-input": _FakeElement(),
+            "gc-redemption-apply-button": _FakeElement(),
+            "alertRedemptionSuccess": _FakeElement(hidden=True),
+            "alertRedemptionError": _FakeElement(hidden=True),
+        }
+        self.elements["gc-redemption-apply-button"].on_click = self._apply
+
+    def _apply(self) -> None:
+        code = self.elements["gc-redemption-input"].value
+        if code.startswith("GOOD-"):
+            self.balance += int(code.split("-")[1])
+            self.elements["gc-current-balance"].text = f"${self.balance}"
+            self.elements["alertRedemptionSuccess"].classes.discard("a-hidden")
+        else:
+            self.elements["alertRedemptionError"].classes.discard("a-hidden")
+
+    def find_element(self, by: str, value: str) -> _FakeElement:
+        if value not in self.elements:
+            raise NoSuchElementException(value)
+        return self.elements[value]
+
+    def find_elements(self, by: str, value: str) -> list:
+        return [self.elements[value]] if value in self.elements else []
+
+    def execute_script(self, script: str, element: _FakeElement, class_name: str) -> None:
+        element.classes.add(class_name)
+
+
+def test_redeem_amazon_gift_cards(monkeypatch):
+    monkeypatch.setattr(amazon_redeemer, "sign_in_to_amazon", lambda *args, **kwargs: None)
+    codes = ["GOOD-10", "GOOD-10", "BAD-1", "GOOD-5"]
+    amazon_cards = [
+        AmazonCard(redeem_code=code, redeem_status=False, amazon_link="https://www.amazon.com") for code in codes
+    ]
+    browser = _FakeRedeemPage()
+    balance_results = amazon_redeemer.redeem_amazon_gift_cards(browser, amazon_cards, "", "", "")
+
+    # Test case 1: the result of every code is read from the same page, even when the previous alert is the same
+    assert [ac.redeem_status for ac in amazon_cards] == [True, True, False, True]
+    assert balance_results == ("$0", "$25")
+
+    # Test case 2: the redeem page is loaded once for the whole batch
+    assert browser.page_loads == 1
+
+
+def test_redeem_amazon_gift_card_in_page_late_balance():
+    browser = _FakeRedeemPage()
+    browser.get("https://www.amazon.com/gc/redeem")
+    # The balance is only rendered once the code has been applied
+    browser.elements["gc-current-balance"].text = ""
+    apply = browser.elements["gc-redemption-apply-button"].on_click
+
+    def apply_and_render_balance():
+        apply()
+        browser.elements["gc-current-balance"].text = "$0.00"
+
+    browser.elements["gc-redemption-apply-button"].on_click = apply_and_render_balance
+    amazon_card = AmazonCard(redeem_code="BAD-1", redeem_status=False, amazon_link="https://www.amazon.com")
+    amazon_redeemer.redeem_amazon_gift_card_in_page(browser, amazon_card)
+
+    # Test case 1: a balance rendered late is not mistaken for a redeemed code
+    assert amazon_card.redeem_status is False
+
+
+def test_redeem_amazon_gift_cards_from_stream(monkeypatch):
+    browsers = []
+
+    def browser_factory(marketplace):
+        browsers.append(_FakeBrowser(marketplace))
+        return browsers[-1]
+
+    started = []
+    redeemed_before_arrival = []
+
+    def fake_start_session(browser, amazon_link, email, password, otp, reuse_session):
+        started.append(browser.marketplace)
+        if browser.marketplace == "amazon.de":
+            raise ValueError("Malformed OTP code or CAPTCHA required")
+        return f"{browser.marketplace} 0"
+
+    def fake_redeem_in_session(browser, amazon_card, on_redeemed=None):
+        amazon_card.redeem_status = True
+        on_redeemed(amazon_card)
+
+    monkeypatch.setattr(amazon_redeemer, "_start_session", fake_start_session)
+    monkeypatch.setattr(amazon_redeemer, "_redeem_in_session", fake_redeem_in_session)
+    monkeypatch.setattr(amazon_redeemer, "read_amazon_balance", lambda browser: f"{browser.marketplace} 1")
+    links = ["https://www.amazon.com", "https://www.amazon.de", "https://www.amazon.es", "https://www.amazon.de"]
+    redeemed = []
+
+    def amazon_cards():
+        for i, link in enumerate(links):
+            redeemed_before_arrival.append(len(redeemed))
+            yield AmazonCard(redeem_code=str(i), redeem_status=False, amazon_link=link)
+
+    main_browser = _FakeBrowser("amazon.com")
+    balance_results = amazon_redeemer.redeem_amazon_gift_cards_from_stream(
+        browser_factory, amazon_cards(), "", "", "", on_redeemed=redeemed.append, browser=main_browser
+    )
+
+    # Test case 1: every amazon gift card is redeemed as soon as it arrives
+    assert [ac.redeem_code for ac in redeemed] == ["0", "2"]
+    assert redeemed_before_arrival == [0, 1, 1, 2]
+
+    # Test case 2: a marketplace whose session fails is skipped from then on without stopping the rest
+    assert started == ["amazon.com", "amazon.de", "amazon.es"]
+    assert balance_results == {
+        "amazon.com": ("amazon.com 0", "amazon.com 1"),
+        "amazon.de": ("", ""),
+        "amazon.es": ("amazon.es 0", "amazon.es 1"),
+    }
+
+    # Test case 3: the given browser is used by the first marketplace and only the new browsers are quit
+    assert [browser.marketplace for browser in browsers] == ["amazon.de", "amazon.es"]
+    assert main_browser.quit_calls == 0 and all(browser.quit_calls == 1 for browser in browsers)
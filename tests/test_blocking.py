@@ -0,0 +1,78 @@
+"""Module for testing blocking.py"""
+import json
+
+import pytest
+
+from amz_tango_card_scraper.browser.blocking import (
+    build_blocked_url_patterns,
+    drain_performance_log,
+    enable_request_blocking,
+    get_blocking_report,
+    parse_performance_log,
+)
+
+
+def _entry(method: str, **params) -> dict:
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+def test_build_blocked_url_patterns():
+    # Test case 1: resource types are mapped to URL patterns and duplicates are removed
+    patterns = build_blocked_url_patterns(["font"], ["*.woff*", "*tracking.example.com*"])
+    assert "*.woff2*" in patterns
+    assert patterns.count("*.woff*") == 1
+    assert patterns[-1] == "*tracking.example.com*"
+
+    # Test case 2: unknown resource type
+    with pytest.raises(ValueError):
+        build_blocked_url_patterns(["scripts"])
+
+
+def test_parse_performance_log():
+    entries = [
+        _entry("Network.requestWillBeSent", requestId="1", type="Document"),
+        _entry("Network.loadingFinished", requestId="1", encodedDataLength=1000),
+        _entry("Network.requestWillBeSent", requestId="2", type="Font"),
+        _entry("Network.loadingFinished", requestId="2", encodedDataLength=3000),
+        _entry("Network.loadingFailed", requestId="3", type="Font", blockedReason="inspector"),
+        _entry("Network.loadingFailed", requestId="4", type="Media", blockedReason="inspector"),
+        _entry("Network.loadingFailed", requestId="5", type="XHR", errorText="net::ERR_FAILED"),
+        {"message": "not json"},
+    ]
+    report = parse_performance_log(entries)
+
+    # Test case 1: blocked requests are counted and their size is estimated with loaded requests
+    assert report.blocked_requests == 2
+    assert report.blocked_bytes == 3000 + 2000
+    assert (report.loaded_requests, report.loaded_bytes) == (2, 4000)
+
+
+class _FakeLoggingBrowser:
+    def __init__(self) -> None:
+        self.log = []
+
+    def execute_cdp_cmd(self, cmd: str, params: dict) -> None:
+        pass
+
+    def get_log(self, log_type: str) -> list:
+        entries, self.log = self.log, []
+        return entries
+
+
+def test_drain_performance_log():
+    browser = _FakeLoggingBrowser()
+    enable_request_blocking(browser, ["*.woff*"])
+    browser.log = [
+        _entry("Network.requestWillBeSent", requestId="1", type="Font"),
+        _entry("Network.loadingFinished", requestId="1", encodedDataLength=3000),
+    ]
+    drain_performance_log(browser)
+
+    # Test case 1: drained entries are removed from the browser and kept in its report
+    assert browser.log == []
+    browser.log = [_entry("Network.loadingFailed", requestId="2", type="Font", blockedReason="inspector")]
+    report = get_blocking_report(browser)
+    assert (report.blocked_requests, report.loaded_requests, report.loaded_bytes) == (1, 1, 3000)
+
+    # Test case 2: the next report only counts the requests sent since the last one
+    assert get_blocking_report(browser).loaded_requests == 0
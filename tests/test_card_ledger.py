@@ -0,0 +1,44 @@
+"""Module for testing card_ledger.py"""
+from datetime import datetime, timedelta, timezone
+
+from amz_tango_card_scraper.ledger.card_ledger import CardLedger
+from amz_tango_card_scraper.ledger.constants import (
+    AMAZON_REDEEMED,
+    SCRAPED,
+    TANGO_REDEEMED,
+)
+from amz_tango_card_scraper.utils.schemas import AmazonCard, TangoCard
+
+
+def test_card_ledger(tmp_path):
+    file_path = str(tmp_path / "cards.sqlite3")
+    tc1 = TangoCard("111", "https://sites.tangocard.com/redeem/1", "amazon.com", "10", "me@gmail.com")
+    tc2 = TangoCard("222", "https://sites.tangocard.com/redeem/2", "amazon.com", "11", "me@gmail.com")
+    ac1 = AmazonCard(redeem_code="AAAA-BBBBBB-CCCC", redeem_status=False, amazon_link="amazon.com", tango_card=tc1)
+
+    with CardLedger(file_path) as ledger:
+        # Test case 1: scraped cards are recorded once
+        ledger.record_scraped([tc1, tc2])
+        ledger.record_scraped([tc1])
+        assert [entry.status for entry in ledger.get_entries()] == [SCRAPED, SCRAPED]
+
+        # Test case 2: states move forward through every stage
+        ledger.record_tango_redeemed(ac1)
+        ledger.record_amazon_redeemed(ac1)
+        entry = ledger.get_entry(tc1)
+        assert entry and entry.status == AMAZON_REDEEMED and entry.redeem_code == "AAAA-BBBBBB-CCCC"
+        assert entry.tango_card == tc1
+
+        # Test case 3: states never move backwards
+        ledger.record_scraped([tc1])
+        ledger.record_tango_redeemed(ac1)
+        assert ledger.get_entry(tc1).status == AMAZON_REDEEMED  # type: ignore
+
+    # Test case 4: the ledger is persisted and can be queried by status and date
+    with CardLedger(file_path) as ledger:
+        assert [entry.tango_card for entry in ledger.get_entries(status=SCRAPED)] == [tc2]
+        assert ledger.get_entries(status=TANGO_REDEEMED) == []
+        now = datetime.now(timezone.utc)
+        assert len(ledger.get_entries(since=now - timedelta(minutes=1))) == 2
+        assert ledger.get_entries(until=now - timedelta(minutes=1)) == []
+        assert ledger.get_entry(TangoCard("333", "https://sites.tangocard.com/redeem/3", "amazon.com")) is None
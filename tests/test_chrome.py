@@ -0,0 +1,71 @@
+"""Module for testing chrome.py"""
+import os
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from amz_tango_card_scraper.browser import options
+from amz_tango_card_scraper.browser.chrome import get_profile_dir
+from amz_tango_card_scraper.browser.launcher import BrowserLauncher
+
+
+def test_get_profile_dir(tmp_path):
+    # Test case 1: the profile directory is created and is the same for the same account
+    profile_dir = get_profile_dir(str(tmp_path), "Me@Gmail.com")
+    assert os.path.isdir(profile_dir)
+    assert profile_dir == get_profile_dir(str(tmp_path), "me@gmail.com")
+    assert os.path.basename(profile_dir).startswith("me_gmail.com-")
+
+    # Test case 2: accounts whose names are sanitized the same way get different profiles
+    assert get_profile_dir(str(tmp_path), "me+1@gmail.com") != get_profile_dir(str(tmp_path), "me_1@gmail.com")
+
+
+class _FakeBrowser:
+    def __init__(self) -> None:
+        self.quit_calls = 0
+
+    def get_log(self, log_type: str) -> list:
+        raise WebDriverException(f"log type '{log_type}' not found")
+
+    def quit(self) -> None:
+        self.quit_calls += 1
+
+
+def test_browser_launcher():
+    browsers = []
+
+    def browser_factory():
+        time.sleep(0.05)
+        browsers.append(_FakeBrowser())
+        return browsers[-1]
+
+    # Test case 1: a launcher that was never started is cancelled without launching anything
+    launcher = BrowserLauncher(browser_factory)
+    launcher.cancel()
+    assert browsers == []
+
+    # Test case 2: the browser launched in the background is handed over once and only once
+    launcher.start()
+    launcher.start()
+    display, browser = launcher.get()
+    assert display is None and browsers == [browser] and browser.quit_calls == 0
+
+    # Test case 3: a browser launched in the background that is not needed is quit
+    launcher.start()
+    launcher.cancel()
+    assert len(browsers) == 2 and browsers[1].quit_calls == 1
+
+    # Test case 4: the browser is launched on demand if it was not started
+    display, browser = launcher.get()
+    assert browsers[2] is browser
+
+
+def test_get_chrome_browser_options_proxy(monkeypatch):
+    def fake_get_best_working_proxy(proxies):
+        raise AssertionError("the proxy must not be probed again")
+
+    monkeypatch.setattr(options, "get_best_working_proxy", fake_get_best_working_proxy)
+    browser_options = options.get_chrome_browser_options(proxies=["http://other:8080"], proxy="http://best:8080")
+
+    # Test case 1: the given proxy is used as is, without probing it or picking another one
+    assert "--proxy-server=http://best:8080" in browser_options.arguments
@@ -0,0 +1,43 @@
+"""Module for testing driver_cache.py"""
+import os
+import stat
+
+from amz_tango_card_scraper.browser import driver_cache
+from amz_tango_card_scraper.browser.driver_cache import get_cached_driver
+
+
+def _write_fake_chrome(path: str, version: str) -> None:
+    with open(path, "w") as f:
+        f.write(f"#!/bin/sh\necho 'Google Chrome {version}'\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def test_get_cached_driver(tmp_path, monkeypatch):
+    chrome_path = str(tmp_path / "chrome")
+    cache_dir = str(tmp_path / "cache")
+    downloads = []
+
+    def fake_download_patched_driver(driver_path, version_main):
+        downloads.append(version_main)
+        os.makedirs(os.path.dirname(driver_path), exist_ok=True)
+        open(driver_path, "w").close()
+
+    monkeypatch.setattr(driver_cache, "_download_patched_driver", fake_download_patched_driver)
+    _write_fake_chrome(chrome_path, "114.0.5735.90")
+
+    # Test case 1: cold cache, the version is probed and the driver downloaded
+    driver = get_cached_driver(cache_dir, chrome_path)
+    assert not driver.cache_hit and driver.version_main == 114 and downloads == [114]
+    assert driver.driver_path == os.path.join(cache_dir, "114", driver_cache.DRIVER_FILE_NAME)
+
+    # Test case 2: warm cache, the version is not probed again
+    monkeypatch.setattr(driver_cache, "probe_chrome_version", lambda chrome_path: 0)
+    assert get_cached_driver(cache_dir, chrome_path) == driver._replace(cache_hit=True)
+    monkeypatch.undo()
+    monkeypatch.setattr(driver_cache, "_download_patched_driver", fake_download_patched_driver)
+
+    # Test case 3: Chrome is updated, so its version is probed and the driver of the new version downloaded
+    _write_fake_chrome(chrome_path, "120.0.6099.109")
+    driver = get_cached_driver(cache_dir, chrome_path)
+    assert not driver.cache_hit and driver.version_main == 120 and downloads == [114, 120]
+    assert not os.path.exists(os.path.join(cache_dir, driver_cache.LOCK_FILE_NAME))
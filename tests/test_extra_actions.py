@@ -0,0 +1,65 @@
+"""Module for testing extra_actions.py"""
+from types import SimpleNamespace
+
+import pytest
+from selenium.common.exceptions import (
+    JavascriptException,
+    NoSuchElementException,
+    TimeoutException,
+)
+from selenium.webdriver.common.by import By
+
+from amz_tango_card_scraper.browser.extra_actions import wait_for_element_until_visible
+
+
+class _FakeElement:
+    def is_displayed(self) -> bool:
+        return True
+
+
+class _FakeBrowser:
+    """Stand-in for a browser whose script is interrupted by a navigation, or resolves with the script result."""
+
+    def __init__(self, script_result=None, navigates: bool = False) -> None:
+        self.script_timeout = 30
+        self.script_result = script_result
+        self.navigates = navigates
+        self.element = None
+
+    @property
+    def timeouts(self) -> SimpleNamespace:
+        return SimpleNamespace(script=self.script_timeout)
+
+    def set_script_timeout(self, timeout: float) -> None:
+        self.script_timeout = timeout
+
+    def execute_async_script(self, script: str, *args):
+        if self.navigates:
+            # The element shows up on the page the browser navigated to
+            self.element = _FakeElement()
+            raise JavascriptException("javascript error: document unloaded while waiting for result")
+        return self.script_result
+
+    def find_element(self, by: str, value: str) -> _FakeElement:
+        if self.element is None:
+            raise NoSuchElementException(value)
+        return self.element
+
+
+def test_wait_with_observer():
+    # Test case 1: the element resolved by the script is returned and the script timeout is restored
+    element = _FakeElement()
+    browser = _FakeBrowser(script_result=element)
+    assert wait_for_element_until_visible(browser, (By.ID, "target"), strategy="observer") is element
+    assert browser.script_timeout == 30
+
+    # Test case 2: a navigation that destroys the script falls back to polling on the new page
+    browser = _FakeBrowser(navigates=True)
+    assert wait_for_element_until_visible(browser, (By.ID, "target"), strategy="observer") is browser.element
+    assert browser.script_timeout == 30
+
+    # Test case 3: an element that never shows up is reported as a timeout
+    browser = _FakeBrowser(script_result=None)
+    with pytest.raises(TimeoutException):
+        wait_for_element_until_visible(browser, (By.ID, "target"), timeout=1, strategy="observer")
+    assert browser.script_timeout == 30
@@ -0,0 +1,51 @@
+"""Module for testing the extractors module."""
+import pytest
+
+from amz_tango_card_scraper.gmail_scraper.extractors import (
+    extract_tango_card_with_regex,
+    extract_tango_card_with_soup,
+)
+from amz_tango_card_scraper.gmail_scraper.helpers import extract_tango_card_from_body
+from amz_tango_card_scraper.utils.schemas import TangoCard
+
+
+def build_body(code_div: str = '<div class="tango-credential-value">AB&amp;C-123</div>') -> str:
+    rows = ""
+    for key, value in (("Reward", "Amazon"), ("Amount", "$5"), ("Order", "42")):
+        rows += f'<div class="tango-credential-key">{key}</div><div class="tango-credential-value">{value}</div>'
+    rows += '<div class="bold tango-credential-key"><a href="https://sites.tangocard.com/r?a=1&amp;b=2">Go</a></div>'
+    return f"<html><body>{rows}{code_div}<p>http://www.amazon.es/gc/redeem</p></body></html>"
+
+
+def test_extract_tango_card_with_regex():
+    expected = TangoCard(
+        security_code="AB&C-123",
+        tango_link="https://sites.tangocard.com/r?a=1&b=2",
+        amazon_link="https://www.amazon.es",
+    )
+
+    # Test case 1: both engines extract the same Tango Card
+    body = build_body()
+    assert extract_tango_card_with_regex(body) == expected
+    assert extract_tango_card_with_soup(body) == expected
+
+    # Test case 2: data-class and data-href attributes are not mistaken for the class and the link
+    body = build_body().replace("<body>", '<body><div data-class="tango-credential-value">Decoy</div>')
+    body = body.replace("<a href=", '<a data-href="https://decoy.example.com" href=')
+    assert extract_tango_card_with_regex(body) == expected
+    assert extract_tango_card_with_soup(body) == expected
+
+    # Test case 3: nested divs are not supported by the regex engine
+    body = build_body('<div class="tango-credential-value"><div>AB&amp;C-123</div></div>')
+    with pytest.raises(ValueError):
+        extract_tango_card_with_regex(body)
+
+
+def test_extract_tango_card_from_body():
+    # Test case 1: the BeautifulSoup engine is used when the regex engine fails
+    body = build_body('<div class="tango-credential-value"><div>AB&amp;C-123</div></div>')
+    assert extract_tango_card_from_body(body, engine="regex").security_code == "AB&C-123"
+
+    # Test case 2: unknown engine
+    with pytest.raises(ValueError):
+        extract_tango_card_from_body(build_body(), engine="unknown")
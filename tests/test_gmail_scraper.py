@@ -0,0 +1,491 @@
+"""Module for testing the gmail_scraper module."""
+import asyncio
+import imaplib
+import socket
+import threading
+
+import pytest
+
+from amz_tango_card_scraper.gmail_scraper import async_gmail_scraper, gmail_scraper
+from amz_tango_card_scraper.gmail_scraper.async_client import AsyncIMAPClient
+from amz_tango_card_scraper.gmail_scraper.bodystructure import (
+    find_text_part,
+    parse_fetch_attributes,
+)
+from amz_tango_card_scraper.gmail_scraper.checkpoint import (
+    cap_checkpoint,
+    load_checkpoint,
+    save_checkpoint,
+)
+from amz_tango_card_scraper.gmail_scraper.helpers import (
+    build_search_criteria,
+    build_uid_sets,
+    chunk_uids,
+    decode_part,
+    parse_fetch_response,
+    parse_search_response,
+    parse_status_response,
+)
+from amz_tango_card_scraper.gmail_scraper.idle import wait_for_new_emails
+from amz_tango_card_scraper.gmail_scraper.mailbox_sources import (
+    iter_mailbox_messages,
+)
+from amz_tango_card_scraper.utils.schemas import (
+    MailboxCheckpoint,
+    TangoCard,
+    TextPart,
+)
+
+
+def test_chunk_uids():
+    uids = [str(i).encode() for i in range(1, 6)]
+
+    # Test case 1: UIDs are split into chunks of the given size
+    assert list(chunk_uids(uids, 2)) == [[b"1", b"2"], [b"3", b"4"], [b"5"]]
+
+    # Test case 2: no UIDs
+    assert list(chunk_uids([], 2)) == []
+
+
+def test_parse_fetch_response():
+    # Test case 1: FLAGS before the literal
+    data = [
+        (b"1 (UID 101 FLAGS (\\Seen) BODY[] {5}", b"first"),
+        b")",
+        (b"2 (UID 102 FLAGS () BODY[] {6}", b"second"),
+        b")",
+    ]
+    messages = parse_fetch_response(data)  # type: ignore
+    assert [m.uid for m in messages] == [b"101", b"102"]
+    assert messages[0].flags == "\\Seen"
+    assert messages[1].flags == ""
+    assert messages[1].raw == b"second"
+
+    # Test case 2: FLAGS after the literal and unsolicited responses
+    data = [
+        (b"3 (UID 103 BODY[] {5}", b"third"),
+        b" FLAGS (\\Seen \\Flagged))",
+        b"4 (FLAGS (\\Seen))",
+    ]
+    messages = parse_fetch_response(data)  # type: ignore
+    assert len(messages) == 1
+    assert messages[0].uid == b"103"
+    assert messages[0].flags == "\\Seen \\Flagged"
+
+
+def test_build_uid_sets():
+    # Test case 1: consecutive UIDs are compressed into ranges
+    assert build_uid_sets([b"7", b"1", b"2", b"3", b"9", b"10"]) == ["1:3,7,9:10"]
+
+    # Test case 2: UIDs are split into several sets
+    assert build_uid_sets(["1", "2", "3", "5"], size=2) == ["1:2", "3,5"]
+
+
+def test_build_search_criteria():
+    # Test case 1: single sender
+    assert build_search_criteria(["a@example.com"]) == 'UNSEEN FROM "a@example.com"'
+
+    # Test case 2: several senders are nested with OR
+    assert (
+        build_search_criteria(["a@example.com", "b@example.com", "c@example.com"], unseen_only=False)
+        == 'OR OR FROM "a@example.com" FROM "b@example.com" FROM "c@example.com"'
+    )
+
+    # Test case 3: only emails after the given UID
+    assert build_search_criteria(["a@example.com"], min_uid=42) == 'UID 42:* UNSEEN FROM "a@example.com"'
+
+    # Test case 4: content filter with and without Gmail's extension
+    assert (
+        build_search_criteria(["a@example.com"], content_filter="tango", gmail_raw=True)
+        == 'UNSEEN FROM "a@example.com" X-GM-RAW "tango"'
+    )
+    assert (
+        build_search_criteria(["a@example.com"], content_filter="tango") == 'UNSEEN FROM "a@example.com" BODY "tango"'
+    )
+
+
+def test_parse_search_response():
+    # Test case 1: duplicated UIDs are removed and UIDs are sorted
+    assert parse_search_response([b"12 3 7", b"3 12"]) == [b"3", b"7", b"12"]
+
+    # Test case 2: no results
+    assert parse_search_response([b""]) == []
+
+
+def test_parse_status_response():
+    # Test case 1: valid response
+    assert parse_status_response([b'"INBOX" (UIDNEXT 1234 UIDVALIDITY 5)']) == {"UIDNEXT": 1234, "UIDVALIDITY": 5}
+
+    # Test case 2: empty response
+    assert parse_status_response([]) == {}
+
+
+def test_checkpoint(tmp_path):
+    file_path = str(tmp_path / "checkpoints.json")
+
+    # Test case 1: account that has never been scraped
+    assert load_checkpoint(file_path, "a@example.com") is None
+
+    # Test case 2: checkpoints of several accounts are kept
+    save_checkpoint(file_path, "a@example.com", MailboxCheckpoint(uidvalidity=1, last_uid=10))
+    save_checkpoint(file_path, "b@example.com", MailboxCheckpoint(uidvalidity=2, last_uid=20))
+    assert load_checkpoint(file_path, "a@example.com") == MailboxCheckpoint(uidvalidity=1, last_uid=10)
+    assert load_checkpoint(file_path, "b@example.com") == MailboxCheckpoint(uidvalidity=2, last_uid=20)
+
+
+def test_cap_checkpoint():
+    checkpoint = MailboxCheckpoint(uidvalidity=1, last_uid=20)
+
+    # Test case 1: the checkpoint is moved right below the lowest unprocessed email
+    assert cap_checkpoint(checkpoint, ["15", "12", "18"]) == MailboxCheckpoint(uidvalidity=1, last_uid=11)
+
+    # Test case 2: Tango Cards without an email and emails above the checkpoint do not move it
+    assert cap_checkpoint(checkpoint, ["", "25"]) == checkpoint
+
+
+def test_find_text_part():
+    # Test case 1: text/plain part nested in a multipart/alternative with an inline image
+    response = (
+        b'1 (UID 42 FLAGS (\\Seen) BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE"'
+        b' 1234 30 NIL NIL NIL)("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 5678 80 NIL NIL NIL)'
+        b' "ALTERNATIVE" ("BOUNDARY" "b1") NIL NIL)("IMAGE" "PNG" ("NAME" "logo.png") "<logo>" NIL "BASE64" 40000'
+        b' NIL ("INLINE" ("FILENAME" "logo.png")) NIL) "RELATED" ("BOUNDARY" "b0") NIL NIL))'
+    )
+    attributes = parse_fetch_attributes(response)
+    assert attributes["UID"] == "42"
+    assert attributes["FLAGS"] == ["\\Seen"]
+    assert find_text_part(attributes["BODYSTRUCTURE"]) == TextPart(
+        section="1.1", encoding="quoted-printable", charset="utf-8"
+    )
+
+    # Test case 2: text/plain attachments are skipped
+    response = (
+        b'2 (UID 43 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "us-ascii") NIL NIL "BASE64" 10 1 NIL'
+        b' ("ATTACHMENT" ("FILENAME" "a.txt")) NIL)("TEXT" "PLAIN" ("CHARSET" "us-ascii") NIL NIL "7BIT" 10 1 NIL'
+        b' NIL NIL) "MIXED" ("BOUNDARY" "b0") NIL NIL))'
+    )
+    assert find_text_part(parse_fetch_attributes(response)["BODYSTRUCTURE"]) == TextPart(
+        section="2", encoding="7bit", charset="us-ascii"
+    )
+
+    # Test case 3: single part email
+    response = b'3 (UID 44 BODYSTRUCTURE ("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 100 2 NIL NIL NIL))'
+    assert find_text_part(parse_fetch_attributes(response)["BODYSTRUCTURE"]) == TextPart(
+        section="1", encoding="base64", charset="utf-8"
+    )
+
+
+def test_decode_part():
+    # Test case 1: base64
+    assert decode_part(b"aG9sYSB0YW5nbw==", "BASE64", "utf-8") == "hola tango"
+
+    # Test case 2: quoted-printable
+    assert decode_part(b"caf=C3=A9 =3D tango", "quoted-printable", "utf-8") == "café = tango"
+
+
+class _FakeWriter:
+    def __init__(self) -> None:
+        self.data = b""
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    async def drain(self) -> None:
+        pass
+
+
+def test_async_client_pipeline():
+    async def run_pipeline():
+        client = AsyncIMAPClient("localhost")
+        client._reader = asyncio.StreamReader()
+        client._writer = _FakeWriter()  # type: ignore
+        client._reader.feed_data(
+            b"* OK [UIDVALIDITY 7] UIDs valid\r\n"
+            b"A1 OK SELECT completed\r\n"
+            b"* 1 FETCH (UID 101 BODY[1] {5}\r\nfirst)\r\n"
+            b"A2 OK FETCH completed\r\n"
+            b"* SEARCH 101 102\r\n"
+            b"A3 OK SEARCH completed\r\n"
+        )
+        results = await client.pipeline(["SELECT INBOX", "UID FETCH 101 (UID BODY.PEEK[1])", "UID SEARCH ALL"])
+        return client, results
+
+    client, results = asyncio.run(run_pipeline())
+
+    # Test case 1: all the commands are sent at once
+    assert client._writer.data.count(b"\r\n") == 3  # type: ignore
+
+    # Test case 2: response codes are stored
+    assert client.response_codes["UIDVALIDITY"] == b"7"
+
+    # Test case 3: literals are returned in the same format as imaplib
+    assert results[1] == ("OK", [(b"1 (UID 101 BODY[1] {5}", b"first"), b")"])
+    assert parse_fetch_response(results[1][1])[0].raw == b"first"
+
+    # Test case 4: untagged responses are attributed to their command
+    assert results[2] == ("OK", [b"101 102"])
+
+
+def test_iter_mailbox_messages(tmp_path):
+    # Test case 1: mbox files are split on "From " lines and quoted "From " lines are restored
+    mbox_path = tmp_path / "inbox.mbox"
+    mbox_path.write_bytes(
+        b"From a@x.com Mon Jan  1 00:00:00 2024\nSubject: one\n\n>From here\n\n"
+        b"From b@x.com Mon Jan  1 00:00:00 2024\nSubject: two\n\nbody\n"
+    )
+    messages = list(iter_mailbox_messages(str(mbox_path)))
+    assert [raw for _, raw in messages] == [b"Subject: one\n\nFrom here\n\n", b"Subject: two\n\nbody\n"]
+
+    # Test case 2: empty mbox file
+    empty_path = tmp_path / "empty.mbox"
+    empty_path.write_bytes(b"")
+    assert list(iter_mailbox_messages(str(empty_path))) == []
+
+    # Test case 3: Maildir trees
+    (tmp_path / "maildir" / "cur").mkdir(parents=True)
+    (tmp_path / "maildir" / "new").mkdir()
+    (tmp_path / "maildir" / "cur" / "1").write_bytes(b"Subject: cur\n\n")
+    (tmp_path / "maildir" / "new" / "2").write_bytes(b"Subject: new\n\n")
+    messages = list(iter_mailbox_messages(str(tmp_path / "maildir")))
+    assert [raw for _, raw in messages] == [b"Subject: cur\n\n", b"Subject: new\n\n"]
+
+    # Test case 4: .eml directories
+    (tmp_path / "eml").mkdir()
+    (tmp_path / "eml" / "a.eml").write_bytes(b"Subject: a\n\n")
+    (tmp_path / "eml" / "notes.txt").write_bytes(b"not an email")
+    assert [raw for _, raw in iter_mailbox_messages(str(tmp_path / "eml"))] == [b"Subject: a\n\n"]
+
+
+def test_scrape_accounts(monkeypatch):
+    async def fake_scrape_tango_cards_async(email, app_password, **kwargs):
+        if email == "broken@gmail.com":
+            raise asyncio.IncompleteReadError(b"", 10)
+        return [email]
+
+    monkeypatch.setattr(async_gmail_scraper, "scrape_tango_cards_async", fake_scrape_tango_cards_async)
+    accounts = [{"email": "a@gmail.com"}, {"email": "broken@gmail.com"}, {"email": "b@gmail.com"}]
+    results = asyncio.run(async_gmail_scraper._scrape_accounts(accounts, max_connections=2, timeout=5))
+
+    # Test case 1: an account that fails with any error does not abort the rest
+    assert results == {"a@gmail.com": ["a@gmail.com"], "broken@gmail.com": [], "b@gmail.com": ["b@gmail.com"]}
+
+
+def test_iter_tango_cards_from_accounts(monkeypatch):
+    slow_account_released = threading.Event()
+
+    async def fake_scrape_tango_cards_async(email, app_password, on_tango_card=None, **kwargs):
+        if email == "slow@gmail.com":
+            while not slow_account_released.is_set():
+                await asyncio.sleep(0.01)
+        on_tango_card(email)
+        return [email]
+
+    monkeypatch.setattr(async_gmail_scraper, "scrape_tango_cards_async", fake_scrape_tango_cards_async)
+    accounts = [{"email": "slow@gmail.com"}, {"email": "fast@gmail.com"}]
+    tango_cards = async_gmail_scraper.iter_tango_cards_from_accounts(accounts, [], timeout=5)
+
+    # Test case 1: the Tango Cards of an account are yielded while the slower accounts are still being scraped
+    assert next(tango_cards) == "fast@gmail.com"
+    slow_account_released.set()
+    assert list(tango_cards) == ["slow@gmail.com"]
+
+
+class _FakePipelineClient:
+    def __init__(self) -> None:
+        self.pipelined = []
+
+    async def pipeline(self, commands):
+        self.pipelined.append(len(commands))
+        return [("OK", []) for _ in commands]
+
+
+def test_pipeline_bounded():
+    client = _FakePipelineClient()
+    commands = [f"UID FETCH {i} (UID FLAGS BODYSTRUCTURE)" for i in range(20)]
+    responses = asyncio.run(async_gmail_scraper._pipeline_bounded(client, commands, max_in_flight=8))
+
+    # Test case 1: at most max_in_flight commands are sent before reading their responses
+    assert client.pipelined == [8, 8, 4]
+    assert len(responses) == 20
+
+
+class _FakeIMAPServer:
+    """Scripted IMAP server that answers the commands sent over one end of a socket pair."""
+
+    def __init__(self, uidnext, idle_responses, rejected=None) -> None:
+        self.client_sock, self._server_sock = socket.socketpair()
+        self.uidnext = uidnext
+        # What the server sends while idling, or None to reject the IDLE command
+        self.idle_responses = list(idle_responses)
+        # Commands answered with the given NO response instead of completing
+        self.rejected = rejected or {}
+        self.commands = []
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self) -> None:
+        file = self._server_sock.makefile("rb")
+        send = self._server_sock.sendall
+        send(b"* OK Fake IMAP ready\r\n")
+        for line in file:
+            tag, command = line.split()[:2]
+            self.commands.append(command.decode())
+            if command in self.rejected:
+                send(tag + b" NO " + self.rejected[command] + b"\r\n")
+            elif command == b"CAPABILITY":
+                send(b"* CAPABILITY IMAP4rev1 IDLE\r\n" + tag + b" OK CAPABILITY completed\r\n")
+            elif command == b"LOGIN":
+                send(tag + b" OK LOGIN completed\r\n")
+            elif command == b"SELECT":
+                send(
+                    b"* 3 EXISTS\r\n* OK [UIDVALIDITY 7] UIDs valid\r\n"
+                    + b"* OK [UIDNEXT %d] Predicted next UID\r\n" % self.uidnext
+                    + tag
+                    + b" OK [READ-WRITE] SELECT completed\r\n"
+                )
+            elif command == b"IDLE":
+                response = self.idle_responses.pop(0)
+                if response is None:
+                    send(tag + b" BAD IDLE not allowed\r\n")
+                    continue
+                send(b"+ idling\r\n" + response)
+                file.readline()  # DONE
+                send(tag + b" OK IDLE terminated\r\n")
+            elif command == b"LOGOUT":
+                send(b"* BYE Logging out\r\n" + tag + b" OK LOGOUT completed\r\n")
+                break
+        self._server_sock.close()
+
+
+class _SocketPairIMAP(imaplib.IMAP4):
+    def __init__(self, sock) -> None:
+        self._pair_sock = sock
+        super().__init__()
+
+    def open(self, host="", port=imaplib.IMAP4_PORT, timeout=None) -> None:
+        self.host = host
+        self.port = port
+        self.sock = self._pair_sock
+        self.file = self.sock.makefile("rb")
+
+
+def test_wait_for_new_emails():
+    server = _FakeIMAPServer(uidnext=4, idle_responses=[b"* OK Still here\r\n* 4 EXISTS\r\n", b"", None])
+    mail = _SocketPairIMAP(server.client_sock)
+
+    # Test case 1: keep-alive responses are ignored until the server notifies new emails
+    assert wait_for_new_emails(mail, timeout=5) is True
+
+    # Test case 2: the timeout expires without new emails and the connection can still be used
+    assert wait_for_new_emails(mail, timeout=0.1) is False
+
+    # Test case 3: a rejected IDLE command aborts the connection
+    with pytest.raises(imaplib.IMAP4.abort):
+        wait_for_new_emails(mail, timeout=5)
+    mail.logout()
+    assert server.commands == ["CAPABILITY", "IDLE", "IDLE", "IDLE", "LOGOUT"]
+
+
+class _StopWatching(BaseException):
+    pass
+
+
+def test_watch_tango_cards(monkeypatch, tmp_path):
+    # Every connection is dropped when it starts idling, so the watch reconnects and scrapes the new emails again
+    servers = [_FakeIMAPServer(uidnext=uidnext, idle_responses=[None]) for uidnext in (12, 13, 13)]
+    connected = []
+    scraped_from = []
+
+    def connect(host):
+        connected.append(servers[len(connected)])
+        return _SocketPairIMAP(connected[-1].client_sock)
+
+    def fake_scrape_inbox(mail, email, from_list, last_uid, *args):
+        scraped_from.append(last_uid)
+        uids = [str(uid).encode() for uid in range(last_uid + 1, connected[-1].uidnext)]
+        return ([TangoCard(uid.decode(), uid.decode(), "", email_uid=uid.decode()) for uid in uids], uids)
+
+    batches = []
+
+    def on_tango_cards(tango_cards):
+        batches.append([tc.email_uid for tc in tango_cards])
+        if len(batches) == 1:
+            raise RuntimeError("Amazon is down")
+        if len(batches) == 2:
+            # Only the Tango Card of email 11 could not be processed
+            return [tc for tc in tango_cards if tc.email_uid == "11"]
+        raise _StopWatching()
+
+    monkeypatch.setattr(gmail_scraper.imaplib, "IMAP4_SSL", connect)
+    monkeypatch.setattr(gmail_scraper, "_scrape_inbox", fake_scrape_inbox)
+    monkeypatch.setattr(gmail_scraper, "RECONNECT_MIN_DELAY", 0)
+    checkpoint_file = str(tmp_path / "checkpoints.json")
+    with pytest.raises(_StopWatching):
+        gmail_scraper.watch_tango_cards(
+            "me@gmail.com",
+            "password",
+            ["tango@x.com"],
+            on_tango_cards,
+            checkpoint_file=checkpoint_file,
+            checkpoint=MailboxCheckpoint(7, 9),
+        )
+
+    # Test case 1: the watch starts from the given checkpoint instead of the end of the inbox
+    assert scraped_from[0] == 9
+
+    # Test case 2: a batch that fails to be processed does not stop the watch and its emails are searched again
+    assert batches[:2] == [["10", "11"], ["10", "11", "12"]]
+    assert scraped_from[1] == 9
+
+    # Test case 3: the checkpoint stays below the emails whose Tango Cards could not be processed
+    assert batches[2] == ["11", "12"] and scraped_from[2] == 10
+    assert load_checkpoint(checkpoint_file, "me@gmail.com") == MailboxCheckpoint(7, 10)
+
+    # Test case 4: the lost connection is logged out before reconnecting
+    servers[0].thread.join(5)
+    assert servers[0].commands[-1] == "LOGOUT"
+
+
+def test_watch_tango_cards_errors(monkeypatch):
+    # Gmail is temporarily unavailable on login and then on select, before the third connection succeeds
+    servers = [
+        _FakeIMAPServer(uidnext=11, idle_responses=[], rejected={b"LOGIN": b"[UNAVAILABLE] Temporary failure"}),
+        _FakeIMAPServer(uidnext=11, idle_responses=[], rejected={b"SELECT": b"[UNAVAILABLE] Try again later"}),
+        _FakeIMAPServer(uidnext=11, idle_responses=[None]),
+    ]
+    connected = []
+
+    def connect(host):
+        connected.append(servers[len(connected)])
+        return _SocketPairIMAP(connected[-1].client_sock)
+
+    def fake_scrape_inbox(mail, email, from_list, last_uid, *args):
+        return ([TangoCard("10", "10", "", email_uid="10")], [b"10"])
+
+    def on_tango_cards(tango_cards):
+        raise _StopWatching()
+
+    monkeypatch.setattr(gmail_scraper.imaplib, "IMAP4_SSL", connect)
+    monkeypatch.setattr(gmail_scraper, "_scrape_inbox", fake_scrape_inbox)
+    monkeypatch.setattr(gmail_scraper, "RECONNECT_MIN_DELAY", 0)
+    with pytest.raises(_StopWatching):
+        gmail_scraper.watch_tango_cards(
+            "me@gmail.com", "password", ["tango@x.com"], on_tango_cards, checkpoint=MailboxCheckpoint(7, 9)
+        )
+
+    # Test case 1: the errors answered by the server are retried with backoff instead of stopping the watch
+    assert connected == servers
+    for server in servers[:2]:
+        server.thread.join(5)
+        assert server.commands[-1] == "LOGOUT"
+
+    # Test case 2: wrong credentials stop the watch instead of being retried forever
+    servers[:] = [
+        _FakeIMAPServer(
+            uidnext=11, idle_responses=[], rejected={b"LOGIN": b"[AUTHENTICATIONFAILED] Invalid credentials (Failure)"}
+        )
+    ]
+    connected.clear()
+    with pytest.raises(imaplib.IMAP4.error, match="AUTHENTICATIONFAILED"):
+        gmail_scraper.watch_tango_cards("me@gmail.com", "password", ["tango@x.com"], on_tango_cards)
+    assert len(connected) == 1
@@ -0,0 +1,199 @@
+"""Module for testing the __main__ module."""
+import imaplib
+
+from amz_tango_card_scraper import __main__ as scraper_main
+from amz_tango_card_scraper.ledger.card_ledger import CardLedger
+from amz_tango_card_scraper.ledger.constants import AMAZON_REDEEMED, SCRAPED
+from amz_tango_card_scraper.utils.schemas import AmazonCard, ConfigFile, TangoCard
+
+
+class _FakeLauncher:
+    def __init__(self) -> None:
+        self.browser = object()
+        self.calls = []
+
+    def start(self) -> None:
+        self.calls.append("start")
+
+    def get(self):
+        self.calls.append("get")
+        return (None, self.browser)
+
+    def cancel(self) -> None:
+        self.calls.append("cancel")
+
+
+class _FakeSession:
+    def close(self) -> None:
+        pass
+
+
+def _get_config(**script) -> ConfigFile:
+    return ConfigFile(
+        gmail={"email": "me@gmail.com", "app_password": ""},
+        amazon={},
+        from_list=[],
+        script=script,
+        proxies={},
+        telegram={},
+        gmail_accounts=[],
+    )
+
+
+def _get_amazon_card(tc: TangoCard) -> AmazonCard:
+    return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+
+def test_stream_tango_cards(monkeypatch, tmp_path):
+    http_calls = []
+    browser_calls = []
+    redeemed_with = []
+    quit_browsers = []
+    cleaned_uids = []
+    reported = []
+
+    def fake_scrap_amazon_gift_cards_http(tango_cards, session, on_amazon_card=None):
+        http_calls.extend(tc.security_code for tc in tango_cards)
+        if tango_cards[0].security_code != "C":
+            return ([], tango_cards)
+        amazon_card = _get_amazon_card(tango_cards[0])
+        if on_amazon_card:
+            on_amazon_card(amazon_card)
+        return ([amazon_card], [])
+
+    def fake_iter_amazon_gift_cards(browser_factory, tango_cards, on_amazon_card=None, **kwargs):
+        # Only scrape once every Tango Card has arrived, so the ones obtained without the browser are emitted first
+        pending = list(tango_cards)
+        browser_calls.extend(tc.security_code for tc in pending)
+        for tc in pending:
+            if tc.security_code == "D":
+                amazon_card = _get_amazon_card(tc)
+                if on_amazon_card:
+                    on_amazon_card(amazon_card)
+                yield amazon_card
+
+    def fake_redeem_amazon_gift_cards_from_stream(
+        browser_factory, amazon_cards, *args, on_redeemed, browser, **kwargs
+    ):
+        redeemed_with.append(browser)
+        for ac in amazon_cards:
+            ac.redeem_status = True
+            on_redeemed(ac)
+        return {"amazon.com": ("$0", "$30")}
+
+    def spy_report_tango_cards(config, tango_cards, amazon_cards, finished_tango_cards, balance_results):
+        reported.append([ac.redeem_code for ac in amazon_cards])
+        return report_tango_cards(config, tango_cards, amazon_cards, finished_tango_cards, balance_results)
+
+    report_tango_cards = scraper_main.report_tango_cards
+    monkeypatch.setattr(scraper_main, "create_tango_session", lambda proxy: _FakeSession())
+    monkeypatch.setattr(scraper_main, "scrap_amazon_gift_cards_http", fake_scrap_amazon_gift_cards_http)
+    monkeypatch.setattr(scraper_main, "get_browser_factory", lambda config: None)
+    monkeypatch.setattr(scraper_main, "iter_amazon_gift_cards", fake_iter_amazon_gift_cards)
+    monkeypatch.setattr(scraper_main, "get_marketplace_browser_factory", lambda config: None)
+    monkeypatch.setattr(
+        scraper_main, "redeem_amazon_gift_cards_from_stream", fake_redeem_amazon_gift_cards_from_stream
+    )
+    monkeypatch.setattr(scraper_main, "quit_chrome_browser", quit_browsers.append)
+    monkeypatch.setattr(
+        scraper_main, "apply_mailbox_actions", lambda email, app_password, uids, **kwargs: cleaned_uids.extend(uids)
+    )
+    monkeypatch.setattr(scraper_main, "store_message", lambda message, file_path: None)
+    monkeypatch.setattr(scraper_main, "report_tango_cards", spy_report_tango_cards)
+
+    tango_cards = [
+        TangoCard(code, code, "https://www.amazon.com", str(uid), "me@gmail.com")
+        for uid, code in enumerate(["D", "A", "B", "C", "E"], start=1)
+    ]
+    launcher = _FakeLauncher()
+    with CardLedger(str(tmp_path / "cards.sqlite3")) as ledger:
+        # A was redeemed in Amazon in a previous run, B only got its Amazon gift card
+        ledger.record_scraped(tango_cards[1:3])
+        ledger.record_tango_redeemed(_get_amazon_card(tango_cards[1]))
+        ledger.record_amazon_redeemed(_get_amazon_card(tango_cards[1]))
+        ledger.record_tango_redeemed(_get_amazon_card(tango_cards[2]))
+        scraped, unprocessed = scraper_main.stream_tango_cards(
+            _get_config(redeem_amz=True, tango_http=True), iter(tango_cards), ledger, launcher  # type: ignore
+        )
+        statuses = {entry.tango_card.security_code: entry.status for entry in ledger.get_entries()}
+
+    # Test case 1: the cards done in a previous run are resumed from the ledger without scraping them again
+    assert http_calls == ["D", "C", "E"]
+
+    # Test case 2: only the Tango Cards that could not be scraped over HTTP are passed on to the browser
+    assert browser_calls == ["D", "E"]
+
+    # Test case 3: the progress of every card is recorded in the ledger
+    assert statuses == {
+        "A": AMAZON_REDEEMED,
+        "B": AMAZON_REDEEMED,
+        "C": AMAZON_REDEEMED,
+        "D": AMAZON_REDEEMED,
+        "E": SCRAPED,
+    }
+
+    # Test case 4: the browser of the launcher is started in advance, handed over to Amazon and quit at the end
+    assert launcher.calls == ["start", "get"]
+    assert redeemed_with == [launcher.browser] and quit_browsers == [launcher.browser]
+
+    # Test case 5: the Amazon gift cards are reported in the order of their Tango Cards, not the order they arrived
+    assert reported == [["AMZ-D", "AMZ-B", "AMZ-C"]]
+
+    # Test case 6: the Tango Card that could not be processed is returned and its email is left untouched
+    assert scraped == tango_cards
+    assert unprocessed == [tango_cards[4]]
+    assert sorted(cleaned_uids) == ["1", "2", "3", "4"]
+
+    # Test case 7: the browser is not waited for if there is nothing to redeem in Amazon
+    launcher = _FakeLauncher()
+    config = _get_config(tango_http=True)
+    scraper_main.stream_tango_cards(config, iter(tango_cards[3:4]), None, launcher)  # type: ignore
+    assert launcher.calls == ["cancel"]
+    assert len(redeemed_with) == 1
+
+
+def test_stream_tango_cards_upstream_error(monkeypatch):
+    redeemed = []
+    quit_browsers = []
+    cleaned_uids = []
+
+    def fake_iter_amazon_gift_cards(browser_factory, tango_cards, on_amazon_card=None, **kwargs):
+        for tc in tango_cards:
+            yield _get_amazon_card(tc)
+
+    def fake_redeem_amazon_gift_cards_from_stream(browser_factory, amazon_cards, *args, **kwargs):
+        for ac in amazon_cards:
+            ac.redeem_status = True
+            redeemed.append(ac.redeem_code)
+        return {"amazon.com": ("$0", "$10")}
+
+    monkeypatch.setattr(scraper_main, "get_browser_factory", lambda config: None)
+    monkeypatch.setattr(scraper_main, "iter_amazon_gift_cards", fake_iter_amazon_gift_cards)
+    monkeypatch.setattr(scraper_main, "get_marketplace_browser_factory", lambda config: None)
+    monkeypatch.setattr(
+        scraper_main, "redeem_amazon_gift_cards_from_stream", fake_redeem_amazon_gift_cards_from_stream
+    )
+    monkeypatch.setattr(scraper_main, "quit_chrome_browser", quit_browsers.append)
+    monkeypatch.setattr(
+        scraper_main, "apply_mailbox_actions", lambda email, app_password, uids, **kwargs: cleaned_uids.extend(uids)
+    )
+    monkeypatch.setattr(scraper_main, "store_message", lambda message, file_path: None)
+
+    tango_card = TangoCard("D", "D", "https://www.amazon.com", "1", "me@gmail.com")
+
+    def tango_cards():
+        yield tango_card
+        raise imaplib.IMAP4.abort("socket error: EOF")
+
+    launcher = _FakeLauncher()
+    scraped, unprocessed = scraper_main.stream_tango_cards(
+        _get_config(redeem_amz=True), tango_cards(), None, launcher  # type: ignore
+    )
+
+    # Test case 1: an error while scraping the Tango Cards ends the stream instead of aborting the run
+    assert scraped == [tango_card] and unprocessed == []
+    assert redeemed == ["AMZ-D"]
+
+    # Test case 2: the browser is quit and the card that was redeemed is reported and cleaned up
+    assert quit_browsers == [launcher.browser]
+    assert cleaned_uids == ["1"]
@@ -0,0 +1,16 @@
+"""Module for testing message_builder.py"""
+from amz_tango_card_scraper.message.message_builder import build_amazon_cards_message
+from amz_tango_card_scraper.utils.schemas import AmazonCard
+
+
+def test_build_amazon_cards_message():
+    links = ["https://www.amazon.com/", "https://www.amazon.com", "https://www.amazon.es"]
+    amazon_cards = [
+        AmazonCard(redeem_code=str(i), redeem_status=False, amazon_link=link) for i, link in enumerate(links)
+    ]
+    message = build_amazon_cards_message(amazon_cards)
+
+    # Test case 1: a single redeem link per marketplace, without a double slash
+    assert message.endswith(
+        "You can redeem the Amazon gift cards here: https://www.amazon.com/gc/redeem, https://www.amazon.es/gc/redeem"
+    )
@@ -1,9 +1,88 @@
 """Module for testing proxies.py"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from amz_tango_card_scraper.browser.proxies import is_proxy_working
+from amz_tango_card_scraper.browser.proxies import is_proxy_working, rank_proxies
+from amz_tango_card_scraper.browser.proxy_manager import ProxyManager
 
 
 def test_is_proxy_working():
     # Test case 1: proxy is not working
     proxy = "http://invalid.proxy.example.com:8080"
     assert not is_proxy_working(proxy)
+
+
+def _start_proxy(delay: float) -> ThreadingHTTPServer:
+    """Starts a stand-in proxy that answers every request after a delay."""
+
+    class ProxyHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            time.sleep(delay)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+            except OSError:
+                # The client gave up waiting
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_rank_proxies(tmp_path):
+    servers = [_start_proxy(0.2), _start_proxy(0), _start_proxy(3)]
+    slow, fast, stalled = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+    dead = "http://127.0.0.1:1"
+    cache_file = str(tmp_path / "proxy_cache.json")
+    probe_url = "http://probe.example.com/"
+    try:
+        # Test case 1: working proxies are ranked by latency and the ones that miss the deadline are skipped
+        start = time.monotonic()
+        ranked = rank_proxies([slow, dead, stalled, fast], probe_url=probe_url, deadline=1, cache_file=cache_file)
+        assert ranked == [fast, slow]
+        assert time.monotonic() - start < 2
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    # Test case 2: cached results are reused without probing the proxies again
+    assert rank_proxies([slow, dead, fast], probe_url=probe_url, deadline=1, cache_file=cache_file) == [fast, slow]
+
+    # Test case 3: cached results expire and are not shared between probe URLs
+    assert rank_proxies([fast], probe_url=probe_url, deadline=1, cache_file=cache_file, cache_ttl=0) == []
+    assert rank_proxies([fast], probe_url="http://other.example.com/", deadline=1, cache_file=cache_file) == []
+
+
+def test_proxy_manager():
+    manager = ProxyManager(["fast", "medium", "slow"], error_threshold=2, ranked=["fast", "medium", "slow"])
+
+    # Test case 1: workers are spread over the proxies fastest first and keep their proxy
+    assert [manager.assign(worker_id) for worker_id in range(4)] == ["fast", "medium", "slow", "fast"]
+    assert manager.assign(1) == "medium"
+
+    # Test case 2: a proxy is retired after failing error_threshold times in a row, for every worker using it
+    manager.record_failure(0)
+    manager.record_success(3, 1.5)
+    manager.record_failure(0)
+    assert not manager.should_rotate(0)
+    manager.record_failure(3)
+    assert manager.should_rotate(0) and manager.should_rotate(3) and not manager.should_rotate(1)
+
+    # Test case 3: the workers of a retired proxy move to the next-best proxy with the fewest workers
+    assert manager.assign(0) == "medium"
+    assert manager.assign(3) == "slow"
+    assert str(manager.stats["fast"]) == "fast: 1 ok, 3 failed, avg 1.50s (retired)"
+
+    # Test case 4: no proxy is assigned once every proxy is retired
+    for proxy in ("medium", "slow"):
+        manager.stats[proxy] = manager.stats[proxy]._replace(retired=True)
+    assert manager.assign(0) == ""
+    assert not manager.should_rotate(0)
@@ -0,0 +1,373 @@
+"""Module for testing the tango_scraper module."""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from urllib3.exceptions import MaxRetryError
+
+from amz_tango_card_scraper.browser.proxy_manager import ProxyManager
+from amz_tango_card_scraper.tango_scraper import tango_scraper
+from amz_tango_card_scraper.tango_scraper.http_redeemer import (
+    scrap_amazon_gift_cards_http,
+)
+from amz_tango_card_scraper.utils.schemas import AmazonCard, TangoCard
+
+
+class _FakeBrowser:
+    def __init__(self) -> None:
+        self.alive = True
+        self.quit_calls = 0
+
+    @property
+    def current_url(self) -> str:
+        if not self.alive:
+            raise WebDriverException("browser crashed")
+        return "about:blank"
+
+    def get_log(self, log_type: str) -> list:
+        raise WebDriverException(f"log type '{log_type}' not found")
+
+    def quit(self) -> None:
+        self.quit_calls += 1
+
+
+def test_scrap_amazon_gift_cards_in_parallel(monkeypatch):
+    browsers = []
+
+    def browser_factory():
+        browsers.append(_FakeBrowser())
+        return browsers[-1]
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        time.sleep(0.01 * int(tc.security_code))
+        if tc.security_code == "2":
+            # Invalid security code
+            return None
+        if tc.security_code == "3":
+            browser.alive = False
+            raise WebDriverException("page crashed")
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    tango_cards = [TangoCard(security_code=str(i), tango_link=str(i), amazon_link="") for i in range(8)]
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards_in_parallel(
+        browser_factory, tango_cards, workers=3, retry_delay=0.01
+    )
+
+    # Test case 1: results are returned in input order without the failed Tango Cards
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-0", "AMZ-1", "AMZ-4", "AMZ-5", "AMZ-6", "AMZ-7"]
+
+    # Test case 2: every browser is quit, the crashed one included
+    assert len(browsers) >= 3
+    assert any(not browser.alive for browser in browsers)
+    assert all(browser.quit_calls == 1 for browser in browsers)
+
+
+def test_scrap_amazon_gift_cards_retries(monkeypatch):
+    attempts: Counter = Counter()
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        attempts[tc.security_code] += 1
+        if tc.security_code == "timeout" and attempts[tc.security_code] < 3:
+            raise TimeoutException("element not visible")
+        if tc.security_code == "proxy":
+            raise WebDriverException("unknown error: net::ERR_PROXY_CONNECTION_FAILED")
+        if tc.security_code == "captcha":
+            raise tango_scraper.CaptchaRequiredError("Tango asked for a CAPTCHA")
+        if tc.security_code == "invalid":
+            return None
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    codes = ["timeout", "proxy", "captcha", "invalid", "ok"]
+    tango_cards = [TangoCard(security_code=code, tango_link=code, amazon_link="") for code in codes]
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards(_FakeBrowser(), tango_cards, max_attempts=3, retry_delay=0.01)
+
+    # Test case 1: transient failures are retried and do not block the rest of the Tango Cards
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-timeout", "AMZ-ok"]
+    assert attempts["timeout"] == 3 and attempts["proxy"] == 3
+
+    # Test case 2: invalid security codes and CAPTCHAs are not retried
+    assert attempts["captcha"] == 1 and attempts["invalid"] == 1
+
+    # Test case 3: no Tango Card is attempted after the deadline
+    attempts.clear()
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards(_FakeBrowser(), tango_cards, deadline=0.2, retry_delay=10)
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-ok"]
+    assert attempts["timeout"] == 1 and attempts["proxy"] == 1
+
+
+def test_scrap_amazon_gift_cards_browser_crash(monkeypatch):
+    browsers = [_FakeBrowser()]
+    attempts: Counter = Counter()
+
+    def browser_factory():
+        browsers.append(_FakeBrowser())
+        return browsers[-1]
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        attempts[tc.security_code] += 1
+        if browser is browsers[0] and tc.security_code == "1":
+            browser.alive = False
+            raise WebDriverException("chrome not reachable")
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    schedulers = []
+
+    class SpyScheduler(tango_scraper.CardScheduler):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            schedulers.append(self)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    monkeypatch.setattr(tango_scraper, "CardScheduler", SpyScheduler)
+    tango_cards = [TangoCard(security_code=str(i), tango_link=str(i), amazon_link="") for i in range(3)]
+    replaced = []
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards(
+        browsers[0],
+        tango_cards,
+        retry_delay=0.01,
+        browser_factory=browser_factory,
+        on_browser_replaced=replaced.append,
+    )
+
+    # Test case 1: the crashed browser is quit and replaced, and the new one is handed over to the caller
+    assert len(amazon_cards) == 3 and attempts["1"] == 2
+    assert replaced == [browsers[1]]
+    assert browsers[0].quit_calls == 1 and browsers[1].quit_calls == 0
+
+    # Test case 2: without a way to replace the browser the Tango Cards left expire instead of using up their attempts
+    browsers[:] = [_FakeBrowser()]
+    attempts.clear()
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards(browsers[0], tango_cards, retry_delay=0.01)
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-0"] and attempts["1"] == 1
+    assert schedulers[-1].states == ["succeeded", "expired", "expired"]
+
+    # Test case 3: a dead chromedriver (the connection to it is refused) is treated as a crashed browser
+    class _DeadDriverBrowser(_FakeBrowser):
+        @property
+        def current_url(self) -> str:
+            raise MaxRetryError(None, "http://localhost:9515/session", "Connection refused")  # type: ignore
+
+        def get_log(self, log_type: str) -> list:
+            raise MaxRetryError(None, "http://localhost:9515/session", "Connection refused")  # type: ignore
+
+    def fake_scrap_amazon_gift_card_dead_driver(browser, tc):
+        attempts[tc.security_code] += 1
+        if isinstance(browser, _DeadDriverBrowser):
+            raise MaxRetryError(None, "http://localhost:9515/session", "Connection refused")  # type: ignore
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card_dead_driver)
+    browsers[:] = [_DeadDriverBrowser()]
+    attempts.clear()
+    replaced.clear()
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards(
+        browsers[0],
+        tango_cards,
+        retry_delay=0.01,
+        browser_factory=browser_factory,
+        on_browser_replaced=replaced.append,
+    )
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-0", "AMZ-1", "AMZ-2"] and attempts["0"] == 2
+    assert replaced == [browsers[1]] and browsers[0].quit_calls == 1
+
+    # Test case 4: the Tango Cards left when no worker could start a browser are expired
+    def broken_browser_factory():
+        raise WebDriverException("session not created")
+
+    assert tango_scraper.scrap_amazon_gift_cards_in_parallel(broken_browser_factory, tango_cards, workers=2) == []
+    assert schedulers[-1].states == ["expired", "expired", "expired"]
+
+
+def test_card_scheduler_retry_after_deadline():
+    scheduler = tango_scraper.CardScheduler([TangoCard("0", "0", "")], deadline=0.05, base_delay=10)
+    i, _ = scheduler.next_card()
+    scheduler.fail(i, "timeout")
+
+    # Test case 1: a retry that could only happen after the deadline expires the card
+    assert scheduler.states == ["expired"]
+    assert scheduler.next_card() is None
+
+
+def test_scrap_amazon_gift_cards_proxy_failover(monkeypatch):
+    browsers = []
+
+    def browser_factory(proxy):
+        browsers.append(_FakeBrowser())
+        browsers[-1].proxy = proxy
+        return browsers[-1]
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        # The best proxy degrades after the first Tango Card
+        if browser.proxy == "best" and tc.security_code != "0":
+            raise TimeoutException("element not visible")
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    tango_cards = [TangoCard(security_code=str(i), tango_link=str(i), amazon_link="") for i in range(6)]
+    proxy_manager = ProxyManager(["best", "backup"], error_threshold=2, ranked=["best", "backup"])
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards_in_parallel(
+        browser_factory, tango_cards, workers=1, retry_delay=0.01, proxy_manager=proxy_manager
+    )
+
+    # Test case 1: the worker is restarted on the next proxy and every Tango Card is scraped
+    assert len(amazon_cards) == 6
+    assert [browser.proxy for browser in browsers] == ["best", "backup"]
+    assert all(browser.quit_calls == 1 for browser in browsers)
+
+    # Test case 2: the failures are recorded against the proxy that caused them
+    assert proxy_manager.stats["best"].retired and proxy_manager.stats["best"].failures == 2
+    assert proxy_manager.stats["backup"].successes == 5
+
+    # Test case 3: the worker stops instead of scraping without a proxy once every proxy is retired
+    browsers.clear()
+    proxy_manager = ProxyManager(["best"], error_threshold=2, ranked=["best"])
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards_in_parallel(
+        browser_factory, tango_cards, workers=1, retry_delay=0.01, proxy_manager=proxy_manager
+    )
+    assert [ac.redeem_code for ac in amazon_cards] == ["AMZ-0"]
+    assert [browser.proxy for browser in browsers] == ["best"]
+
+
+def test_scrap_amazon_gift_cards_in_parallel_hand_over(monkeypatch):
+    browsers = []
+
+    def browser_factory(proxy=""):
+        browsers.append(_FakeBrowser())
+        browsers[-1].proxy = proxy
+        return browsers[-1]
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        # The best proxy degrades after the first Tango Card, and the browser without a proxy crashes on it
+        if browser.proxy == "best" and tc.security_code != "0":
+            raise TimeoutException("element not visible")
+        if browser.proxy == "crashing" and tc.security_code == "0":
+            browser.alive = False
+            raise WebDriverException("chrome not reachable")
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    tango_cards = [TangoCard(security_code=str(i), tango_link=str(i), amazon_link="") for i in range(4)]
+    loaded_browser = _FakeBrowser()
+    loaded_browser.proxy = "best"
+    replaced = []
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards_in_parallel(
+        browser_factory,
+        tango_cards,
+        workers=1,
+        browser=loaded_browser,
+        retry_delay=0.01,
+        proxy_manager=ProxyManager(["best", "backup"], error_threshold=2, ranked=["best", "backup"]),
+        on_browser_replaced=replaced.append,
+    )
+
+    # Test case 1: the loaded browser is quit once its proxy is retired and its replacement is handed over
+    assert len(amazon_cards) == 4
+    assert replaced == [None, browsers[0]] and browsers[0].proxy == "backup"
+    assert loaded_browser.quit_calls == 1 and browsers[0].quit_calls == 0
+
+    # Test case 2: a crashed loaded browser is quit and replaced the same way
+    browsers.clear()
+    replaced.clear()
+    loaded_browser = _FakeBrowser()
+    loaded_browser.proxy = "crashing"
+    amazon_cards = tango_scraper.scrap_amazon_gift_cards_in_parallel(
+        browser_factory,
+        tango_cards,
+        workers=1,
+        browser=loaded_browser,
+        retry_delay=0.01,
+        on_browser_replaced=replaced.append,
+    )
+    assert len(amazon_cards) == 4
+    assert replaced == [None, browsers[0]]
+    assert loaded_browser.quit_calls == 1 and browsers[0].quit_calls == 0
+
+
+def test_iter_amazon_gift_cards(monkeypatch):
+    attempts: Counter = Counter()
+    arrived = []
+    browsers = []
+
+    def browser_factory():
+        browsers.append(_FakeBrowser())
+        return browsers[-1]
+
+    def fake_scrap_amazon_gift_card(browser, tc):
+        attempts[tc.security_code] += 1
+        if tc.security_code == "timeout" and attempts[tc.security_code] < 2:
+            raise TimeoutException("element not visible")
+        return AmazonCard(redeem_code=f"AMZ-{tc.security_code}", redeem_status=False, amazon_link="", tango_card=tc)
+
+    def tango_cards():
+        for code in ["timeout", "a", "b"]:
+            arrived.append(code)
+            yield TangoCard(security_code=code, tango_link=code, amazon_link="")
+
+    monkeypatch.setattr(tango_scraper, "scrap_amazon_gift_card", fake_scrap_amazon_gift_card)
+    amazon_cards = tango_scraper.iter_amazon_gift_cards(browser_factory, tango_cards(), retry_delay=0.01)
+
+    # Test case 1: every amazon gift card is yielded as soon as it is scraped, before the next tango card arrives
+    assert next(amazon_cards).redeem_code == "AMZ-a"
+    assert arrived == ["timeout", "a"]
+
+    # Test case 2: failed tango cards are retried and the browser is quit when the generator finishes
+    assert sorted(ac.redeem_code for ac in amazon_cards) == ["AMZ-b", "AMZ-timeout"]
+    assert attempts["timeout"] == 2
+    assert len(browsers) == 1 and browsers[0].quit_calls == 1
+
+
+class _TangoHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Tango redemption page."""
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, content_type: str, body: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_GET(self) -> None:
+        self._send(200, "text/html", '<html><head><meta name="csrf-token" content="token"></head></html>')
+
+    def do_POST(self) -> None:
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/redeem/broken/redeem":
+            self._send(500, "text/html", "error")
+        elif self.path == "/redeem/changed/redeem":
+            self._send(422, "application/json", '{"error": "unknown field securityCode"}')
+        elif self.headers.get("X-CSRF-Token") != "token" or payload["securityCode"] != "good":
+            self._send(422, "application/json", '{"error": "invalid security code"}')
+        else:
+            credentials = [{"type": "cardNumber", "value": "AMZ-123"}, {"type": "pin", "value": "0000"}]
+            self._send(200, "application/json", json.dumps({"reward": {"credentials": credentials}}))
+
+
+def test_scrap_amazon_gift_cards_http():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TangoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        tango_cards = [
+            TangoCard(security_code="good", tango_link=f"{url}/redeem/a", amazon_link="https://www.amazon.com"),
+            TangoCard(security_code="bad", tango_link=f"{url}/redeem/b", amazon_link="https://www.amazon.com"),
+            TangoCard(security_code="good", tango_link=f"{url}/redeem/broken", amazon_link="https://www.amazon.com"),
+            TangoCard(security_code="good", tango_link=f"{url}/redeem/changed", amazon_link="https://www.amazon.com"),
+        ]
+        amazon_cards, failed_tango_cards = scrap_amazon_gift_cards_http(tango_cards)
+    finally:
+        server.shutdown()
+
+    # Test case 1: valid security code
+    assert [(ac.redeem_code, ac.tango_card) for ac in amazon_cards] == [("AMZ-123", tango_cards[0])]
+
+    # Test case 2: invalid security codes are skipped and unexpected responses are left for the browser, even with
+    # the status code of an invalid security code
+    assert failed_tango_cards == [tango_cards[2], tango_cards[3]]
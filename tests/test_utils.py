@@ -1,5 +1,9 @@
 """Module for testing the utils module."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from amz_tango_card_scraper.utils.concurrency import bounded_ordered_map, prefetch, stream
 from amz_tango_card_scraper.utils.otp import get_otp_code
 
 
@@ -15,3 +19,55 @@ def test_get_otp_code():
     otp_key = "test invalid otp key"
     with pytest.raises(Exception):
         get_otp_code(otp_key)
+
+
+def test_bounded_ordered_map():
+    submitted = []
+
+    def items():
+        for i in range(10):
+            submitted.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = bounded_ordered_map(executor, lambda x: x * 2, items(), max_in_flight=3)
+
+        # Test case 1: items are consumed lazily, up to max_in_flight at a time
+        assert next(results) == 0
+        assert len(submitted) == 3
+
+        # Test case 2: results keep the order of the items
+        assert list(results) == [i * 2 for i in range(1, 10)]
+
+
+def test_stream():
+    produced = []
+
+    def numbers():
+        try:
+            for i in range(100):
+                produced.append(i)
+                yield i
+        finally:
+            produced.append("closed")
+
+    # Test case 1: items are produced ahead of the consumer, but never more than maxsize ahead
+    items = prefetch(numbers(), maxsize=4)
+    assert next(items) == 0
+    time.sleep(0.2)
+    assert 4 <= len(produced) <= 6
+
+    # Test case 2: the producer is stopped and its generator closed when the consumer stops iterating
+    items.close()
+    time.sleep(0.3)
+    assert produced[-1] == "closed" and len(produced) < 10
+
+    # Test case 3: errors of the producer are raised after the items emitted before them
+    def produce(emit):
+        emit(1)
+        raise ValueError("broken mailbox")
+
+    items = stream(produce)
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)